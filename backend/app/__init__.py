@@ -25,11 +25,10 @@ def create_app():
 
     db.init_app(app)
 
-    # Configuración de Caching
-    # Cache en memoria para desarrollo
-    app.config['CACHE_TYPE'] = 'SimpleCache'
-    app.config['CACHE_DEFAULT_TIMEOUT'] = 300  # 5 minutos por defecto
+    # Configuración de Caching (CACHE_TYPE / CACHE_REDIS_URL en config.py)
     cache.init_app(app)
+    from .utils.cache_tablas import init_cache_tablas
+    init_cache_tablas(app)
 
     CORS(app, resources={
         r"/api/*": {
@@ -56,30 +55,43 @@ def create_app():
         from app.routes.mic import mic_bp
         from app.routes.mic_guardados import mic_guardados_bp
         from .routes.background_reports import background_reports_bp
+        from .routes.busqueda import busqueda_bp
+
+        # 🧩 Precompilar capas estáticas de los PDF (CRT y MIC/DTA)
+        from .utils.layout_crt import obtener_plantilla_crt
+        from .utils.layout_mic import obtener_plantilla_mic
+        obtener_plantilla_crt()
+        obtener_plantilla_mic()
+
+        # 🖨️ Pool de procesos para renderizar PDFs fuera del hilo del request.
+        # Va antes del scheduler y los workers de reportes: el fork tiene que
+        # ocurrir sin otros hilos corriendo (locks tomados, conexiones en uso)
+        from .utils.render_pdf import init_render_pool
+        init_render_pool(app)
 
         # Inicializar background jobs
         from .background_jobs import init_scheduler, shutdown_scheduler
         init_scheduler(app)
 
         # Inicializar métricas de Prometheus
-        from .metrics import init_metrics, update_business_metrics, update_system_metrics
+        from .metrics import init_metrics
         init_metrics(app)
 
-        # Actualizar métricas cada 30 segundos usando el mismo scheduler
+        # Métricas de negocio: se actualizan en cada commit; una consulta
+        # agregada las reconcilia cada BUSINESS_METRICS_RECONCILE segundos
+        from datetime import datetime, timezone
         from .background_jobs import scheduler
-        from .metrics import update_business_metrics, update_system_metrics
+        from .metrics import update_business_metrics
 
         # Pasar la app a las funciones de métricas
         def business_metrics_job():
             update_business_metrics(app)
 
-        def system_metrics_job():
-            update_system_metrics(app)
-
         scheduler.add_job(business_metrics_job, 'interval',
-                          seconds=30, id='business_metrics')
-        scheduler.add_job(system_metrics_job, 'interval',
-                          seconds=60, id='system_metrics')
+                          seconds=app.config.get('BUSINESS_METRICS_RECONCILE', 300),
+                          next_run_time=datetime.now(timezone.utc), id='business_metrics')
+
+        # Las métricas de sistema se toman al hacer scrape de /metrics (sin sleep en el scheduler)
 
         # Registrar función de limpieza al salir
         atexit.register(shutdown_scheduler)
@@ -95,6 +107,16 @@ def create_app():
         app.register_blueprint(crt_bp)
         app.register_blueprint(mic_bp)
         app.register_blueprint(mic_guardados_bp)
+        app.register_blueprint(busqueda_bp)
+        app.register_blueprint(background_reports_bp)
+
+        # 🗄️ Cache en disco de PDFs ya generados (ETag por contenido)
+        from .utils.cache_pdf import init_cache_pdf
+        init_cache_pdf(app)
+
+        # 🔎 Búsqueda de texto (FTS5 trigram en SQLite, pg_trgm en PostgreSQL)
+        from .utils.busqueda import init_busqueda
+        init_busqueda(app)
 
         # DIAGNOSTICO: Ver todas las rutas registradas
         print("\nRUTAS REGISTRADAS EN FLASK:")
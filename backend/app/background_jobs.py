@@ -1,6 +1,8 @@
 """
 Sistema de Background Jobs para Reportes
-Usa APScheduler para procesar reportes de manera asíncrona
+Los reportes pedidos desde el frontend se encolan en la tabla reporte_jobs y
+los procesan hilos worker de cualquier instancia; APScheduler queda para las
+tareas programadas (reporte diario, limpieza, métricas).
 """
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.jobstores.memory import MemoryJobStore
@@ -8,9 +10,13 @@ from apscheduler.executors.pool import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import json
 import os
+import socket
+import threading
+import uuid
 from flask import current_app
+from sqlalchemy import update
 from . import db
-from .models import Reporte, CRT, MIC, Honorario, Movimiento
+from .models import Reporte, ReporteJob, CRT, MIC, Honorario, Movimiento, Moneda, Transportadora
 import traceback
 
 # Configuración del scheduler
@@ -33,10 +39,19 @@ scheduler = BackgroundScheduler(
     timezone='America/Asuncion'
 )
 
-# Estado de los jobs
-job_status = {}
 app = None
 
+# Cola de reportes: tabla reporte_jobs (compartida por todos los procesos).
+# Cada proceso corre REPORT_JOB_WORKERS hilos que toman jobs en estado
+# 'queued' con bloqueo de fila (FOR UPDATE SKIP LOCKED; en SQLite un UPDATE
+# atómico), así un job lo procesa un solo worker aunque haya varias instancias.
+ESTADOS_ACTIVOS = ('queued', 'processing')
+ESTADOS_FINALES = ('completed', 'failed', 'cancelled')
+
+_despertar = threading.Event()
+_detener = threading.Event()
+_workers = []
+
 
 def init_scheduler(flask_app):
     """Inicializar el scheduler con la aplicación Flask"""
@@ -73,6 +88,18 @@ def init_scheduler(flask_app):
         replace_existing=True
     )
 
+    scheduler.add_job(
+        func=mantener_jobs,
+        trigger="interval",
+        minutes=5,
+        id='report_jobs_maintenance',
+        name='Mantenimiento de la cola de reportes',
+        replace_existing=True
+    )
+
+    # Workers de la cola de reportes (tabla reporte_jobs)
+    init_job_workers(flask_app)
+
     # Iniciar el scheduler
     if not scheduler.running:
         scheduler.start()
@@ -80,7 +107,9 @@ def init_scheduler(flask_app):
 
 
 def shutdown_scheduler():
-    """Detener el scheduler"""
+    """Detener el scheduler y los workers de reportes"""
+    _detener.set()
+    _despertar.set()
     if scheduler.running:
         scheduler.shutdown()
         current_app.logger.info("Background scheduler detenido")
@@ -88,7 +117,7 @@ def shutdown_scheduler():
 
 def create_report_job(report_type, parameters=None, user_id=None):
     """
-    Crear un job de reporte inmediato
+    Crear un job de reporte inmediato (queda en cola en la base)
 
     Args:
         report_type (str): Tipo de reporte ('crt_summary', 'financial', 'activity')
@@ -98,155 +127,292 @@ def create_report_job(report_type, parameters=None, user_id=None):
     Returns:
         str: Job ID
     """
-    job_id = f"report_{report_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-
-    # Guardar el estado inicial del job
-    job_status[job_id] = {
-        'status': 'queued',
-        'progress': 0,
-        'message': 'En cola de procesamiento',
-        'created_at': datetime.now(),
-        'user_id': user_id,
-        'report_type': report_type
-    }
+    # uuid: dos pedidos en el mismo segundo ya no comparten id
+    job_id = f"report_{report_type}_{uuid.uuid4().hex}"
 
-    # Agregar el job al scheduler
-    scheduler.add_job(
-        func=process_report,
-        args=[job_id, report_type, parameters or {}],
+    db.session.add(ReporteJob(
         id=job_id,
-        name=f'Reporte {report_type}',
-        replace_existing=True
-    )
-
+        tipo=report_type,
+        parametros=json.dumps(parameters or {}),
+        estado='queued',
+        progreso=0,
+        mensaje='En cola de procesamiento',
+        usuario_id=user_id
+    ))
+    db.session.commit()
+
+    # Los workers de este proceso no esperan al próximo sondeo
+    _despertar.set()
     return job_id
 
 
+def _job_a_dict(job):
+    """Fila de reporte_jobs -> estado que ve el frontend"""
+    return {
+        'job_id': job.id,
+        'status': job.estado,
+        'progress': job.progreso,
+        'message': job.mensaje,
+        'report_type': job.tipo,
+        'parameters': json.loads(job.parametros) if job.parametros else {},
+        'user_id': job.usuario_id,
+        'created_at': job.creado_en,
+        'started_at': job.iniciado_en,
+        'completed_at': job.finalizado_en,
+        'result': json.loads(job.resultado) if job.resultado else None,
+        'error': job.error
+    }
+
+
 def get_job_status(job_id):
     """Obtener el estado de un job"""
-    return job_status.get(job_id, {'status': 'not_found'})
+    job = db.session.get(ReporteJob, job_id)
+    return _job_a_dict(job) if job else {'status': 'not_found'}
+
+
+def reclamar_job(worker_id):
+    """
+    Toma el job en cola más viejo y lo marca 'processing' para `worker_id`.
+    Devuelve su id, o None si no hay nada pendiente.
+    """
+    valores = {
+        'estado': 'processing',
+        'progreso': 10,
+        'mensaje': 'Procesando reporte...',
+        'worker': worker_id,
+        'iniciado_en': datetime.utcnow(),
+        'intentos': ReporteJob.intentos + 1
+    }
+
+    if db.session.get_bind().dialect.name == 'sqlite':
+        # Sin SKIP LOCKED: un único UPDATE (SQLite serializa a los escritores);
+        # el "AND estado = 'queued'" descarta el job si otro lo tomó antes
+        siguiente = (db.session.query(ReporteJob.id)
+                     .filter(ReporteJob.estado == 'queued')
+                     .order_by(ReporteJob.creado_en, ReporteJob.id)
+                     .limit(1).scalar_subquery())
+        job_id = db.session.execute(
+            update(ReporteJob)
+            .where(ReporteJob.id == siguiente, ReporteJob.estado == 'queued')
+            .values(**valores)
+            .returning(ReporteJob.id),
+            execution_options={'synchronize_session': False}
+        ).scalar()
+    else:
+        # PostgreSQL / MySQL 8: los jobs bloqueados por otro worker se saltean
+        job_id = (db.session.query(ReporteJob.id)
+                  .filter(ReporteJob.estado == 'queued')
+                  .order_by(ReporteJob.creado_en, ReporteJob.id)
+                  .with_for_update(skip_locked=True)
+                  .limit(1).scalar())
+        if job_id:
+            db.session.query(ReporteJob).filter(ReporteJob.id == job_id).update(
+                valores, synchronize_session=False)
+
+    db.session.commit()
+    return job_id
+
 
+def _terminar_job(job_id, worker_id, **valores):
+    """Estado final; no pisa un job cancelado o retomado por otro worker"""
+    return db.session.query(ReporteJob).filter(
+        ReporteJob.id == job_id,
+        ReporteJob.estado == 'processing',
+        ReporteJob.worker == worker_id
+    ).update(dict(valores, finalizado_en=datetime.utcnow()), synchronize_session=False)
 
-def process_report(job_id, report_type, parameters):
+
+def process_report(job_id, worker_id):
     """
-    Procesar un reporte en background
+    Procesar un reporte ya reclamado por `worker_id` (dentro de un app context)
 
     Args:
         job_id (str): ID del job
-        report_type (str): Tipo de reporte
-        parameters (dict): Parámetros del reporte
+        worker_id (str): Worker que lo reclamó
     """
+    job = db.session.get(ReporteJob, job_id)
+    report_type = job.tipo
+    parameters = json.loads(job.parametros) if job.parametros else {}
+
     try:
-        # Actualizar estado
-        job_status[job_id]['status'] = 'processing'
-        job_status[job_id]['progress'] = 10
-        job_status[job_id]['message'] = 'Procesando reporte...'
-
-        # Crear contexto de aplicación
-        with scheduler.app.app_context():
-            if report_type == 'crt_summary':
-                result = generate_crt_summary_report(parameters)
-            elif report_type == 'financial':
-                result = generate_financial_report(parameters)
-            elif report_type == 'activity':
-                result = generate_activity_report(parameters)
-            else:
-                raise ValueError(f"Tipo de reporte desconocido: {report_type}")
-
-            # Actualizar estado final
-            job_status[job_id]['status'] = 'completed'
-            job_status[job_id]['progress'] = 100
-            job_status[job_id]['message'] = 'Reporte completado exitosamente'
-            job_status[job_id]['result'] = result
-            job_status[job_id]['completed_at'] = datetime.now()
+        if report_type == 'crt_summary':
+            result = generate_crt_summary_report(parameters)
+        elif report_type == 'financial':
+            result = generate_financial_report(parameters)
+        elif report_type == 'activity':
+            result = generate_activity_report(parameters)
+        else:
+            raise ValueError(f"Tipo de reporte desconocido: {report_type}")
+
+        # Mismo JSON que devolvía jsonify (Decimal, fechas)
+        _terminar_job(job_id, worker_id,
+                      estado='completed',
+                      progreso=100,
+                      mensaje='Reporte completado exitosamente',
+                      resultado=current_app.json.dumps(result))
+        db.session.commit()
 
     except Exception as e:
-        # Actualizar estado de error
-        job_status[job_id]['status'] = 'failed'
-        job_status[job_id]['message'] = f'Error: {str(e)}'
-        job_status[job_id]['error'] = traceback.format_exc()
-        job_status[job_id]['completed_at'] = datetime.now()
+        db.session.rollback()
+        _terminar_job(job_id, worker_id,
+                      estado='failed',
+                      mensaje=f'Error: {str(e)}'[:255],
+                      error=traceback.format_exc())
+        db.session.commit()
 
         current_app.logger.error(f"Error en job {job_id}: {e}")
 
 
-def generate_crt_summary_report(parameters):
-    """Generar reporte resumen de CRTs"""
-    date_from = parameters.get('date_from')
-    date_to = parameters.get('date_to')
+def procesar_siguiente(worker_id):
+    """Reclama y procesa un job; devuelve su id o None si la cola estaba vacía"""
+    job_id = reclamar_job(worker_id)
+    if job_id:
+        process_report(job_id, worker_id)
+    return job_id
 
-    query = CRT.query
 
-    if date_from:
-        query = query.filter(CRT.fecha_emision >= date_from)
-    if date_to:
-        query = query.filter(CRT.fecha_emision <= date_to)
+def _bucle_worker(flask_app, worker_id):
+    espera = flask_app.config.get('REPORT_JOB_POLL', 5)
+    while not _detener.is_set():
+        job_id = None
+        try:
+            with flask_app.app_context():
+                job_id = procesar_siguiente(worker_id)
+        except Exception as e:
+            flask_app.logger.error(f"Error en worker de reportes {worker_id}: {e}")
+        if job_id is None:
+            # Cola vacía: esperar un pedido de este proceso o el próximo sondeo
+            _despertar.wait(espera)
+            _despertar.clear()
+
+
+def init_job_workers(flask_app):
+    """Arrancar los hilos que consumen la cola de reportes de este proceso"""
+    cantidad = flask_app.config.get('REPORT_JOB_WORKERS', 2)
+    base = f"{socket.gethostname()}:{os.getpid()}"
+    _detener.clear()
+    for n in range(cantidad - len(_workers)):
+        worker_id = f"{base}:{len(_workers) + 1}"
+        hilo = threading.Thread(target=_bucle_worker, args=(flask_app, worker_id),
+                                name=f"reportes-{len(_workers) + 1}", daemon=True)
+        hilo.start()
+        _workers.append(hilo)
+    print(f"📋 Workers de reportes: {cantidad} ({base})")
+
+
+def mantener_jobs():
+    """
+    Reencolar jobs de workers caídos (processing hace más de REPORT_JOB_TIMEOUT)
+    y borrar los terminados más viejos que REPORT_JOB_RETENTION_HOURS.
+    """
+    if not app:
+        return
+
+    try:
+        with app.app_context():
+            ahora = datetime.utcnow()
+            vencido = ahora - timedelta(seconds=app.config.get('REPORT_JOB_TIMEOUT', 1800))
+            colgados = ReporteJob.query.filter(
+                ReporteJob.estado == 'processing',
+                ReporteJob.iniciado_en < vencido)
+            reencolados = colgados.filter(
+                ReporteJob.intentos < app.config.get('REPORT_JOB_MAX_INTENTOS', 3)
+            ).update({'estado': 'queued', 'mensaje': 'Reencolado: worker sin respuesta',
+                      'worker': None}, synchronize_session=False)
+            fallidos = colgados.update({
+                'estado': 'failed', 'mensaje': 'Error: se agotaron los intentos',
+                'finalizado_en': ahora}, synchronize_session=False)
+
+            limite = ahora - timedelta(hours=app.config.get('REPORT_JOB_RETENTION_HOURS', 168))
+            borrados = ReporteJob.query.filter(
+                ReporteJob.estado.in_(ESTADOS_FINALES),
+                ReporteJob.finalizado_en < limite
+            ).delete(synchronize_session=False)
+            db.session.commit()
 
-    crts = query.all()
+            if reencolados or fallidos or borrados:
+                app.logger.info(
+                    f"Jobs de reportes: {reencolados} reencolados, {fallidos} fallidos, "
+                    f"{borrados} eliminados")
 
-    summary = {
-        'total_crts': len(crts),
-        'total_valor': sum(crt.valor_incoterm or 0 for crt in crts),
-        'por_estado': {},
-        'por_moneda': {},
-        'por_mes': {}
-    }
+    except Exception as e:
+        app.logger.error(f"Error en mantenimiento de jobs de reportes: {e}")
 
-    for crt in crts:
-        # Por estado
-        estado = crt.estado or 'SIN_ESTADO'
-        summary['por_estado'][estado] = summary['por_estado'].get(
-            estado, 0) + 1
 
-        # Por moneda
-        if crt.moneda:
-            moneda = crt.moneda.nombre
-            summary['por_moneda'][moneda] = summary['por_moneda'].get(
-                moneda, 0) + 1
+def _mes(columna):
+    """Expresión 'YYYY-MM' de una fecha, según el motor (agrupar por mes en SQL)."""
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto == 'postgresql':
+        return db.func.to_char(db.func.date_trunc('month', columna), 'YYYY-MM')
+    if dialecto in ('mysql', 'mariadb'):
+        return db.func.date_format(columna, '%Y-%m')
+    return db.func.strftime('%Y-%m', columna)
 
-        # Por mes
-        mes = crt.fecha_emision.strftime(
-            '%Y-%m') if crt.fecha_emision else 'SIN_FECHA'
-        summary['por_mes'][mes] = summary['por_mes'].get(mes, 0) + 1
 
-    return summary
+def _filtrar_fechas(query, columna, parameters):
+    if parameters.get('date_from'):
+        query = query.filter(columna >= parameters['date_from'])
+    if parameters.get('date_to'):
+        query = query.filter(columna <= parameters['date_to'])
+    return query
 
 
-def generate_financial_report(parameters):
-    """Generar reporte financiero"""
-    date_from = parameters.get('date_from')
-    date_to = parameters.get('date_to')
+def generate_crt_summary_report(parameters):
+    """
+    Generar reporte resumen de CRTs.
+    Todo se agrega con GROUP BY en la base: sólo salen los grupos, no los CRTs.
+    """
+    estado = db.func.coalesce(CRT.estado, 'SIN_ESTADO')
+    por_estado = _filtrar_fechas(db.session.query(
+        estado, db.func.count(CRT.id), db.func.sum(CRT.valor_incoterm)
+    ), CRT.fecha_emision, parameters).group_by(estado).all()
+
+    por_moneda = _filtrar_fechas(db.session.query(
+        Moneda.nombre, db.func.count(CRT.id)
+    ).join(Moneda, Moneda.id == CRT.moneda_id),
+        CRT.fecha_emision, parameters).group_by(Moneda.nombre).all()
+
+    mes = db.func.coalesce(_mes(CRT.fecha_emision), 'SIN_FECHA')
+    por_mes = _filtrar_fechas(db.session.query(
+        mes, db.func.count(CRT.id)
+    ), CRT.fecha_emision, parameters).group_by(mes).all()
+
+    return {
+        'total_crts': sum(cantidad for _, cantidad, _ in por_estado),
+        'total_valor': sum((valor or 0 for _, _, valor in por_estado), 0),
+        'por_estado': {nombre: cantidad for nombre, cantidad, _ in por_estado},
+        'por_moneda': {nombre: cantidad for nombre, cantidad in por_moneda},
+        'por_mes': {nombre: cantidad for nombre, cantidad in por_mes}
+    }
 
-    query = Honorario.query
 
-    if date_from:
-        query = query.filter(Honorario.fecha >= date_from)
-    if date_to:
-        query = query.filter(Honorario.fecha <= date_to)
+def generate_financial_report(parameters):
+    """
+    Generar reporte financiero.
+    Totales por transportadora y por mes con GROUP BY (nombres por join).
+    """
+    transportadora = db.func.coalesce(Transportadora.nombre, 'SIN_TRANSPORTADORA')
+    por_transportadora = _filtrar_fechas(db.session.query(
+        transportadora, db.func.count(Honorario.id), db.func.sum(Honorario.monto)
+    ).outerjoin(Transportadora, Transportadora.id == Honorario.transportadora_id),
+        Honorario.fecha, parameters).group_by(transportadora).all()
 
-    honorarios = query.all()
+    mes = _mes(Honorario.fecha)
+    por_mes = _filtrar_fechas(db.session.query(
+        mes, db.func.sum(Honorario.monto)
+    ), Honorario.fecha, parameters).group_by(mes).all()
 
     summary = {
-        'total_honorarios': len(honorarios),
-        'total_monto': sum(h.monto for h in honorarios),
-        'por_transportadora': {},
-        'por_mes': {},
+        'total_honorarios': sum(cantidad for _, cantidad, _ in por_transportadora),
+        'total_monto': sum((total for _, _, total in por_transportadora), 0),
+        'por_transportadora': {
+            nombre: {'count': cantidad, 'total': total}
+            for nombre, cantidad, total in por_transportadora
+        },
+        'por_mes': {nombre: total for nombre, total in por_mes},
         'promedio_por_transportadora': 0
     }
 
-    for h in honorarios:
-        # Por transportadora
-        transportadora = h.transportadora.nombre if h.transportadora else 'SIN_TRANSPORTADORA'
-        if transportadora not in summary['por_transportadora']:
-            summary['por_transportadora'][transportadora] = {
-                'count': 0, 'total': 0}
-        summary['por_transportadora'][transportadora]['count'] += 1
-        summary['por_transportadora'][transportadora]['total'] += h.monto
-
-        # Por mes
-        mes = h.fecha.strftime('%Y-%m')
-        summary['por_mes'][mes] = summary['por_mes'].get(mes, 0) + h.monto
-
     # Calcular promedio
     if summary['por_transportadora']:
         total_transportadoras = len(summary['por_transportadora'])
@@ -294,15 +460,17 @@ def generate_daily_report():
         with app.app_context():
             yesterday = datetime.now() - timedelta(days=1)
 
-            # Datos del día anterior
+            # Datos del día anterior (rango sobre la columna para usar el índice)
+            inicio = datetime.combine(yesterday.date(), datetime.min.time())
             crts_count = CRT.query.filter(
-                db.func.date(CRT.fecha_emision) == yesterday.date()
+                CRT.fecha_emision >= inicio,
+                CRT.fecha_emision < inicio + timedelta(days=1)
             ).count()
 
             honorarios_total = db.session.query(
                 db.func.sum(Honorario.monto)
             ).filter(
-                db.func.date(Honorario.fecha) == yesterday.date()
+                Honorario.fecha == yesterday.date()
             ).scalar() or 0
 
             # Crear reporte en BD
@@ -353,22 +521,28 @@ def cleanup_old_reports():
 # Funciones de utilidad para el frontend
 
 
-def get_active_jobs():
-    """Obtener jobs activos"""
-    return {
-        job_id: status for job_id, status in job_status.items()
-        if status['status'] in ['queued', 'processing']
-    }
+def get_active_jobs(user_id=None):
+    """Obtener jobs activos (de un usuario si se indica)"""
+    query = ReporteJob.query.filter(ReporteJob.estado.in_(ESTADOS_ACTIVOS))
+    if user_id is not None:
+        query = query.filter(ReporteJob.usuario_id == user_id)
+    return {job.id: _job_a_dict(job) for job in query.order_by(ReporteJob.creado_en)}
 
 
 def cancel_job(job_id):
-    """Cancelar un job"""
+    """Cancelar un job en cola o en proceso (su resultado se descarta)"""
     try:
-        scheduler.remove_job(job_id)
-        if job_id in job_status:
-            job_status[job_id]['status'] = 'cancelled'
-            job_status[job_id]['message'] = 'Job cancelado por usuario'
-        return True
+        cancelados = ReporteJob.query.filter(
+            ReporteJob.id == job_id,
+            ReporteJob.estado.in_(ESTADOS_ACTIVOS)
+        ).update({
+            'estado': 'cancelled',
+            'mensaje': 'Job cancelado por usuario',
+            'finalizado_en': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        return cancelados > 0
     except Exception as e:
+        db.session.rollback()
         current_app.logger.error(f"Error cancelando job {job_id}: {e}")
         return False
@@ -1,24 +1,48 @@
 """
 Prometheus metrics for the logistics system
 """
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
-from flask import Response, request
+from collections import Counter as Tally
+from prometheus_client import (
+    Counter, Histogram, generate_latest, CollectorRegistry, CONTENT_TYPE_LATEST, REGISTRY
+)
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+import gc
+import heapq
+import itertools
+import os
+import re
+import threading
 import time
 import logging
 
+try:
+    import psutil
+except ImportError:  # psutil is optional: RSS and FDs are skipped without it
+    psutil = None
+
 logger = logging.getLogger(__name__)
 
-# Request metrics
+# Request metrics. Labels are the route template (/api/crts/<int:crt_id>, not
+# the URL) and the status class, so series stay bounded. Bucket edges include
+# the SLO thresholds (300 ms listings, 1 s PDFs) so ratios can be read exactly.
+SLO_BUCKETS = (.025, .05, .1, .2, .3, .5, .75, 1, 1.5, 2.5, 5, 10, 30)
+
 REQUEST_COUNT = Counter(
     'flask_requests_total',
     'Total number of requests',
-    ['method', 'endpoint', 'status']
+    ['method', 'route', 'status']
 )
 
 REQUEST_LATENCY = Histogram(
     'flask_request_duration_seconds',
     'Request duration in seconds',
-    ['method', 'endpoint']
+    ['method', 'route'],
+    buckets=SLO_BUCKETS
 )
 
 # Business metrics
@@ -32,120 +56,560 @@ MIC_CREATED = Counter(
     'Total number of MICs created'
 )
 
-HONORARIOS_TOTAL = Gauge(
-    'honorarios_total_amount',
-    'Total amount of honorarios'
-)
 
-USERS_ACTIVE = Gauge(
-    'users_active_total',
-    'Total number of active users'
-)
 
-# Database metrics
-DB_CONNECTIONS_ACTIVE = Gauge(
-    'db_connections_active',
-    'Number of active database connections'
-)
+class BusinessMetricsCollector:
+    """
+    Business totals (CRTs, MICs, active users, honorarios amount) kept in memory.
+
+    Committed sessions bump them (see init_business_metrics) and
+    update_business_metrics() reconciles them every few minutes with one
+    aggregated SQL query, so a scrape never touches the database.
+    """
+
+    FAMILIES = {
+        'crts': ('crts_total', 'Number of CRTs'),
+        'mics': ('mics_total', 'Number of MICs'),
+        'usuarios': ('users_active_total', 'Total number of active users'),
+        'honorarios': ('honorarios_total_amount', 'Total amount of honorarios'),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = None  # None until the first reconcile
+
+    def collect(self):
+        with self._lock:
+            totals = dict(self._totals) if self._totals is not None else None
+        if totals is None:
+            return
+        for key, (name, documentation) in self.FAMILIES.items():
+            yield GaugeMetricFamily(name, documentation, value=float(totals[key]))
+
+    def value(self, key):
+        with self._lock:
+            return self._totals[key] if self._totals is not None else None
+
+    def apply(self, deltas):
+        """Add committed changes; ignored before the first reconcile (it will count them)"""
+        with self._lock:
+            if self._totals is not None:
+                for key, delta in deltas.items():
+                    self._totals[key] += delta
+
+    def reconcile(self, totals):
+        with self._lock:
+            self._totals = dict(totals)
 
+
+BUSINESS_METRICS = BusinessMetricsCollector()
+REGISTRY.register(BUSINESS_METRICS)
+
+# Database metrics (connection pool gauges: SystemMetricsCollector)
 DB_QUERY_DURATION = Histogram(
     'db_query_duration_seconds',
     'Database query duration in seconds',
-    ['operation']
+    ['endpoint', 'operation'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+)
+
+DB_QUERIES_PER_REQUEST = Histogram(
+    'db_queries_per_request',
+    'Number of SQL statements executed per request',
+    ['endpoint'],
+    buckets=(1, 2, 3, 5, 10, 20, 30, 50, 100, 200, 500)
 )
 
-# System metrics
-MEMORY_USAGE = Gauge(
-    'memory_usage_bytes',
-    'Current memory usage in bytes'
+DB_TIME_PER_REQUEST = Histogram(
+    'db_time_per_request_seconds',
+    'Total time spent in SQL statements per request',
+    ['endpoint'],
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
 )
 
-CPU_USAGE = Gauge(
-    'cpu_usage_percent',
-    'Current CPU usage percentage'
+DB_N_PLUS_ONE = Counter(
+    'db_n_plus_one_requests_total',
+    'Requests flagged by the N+1 detector (too many or repeated statements)',
+    ['endpoint']
 )
 
+# PDF render metrics (app/utils/render_pdf.py). document: crt (generar_pdf_crt),
+# mic (generar_micdta_pdf_con_datos) or crt_lote; field: MIC field number.
+PDF_RENDER_DURATION = Histogram(
+    'pdf_render_duration_seconds',
+    'PDF render time by document type',
+    ['document'],
+    buckets=(.01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 120)
+)
+
+PDF_OUTPUT_BYTES = Histogram(
+    'pdf_output_bytes',
+    'Size of the rendered PDF',
+    ['document'],
+    buckets=(10e3, 25e3, 50e3, 100e3, 250e3, 500e3, 1e6, 2.5e6, 5e6, 10e6, 50e6)
+)
+
+PDF_FIT_ITERATIONS = Histogram(
+    'pdf_fit_iterations',
+    'Font sizes tried by fit_text_box_universal per field',
+    ['field'],
+    buckets=(1, 2, 3, 4, 5, 6, 8, 12)
+)
+
+PDF_FIT_TRUNCATED = Counter(
+    'pdf_fit_truncated_total',
+    'Fields whose text did not fit and was truncated',
+    ['field']
+)
+
+# Response cache metrics (app/utils/cache_tablas.py)
+CACHE_REQUESTS = Counter(
+    'response_cache_requests_total',
+    'Response cache lookups by endpoint and result (hit/miss)',
+    ['endpoint', 'result']
+)
+
+
+def _route_label():
+    return request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+
+
+class SlowRequestSampler:
+    """
+    Keeps the slowest `size` requests of each `window` seconds and logs them
+    when the window closes: at most `size` log lines per minute, with what is
+    needed to reproduce them (route, args, query count).
+    """
+
+    def __init__(self, size=5, window=60):
+        self.size = size
+        self.window = window
+        self._lock = threading.Lock()
+        self._heap = []  # (duration, seq, sample): min-heap with the slowest ones
+        self._seq = itertools.count()
+        self._window_start = time.monotonic()
+
+    def offer(self, duration, sample):
+        with self._lock:
+            item = (duration, next(self._seq), sample)
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, item)
+            elif duration > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def roll(self, now=None):
+        """Close the window if it is over; returns the samples that were logged"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if now - self._window_start < self.window:
+                return []
+            self._window_start = now
+            samples, self._heap = sorted(self._heap, reverse=True), []
+        for duration, _, sample in samples:
+            logger.warning(
+                f"Slow request {duration * 1000:.0f} ms: {sample['method']} {sample['route']} "
+                f"status={sample['status']} queries={sample['queries']} args={sample['args']}")
+        return [sample for _, _, sample in samples]
+
+
+SLOW_REQUESTS = SlowRequestSampler()
+
+
+def _request_args():
+    args = {}
+    for clave, valores in request.args.lists():
+        if any(p in clave.lower() for p in ('token', 'password', 'clave')):
+            args[clave] = '***'
+        else:
+            args[clave] = valores[0][:100] if len(valores) == 1 else [v[:100] for v in valores]
+    return args
+
+
+def _metrics_registry():
+    """
+    REGISTRY, or under multiple workers (PROMETHEUS_MULTIPROC_DIR set before
+    the workers start) a registry aggregating every process's files.
+    Counters/histograms are then summed across workers. Business metrics come
+    from the database and are the same in every process; system metrics are
+    per process and are not exported in this mode.
+    """
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(BUSINESS_METRICS)
+    return registry
+
 
 def init_metrics(app):
     """Initialize Prometheus metrics for the Flask app"""
+    init_business_metrics(app)
+    init_system_metrics(app)
+    init_db_metrics(app)
+    SLOW_REQUESTS.size = app.config.get('SLOW_REQUEST_SAMPLES', 5)
+    umbral_lento = app.config.get('SLOW_REQUEST_THRESHOLD', 0.5)
 
     @app.before_request
     def before_request():
-        request.start_time = time.time()
+        g.metrics_start = time.perf_counter()
 
     @app.after_request
     def after_request(response):
-        if hasattr(request, 'start_time'):
-            latency = time.time() - request.start_time
-            REQUEST_LATENCY.labels(
-                method=request.method,
-                endpoint=request.endpoint or 'unknown'
-            ).observe(latency)
-
+        route = _route_label()
         REQUEST_COUNT.labels(
             method=request.method,
-            endpoint=request.endpoint or 'unknown',
-            status=response.status_code
+            route=route,
+            status=f'{response.status_code // 100}xx'
         ).inc()
 
+        inicio = g.get('metrics_start')
+        if inicio is not None:
+            latency = time.perf_counter() - inicio
+            REQUEST_LATENCY.labels(method=request.method, route=route).observe(latency)
+            if latency >= umbral_lento:
+                stats = g.get('sql_stats')
+                SLOW_REQUESTS.offer(latency, {
+                    'method': request.method,
+                    'route': route,
+                    'endpoint': request.endpoint,
+                    'status': response.status_code,
+                    'args': _request_args(),
+                    'queries': stats['count'] if stats else 0,
+                })
+        SLOW_REQUESTS.roll()
         return response
 
     @app.route('/metrics')
     def metrics():
         """Prometheus metrics endpoint"""
-        return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+        return Response(generate_latest(_metrics_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+_BUSINESS_DELTAS = 'metricas_negocio'
+
+
+def _honorario_delta(obj, signo):
+    return signo * float(obj.monto or 0)
+
+
+def _business_after_flush(session, flush_context):
+    """Accumulate business deltas of this flush until the transaction commits"""
+    deltas = session.info.setdefault(_BUSINESS_DELTAS, Tally())
+    for obj, signo in [*((o, 1) for o in session.new), *((o, -1) for o in session.deleted)]:
+        tabla = getattr(obj, '__tablename__', None)
+        if tabla in ('crts', 'mics'):
+            deltas[tabla] += signo
+            if signo > 0:
+                deltas[f'{tabla}_creados'] += 1
+        elif tabla == 'usuarios' and (obj.estado or 'activo') == 'activo':
+            deltas['usuarios'] += signo
+        elif tabla == 'honorarios':
+            deltas['honorarios'] += _honorario_delta(obj, signo)
+
+    for obj in session.dirty:
+        tabla = getattr(obj, '__tablename__', None)
+        if tabla == 'honorarios':
+            historia = inspect(obj).attrs.monto.history
+            if historia.has_changes():
+                deltas['honorarios'] += sum(float(v or 0) for v in historia.added) \
+                    - sum(float(v or 0) for v in historia.deleted)
+        elif tabla == 'usuarios':
+            historia = inspect(obj).attrs.estado.history
+            if historia.has_changes():
+                deltas['usuarios'] += sum(v == 'activo' for v in historia.added) \
+                    - sum(v == 'activo' for v in historia.deleted)
+
+
+def _business_after_commit(session):
+    deltas = session.info.pop(_BUSINESS_DELTAS, None)
+    if not deltas:
+        return
+    if deltas['crts_creados']:
+        CRT_CREATED.inc(deltas.pop('crts_creados'))
+    if deltas['mics_creados']:
+        MIC_CREATED.inc(deltas.pop('mics_creados'))
+    BUSINESS_METRICS.apply({k: v for k, v in deltas.items() if k in BusinessMetricsCollector.FAMILIES})
+
+
+def _business_after_rollback(session):
+    session.info.pop(_BUSINESS_DELTAS, None)
+
+
+def init_business_metrics(app):
+    """Keep business totals up to date from committed sessions (no table scans)"""
+    if not event.contains(Session, 'after_commit', _business_after_commit):
+        event.listen(Session, 'after_flush', _business_after_flush)
+        event.listen(Session, 'after_commit', _business_after_commit)
+        event.listen(Session, 'after_rollback', _business_after_rollback)
 
 
 def update_business_metrics(flask_app=None):
-    """Update business-related metrics"""
+    """
+    Reconcile business totals with the database in a single aggregated query
+    (bulk updates and raw SQL are not seen by the session hooks).
+    """
     try:
         if not flask_app:
             from .background_jobs import app as flask_app
 
         if flask_app:
             with flask_app.app_context():
+                from . import db
                 from .models import CRT, MIC, Honorario, Usuario
 
-                # Update CRT count
-                crt_count = CRT.query.count()
-                CRT_CREATED._value = crt_count
+                fila = db.session.execute(select(
+                    select(func.count()).select_from(CRT).scalar_subquery(),
+                    select(func.count()).select_from(MIC).scalar_subquery(),
+                    select(func.count()).select_from(Usuario)
+                    .where(Usuario.estado == 'activo').scalar_subquery(),
+                    select(func.coalesce(func.sum(Honorario.monto), 0)).scalar_subquery()
+                )).one()
+                BUSINESS_METRICS.reconcile({
+                    'crts': fila[0],
+                    'mics': fila[1],
+                    'usuarios': fila[2],
+                    'honorarios': float(fila[3]),
+                })
 
-                # Update MIC count
-                mic_count = MIC.query.count()
-                MIC_CREATED._value = mic_count
+    except Exception as e:
+        logger.warning(f"Failed to update business metrics: {e}")
 
-                # Update honorarios total
-                honorarios_total = Honorario.query.with_entities(
-                    Honorario.monto
-                ).all()
-                total_amount = sum(h.monto for h in honorarios_total)
-                HONORARIOS_TOTAL.set(total_amount)
 
-                # Update active users
-                users_count = Usuario.query.count()
-                USERS_ACTIVE.set(users_count)
+class SystemMetricsCollector:
+    """
+    Process and DB pool metrics sampled when /metrics is scraped.
 
-    except Exception as e:
-        logger.warning(f"Failed to update business metrics: {e}")
+    CPU usage is the CPU time consumed since the previous scrape divided by
+    the wall time elapsed (no sleeping sampler thread). RSS and threads come
+    from psutil when it is installed; GC counts and pool usage from the
+    interpreter and the SQLAlchemy engine. Open FDs, total CPU seconds and GC
+    collections are already exported by prometheus_client's default
+    process_* / python_gc_* collectors.
+    """
 
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last = None  # (wall time, cpu seconds) of the previous sample
+        self._engines = {}
 
-def update_system_metrics(flask_app=None):
-    """Update system-related metrics"""
-    try:
-        import psutil
-        import os
+    def bind_engine(self, engine):
+        self._engines[str(engine.url.render_as_string(hide_password=True))] = engine
+
+    def _cpu_percent(self):
+        tiempos = os.times()
+        ahora, cpu = time.monotonic(), tiempos.user + tiempos.system
+        with self._lock:
+            anterior, self._last = self._last, (ahora, cpu)
+        if anterior is None or ahora <= anterior[0]:
+            return None
+        return 100.0 * (cpu - anterior[1]) / (ahora - anterior[0])
+
+    def sample(self):
+        """Current values as {name: value}; used by collect() and the tests"""
+        valores = {}
+        cpu = self._cpu_percent()
+        if cpu is not None:
+            valores['cpu_usage_percent'] = cpu
+
+        if psutil is not None:
+            try:
+                proceso = psutil.Process(os.getpid())
+                valores['memory_usage_bytes'] = proceso.memory_info().rss
+                valores['process_threads'] = proceso.num_threads()
+            except Exception as e:
+                logger.warning(f"Failed to sample process metrics: {e}")
+        else:
+            valores['process_threads'] = threading.active_count()
+        return valores
+
+    def collect(self):
+        valores = self.sample()
+        documentacion = {
+            'cpu_usage_percent': 'Process CPU usage since the previous scrape (percent of one core)',
+            'memory_usage_bytes': 'Current memory usage (RSS) in bytes',
+            'process_threads': 'Number of threads of the process',
+        }
+        for nombre, valor in valores.items():
+            yield GaugeMetricFamily(nombre, documentacion[nombre], value=valor)
 
-        # Memory usage
-        process = psutil.Process(os.getpid())
-        memory_info = process.memory_info()
-        MEMORY_USAGE.set(memory_info.rss)
+        pendientes = GaugeMetricFamily(
+            'python_gc_pending_count', 'GC counters per generation: allocations since the last '
+            'collection (gen 0) or collections of the younger generation (gen 1, 2)',
+            labels=['generation'])
+        for generacion, cantidad in enumerate(gc.get_count()):
+            pendientes.add_metric([str(generacion)], cantidad)
+        yield pendientes
 
-        # CPU usage
-        cpu_percent = process.cpu_percent(interval=1)
-        CPU_USAGE.set(cpu_percent)
+        activas = GaugeMetricFamily(
+            'db_connections_active', 'Database connections checked out of the pool',
+            labels=['engine'])
+        pool = GaugeMetricFamily(
+            'db_pool_connections', 'Database pool connections by state',
+            labels=['engine', 'state'])
+        for nombre, engine in list(self._engines.items()):
+            p = engine.pool
+            if not hasattr(p, 'checkedout'):
+                continue  # StaticPool / SingletonThreadPool: sin contadores
+            activas.add_metric([nombre], p.checkedout())
+            pool.add_metric([nombre, 'checked_out'], p.checkedout())
+            pool.add_metric([nombre, 'checked_in'], p.checkedin())
+            pool.add_metric([nombre, 'overflow'], max(p.overflow(), 0))
+            pool.add_metric([nombre, 'size'], p.size())
+        yield activas
+        yield pool
 
-    except ImportError:
-        # psutil not available
-        pass
+
+SYSTEM_METRICS = SystemMetricsCollector()
+REGISTRY.register(SYSTEM_METRICS)
+
+
+def init_system_metrics(app):
+    """Expose the pool usage of the app's database engine at scrape time"""
+    if 'sqlalchemy' not in app.extensions:
+        return
+    from . import db
+    with app.app_context():
+        SYSTEM_METRICS.bind_engine(db.engine)
+
+
+def update_system_metrics(flask_app=None):
+    """
+    Take a system sample now (kept for callers of the old periodic job).
+    Nothing sleeps: CPU usage is the delta since the previous sample.
+    """
+    try:
+        return SYSTEM_METRICS.sample()
     except Exception as e:
         logger.warning(f"Failed to update system metrics: {e}")
+        return {}
+
+
+# =============================
+#   SQL PER REQUEST / N+1
+# =============================
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def statement_fingerprint(statement):
+    """SQL with literals and IN lists collapsed, to group repeated statements"""
+    sql = _SPACES_RE.sub(' ', statement).strip()
+    sql = _LITERAL_RE.sub('?', sql)
+    sql = re.sub(r"%\(\w+\)s|:\w+|\$\d+|__\[POSTCOMPILE_\w+\]", '?', sql)
+    return _IN_LIST_RE.sub('(?)', sql)[:300]
+
+
+def _query_endpoint():
+    if has_request_context():
+        return request.endpoint or 'unknown'
+    return 'background'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get('query_start_time')
+    if not inicios:
+        return
+    duration = time.perf_counter() - inicios.pop()
+    operation = statement.lstrip().split(' ', 1)[0].upper()
+    if operation not in ('SELECT', 'INSERT', 'UPDATE', 'DELETE'):
+        operation = 'OTHER'
+    DB_QUERY_DURATION.labels(endpoint=_query_endpoint(), operation=operation).observe(duration)
+
+    if has_request_context():
+        stats = _request_sql_stats()
+        stats['count'] += 1
+        stats['time'] += duration
+        stats['statements'][statement_fingerprint(statement)] += 1
+
+
+def _handle_error(exception_context):
+    """A failed statement never reaches after_cursor_execute: drop its start time"""
+    conn = exception_context.connection
+    inicios = conn.info.get('query_start_time') if conn is not None else None
+    if inicios:
+        inicios.pop()
+
+
+def _request_sql_stats():
+    stats = g.get('sql_stats')
+    if stats is None:
+        stats = g.sql_stats = {'count': 0, 'time': 0.0, 'statements': Tally()}
+    return stats
+
+
+def _record_request_sql(app, stats, endpoint, method, path):
+    DB_QUERIES_PER_REQUEST.labels(endpoint=endpoint).observe(stats['count'])
+    DB_TIME_PER_REQUEST.labels(endpoint=endpoint).observe(stats['time'])
+
+    limite = app.config.get('DB_N_PLUS_ONE_THRESHOLD', 30)
+    repetidas = app.config.get('DB_REPEATED_STATEMENT_THRESHOLD', 10)
+    top = stats['statements'].most_common(3)
+    if stats['count'] > limite or (top and top[0][1] >= repetidas):
+        DB_N_PLUS_ONE.labels(endpoint=endpoint).inc()
+        detalle = '; '.join(f"{veces}x {sql[:160]}" for sql, veces in top)
+        logger.warning(
+            f"Possible N+1 in {endpoint} ({method} {path}): "
+            f"{stats['count']} statements, {stats['time'] * 1000:.1f} ms. Top: {detalle}")
+
+
+def init_db_metrics(app):
+    """
+    Count and time every SQL statement (cursor events on all engines) and,
+    per request: statements histogram, N+1 warning with the repeated statement
+    fingerprints and, with SERVER_TIMING, a Server-Timing header.
+
+    Streamed responses run their queries after after_request, so they are
+    recorded when the response is closed (the header only covers the SQL
+    done before the body starts).
+    """
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    @app.after_request
+    def db_request_metrics(response):
+        if response.is_streamed:
+            stats = _request_sql_stats()
+        else:
+            stats = g.get('sql_stats')
+            if stats is None:
+                return response
+
+        if app.config.get('SERVER_TIMING'):
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={stats["time"] * 1000:.1f};desc="{stats["count"]} queries"')
+
+        args = (app, stats, request.endpoint or 'unknown', request.method, request.path)
+        if response.is_streamed:
+            response.call_on_close(lambda: _record_request_sql(*args))
+        else:
+            _record_request_sql(*args)
+        return response
+
+
+# =============================
+#         PDF RENDER
+# =============================
+
+def observe_pdf_render(medicion):
+    """
+    Record a render measured by app/utils/render_pdf.py. Called in the API
+    process, so renders done in the process pool are counted too.
+    """
+    documento = medicion['tipo']
+    PDF_RENDER_DURATION.labels(document=documento).observe(medicion['segundos'])
+    if medicion['bytes'] is not None:
+        PDF_OUTPUT_BYTES.labels(document=documento).observe(medicion['bytes'])
+    for campo in medicion['campos']:
+        field = str(campo['campo'])
+        PDF_FIT_ITERATIONS.labels(field=field).observe(campo['iterations'])
+        if campo['truncated']:
+            PDF_FIT_TRUNCATED.labels(field=field).inc()
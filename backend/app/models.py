@@ -12,6 +12,9 @@ class Pais(db.Model):
 
 class Ciudad(db.Model):
     __tablename__ = 'ciudades'
+    __table_args__ = (
+        db.Index('ix_ciudades_pais_id', 'pais_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
     pais_id = db.Column(db.Integer, db.ForeignKey('paises.id'), nullable=False)
@@ -28,7 +31,8 @@ class Usuario(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=True)
     clave_hash = db.Column(db.String(256), nullable=False)
     rol = db.Column(db.String(20), nullable=False, default='operador')
-    estado = db.Column(db.String(15), nullable=False, default='activo')
+    estado = db.column_property(
+        db.Column(db.String(15), nullable=False, default='activo'), active_history=True)
     creado_en = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     ultimo_login = db.Column(db.DateTime, nullable=True)
     refresh_token = db.Column(db.String(512), nullable=True)
@@ -49,6 +53,9 @@ class Moneda(db.Model):
 
 class Remitente(db.Model):
     __tablename__ = 'remitentes'
+    __table_args__ = (
+        db.Index('ix_remitentes_ciudad_id', 'ciudad_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     tipo_documento = db.Column(db.String(30))
     numero_documento = db.Column(db.String(40))
@@ -60,6 +67,9 @@ class Remitente(db.Model):
 
 class Transportadora(db.Model):
     __tablename__ = 'transportadoras'
+    __table_args__ = (
+        db.Index('ix_transportadoras_ciudad_id', 'ciudad_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     codigo = db.Column(db.String(30), nullable=False)
     # Campo numérico para honorario base
@@ -78,9 +88,16 @@ class Transportadora(db.Model):
 
 class Honorario(db.Model):
     __tablename__ = 'honorarios'
+    __table_args__ = (
+        db.Index('ix_honorarios_fecha', 'fecha'),
+        db.Index('ix_honorarios_transportadora_id_fecha', 'transportadora_id', 'fecha'),
+        db.Index('ix_honorarios_moneda_id', 'moneda_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     descripcion = db.Column(db.String(120))
-    monto = db.Column(db.Numeric(18, 2), nullable=False)
+    # active_history: el valor anterior se conoce al cambiarlo (métricas de negocio, metrics.py)
+    monto = db.column_property(
+        db.Column(db.Numeric(18, 2), nullable=False), active_history=True)
     transportadora_id = db.Column(db.Integer, db.ForeignKey(
         'transportadoras.id'), nullable=False)
     fecha = db.Column(db.Date, nullable=False, default=datetime.utcnow)
@@ -90,6 +107,9 @@ class Honorario(db.Model):
 
 class Movimiento(db.Model):
     __tablename__ = 'movimientos'
+    __table_args__ = (
+        db.Index('ix_movimientos_fecha', 'fecha'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     fecha = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     monto = db.Column(db.Numeric(18, 2), nullable=False)
@@ -105,6 +125,9 @@ class Movimiento(db.Model):
 
 class Reporte(db.Model):
     __tablename__ = 'reportes'
+    __table_args__ = (
+        db.Index('ix_reportes_generado_en', 'generado_en'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     tipo = db.Column(db.String(40))
     datos = db.Column(db.Text)
@@ -112,6 +135,30 @@ class Reporte(db.Model):
     generado_en = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+class ReporteJob(db.Model):
+    """Reporte pedido en background: cola compartida por todos los workers (background_jobs.py)"""
+    __tablename__ = 'reporte_jobs'
+    __table_args__ = (
+        db.Index('ix_reporte_jobs_estado_creado_en', 'estado', 'creado_en'),
+        db.Index('ix_reporte_jobs_usuario_id', 'usuario_id'),
+    )
+    id = db.Column(db.String(64), primary_key=True)
+    tipo = db.Column(db.String(40), nullable=False)
+    parametros = db.Column(db.Text)
+    # queued -> processing -> completed | failed | cancelled
+    estado = db.Column(db.String(20), nullable=False, default='queued')
+    progreso = db.Column(db.Integer, nullable=False, default=0)
+    mensaje = db.Column(db.String(255))
+    resultado = db.Column(db.Text)
+    error = db.Column(db.Text)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
+    worker = db.Column(db.String(80))
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    creado_en = db.Column(db.DateTime, default=datetime.utcnow)
+    iniciado_en = db.Column(db.DateTime)
+    finalizado_en = db.Column(db.DateTime)
+
+
 class ConfigImpresora(db.Model):
     __tablename__ = 'config_impresora'
     id = db.Column(db.Integer, primary_key=True)
@@ -129,6 +176,28 @@ class Parametro(db.Model):
 
 class CRT(db.Model):
     __tablename__ = "crts"
+    __table_args__ = (
+        # Filtros del listado + orden por id DESC (paginación por cursor)
+        db.Index('ix_crts_estado_id', 'estado', 'id'),
+        db.Index('ix_crts_transportadora_id_id', 'transportadora_id', 'id'),
+        # Siguiente número por transportadora (prefijo PY + orden por número)
+        db.Index('ix_crts_transportadora_id_numero_crt',
+                 'transportadora_id', 'numero_crt'),
+        db.Index('ix_crts_fecha_emision', 'fecha_emision'),
+        # LIKE 'PY%' en PostgreSQL necesita varchar_pattern_ops
+        db.Index('ix_crts_numero_crt_patron', 'numero_crt',
+                 postgresql_ops={'numero_crt': 'varchar_pattern_ops'}
+                 ).ddl_if(dialect='postgresql'),
+        # FKs usadas en joins
+        db.Index('ix_crts_remitente_id', 'remitente_id'),
+        db.Index('ix_crts_destinatario_id', 'destinatario_id'),
+        db.Index('ix_crts_consignatario_id', 'consignatario_id'),
+        db.Index('ix_crts_notificar_a_id', 'notificar_a_id'),
+        db.Index('ix_crts_moneda_id', 'moneda_id'),
+        db.Index('ix_crts_ciudad_emision_id', 'ciudad_emision_id'),
+        db.Index('ix_crts_pais_emision_id', 'pais_emision_id'),
+        db.Index('ix_crts_usuario_id', 'usuario_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     numero_crt = db.Column(db.String(30), unique=True, nullable=False)
     fecha_emision = db.Column(db.DateTime, default=datetime.utcnow)
@@ -195,6 +264,9 @@ class CRT(db.Model):
 
 class CRT_Gasto(db.Model):
     __tablename__ = "crt_gastos"
+    __table_args__ = (
+        db.Index('ix_crt_gastos_crt_id', 'crt_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     crt_id = db.Column(db.Integer, db.ForeignKey('crts.id'), nullable=False)
     tramo = db.Column(db.String(120), nullable=False)
@@ -209,8 +281,24 @@ class CRT_Gasto(db.Model):
         'Moneda', foreign_keys=[moneda_destinatario_id])
 
 
+class CRT_Secuencia(db.Model):
+    """Último número PY######### asignado por transportadora (utils/numeracion_crt.py)"""
+    __tablename__ = "crt_secuencias"
+    transportadora_id = db.Column(db.Integer, db.ForeignKey(
+        'transportadoras.id'), primary_key=True, autoincrement=False)
+    ultimo_numero = db.Column(db.Integer, nullable=False, default=0)
+    actualizado_en = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class MIC(db.Model):
     __tablename__ = "mics"
+    __table_args__ = (
+        db.Index('ix_mics_campo_4_estado_id', 'campo_4_estado', 'id'),
+        db.Index('ix_mics_campo_6_fecha', 'campo_6_fecha'),
+        db.Index('ix_mics_creado_en', 'creado_en'),
+        db.Index('ix_mics_crt_id', 'crt_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     crt_id = db.Column(db.Integer, db.ForeignKey('crts.id'))
     campo_1_transporte = db.Column(db.String(150))
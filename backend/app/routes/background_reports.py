@@ -10,6 +10,15 @@ background_reports_bp = Blueprint(
     'background_reports', __name__, url_prefix='/api/background-reports')
 
 
+def _es_admin(user):
+    return bool(user) and user.get('rol') == 'admin'
+
+
+def _puede_ver(status, user):
+    """Cada usuario ve sus jobs; admin ve todos (y los del sistema)"""
+    return _es_admin(user) or (bool(user) and status.get('user_id') == user.get('user_id'))
+
+
 @background_reports_bp.route('/create', methods=['POST'])
 @token_required
 def create_report():
@@ -32,7 +41,7 @@ def create_report():
 
         # Crear el job
         job_id = create_report_job(
-            report_type, parameters, user['id'] if user else None)
+            report_type, parameters, user['user_id'] if user else None)
 
         return jsonify({
             'success': True,
@@ -53,7 +62,7 @@ def get_report_status(job_id):
     try:
         status = get_job_status(job_id)
 
-        if status['status'] == 'not_found':
+        if status['status'] == 'not_found' or not _puede_ver(status, get_current_user()):
             return jsonify({'error': 'Job no encontrado'}), 404
 
         return jsonify(status), 200
@@ -69,7 +78,9 @@ def get_active_reports():
     Obtener todos los reportes activos
     """
     try:
-        active_jobs = get_active_jobs()
+        user = get_current_user()
+        active_jobs = get_active_jobs(
+            None if _es_admin(user) else user['user_id'])
         return jsonify({
             'jobs': active_jobs,
             'count': len(active_jobs)
@@ -86,6 +97,10 @@ def cancel_report(job_id):
     Cancelar un reporte en proceso
     """
     try:
+        status = get_job_status(job_id)
+        if status['status'] == 'not_found' or not _puede_ver(status, get_current_user()):
+            return jsonify({'error': 'Job no encontrado'}), 404
+
         success = cancel_job(job_id)
 
         if success:
@@ -0,0 +1,33 @@
+from flask import Blueprint, request, jsonify
+
+from app.utils.busqueda import buscar_crts, buscar_mics, motor_busqueda
+
+busqueda_bp = Blueprint('busqueda', __name__, url_prefix='/api/busqueda')
+
+LIMITE_MAXIMO = 200
+
+
+def _parametros():
+    q = (request.args.get('q', '', type=str) or '').strip()
+    limite = min(max(request.args.get('limit', 50, type=int), 1), LIMITE_MAXIMO)
+    return q, limite
+
+
+# Ids de CRT ordenados por relevancia (número, mercadería, remitente, transportadora)
+@busqueda_bp.route('/crts', methods=['GET'])
+def buscar_crts_route():
+    try:
+        q, limite = _parametros()
+        return jsonify({"ids": buscar_crts(q, limite), "motor": motor_busqueda(), "q": q})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# Ids de MIC ordenados por relevancia (transporte, placas, destino, carta de porte)
+@busqueda_bp.route('/mics', methods=['GET'])
+def buscar_mics_route():
+    try:
+        q, limite = _parametros()
+        return jsonify({"ids": buscar_mics(q, limite), "motor": motor_busqueda(), "q": q})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from app.models import Ciudad, Pais
-from app import db, cache
+from app import db
+from app.utils.cache_tablas import cache_por_tablas, condicional_por_tablas
 
 ciudades_bp = Blueprint('ciudades', __name__, url_prefix='/api/ciudades')
 
@@ -8,7 +9,9 @@ ciudades_bp = Blueprint('ciudades', __name__, url_prefix='/api/ciudades')
 
 
 @ciudades_bp.route('/', methods=['GET'])
-@cache.cached(timeout=600)  # Cache por 10 minutos
+# Cache por 10 minutos; se invalida al modificar ciudades o países
+@condicional_por_tablas("ciudades", "paises")
+@cache_por_tablas("ciudades", "paises", timeout=600, query_string=True)
 def listar_ciudades():
     pais_id = request.args.get('pais_id', type=int)
     query = Ciudad.query
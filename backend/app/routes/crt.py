@@ -1,22 +1,37 @@
 # ========== IMPORTS LIMPIOS ==========
-from flask import Blueprint, request, jsonify, send_file
-from sqlalchemy import text, or_
-from sqlalchemy.orm import joinedload, aliased
+from flask import Blueprint, request, jsonify, send_file, Response, stream_with_context
+from werkzeug.datastructures import MultiDict
+from sqlalchemy import text, func
+from sqlalchemy.orm import joinedload, selectinload, aliased
 from datetime import datetime, timedelta
 from io import BytesIO
 import traceback
-
-from app.models import db, CRT, CRT_Gasto, Remitente, Transportadora, Ciudad, Pais, Moneda
-
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfbase.pdfmetrics import stringWidth
-
-from app.utils.layout_crt import dibujar_lineas_dinamicas, lineas
+import zipfile
+
+from app.models import db, CRT, CRT_Gasto, Remitente, Transportadora, Ciudad, Moneda
+
+from app.utils.render_pdf import (
+    renderizar_pdf, renderizar_varios, comprobar_cupo, RenderSaturadoError)
+from app.utils.cache_pdf import enviar_pdf
+from app.utils.paginacion import (
+    usa_cursor, por_pagina, paginar_por_cursor, total_cacheado, respuesta_cursor)
+from app.utils.busqueda import filtro_texto_crt
+from app.utils.cache_tablas import cache_por_tablas, condicional_por_tablas
+from app.utils.datos_maestros import respuesta_seccion
+from app.utils.streaming_json import (
+    respuesta_json_streaming, filas_en_tandas, entidades_en_tandas)
+from app.utils.exportacion import Columna, respuesta_exportacion, FormatoNoDisponibleError
+from app.utils.numeracion_crt import (
+    parsear_numero, siguiente_numero, reservar_numero, reservar_numeros, avanzar_secuencia,
+    insertar_con_numero_libre, NumeroCRTDuplicadoError)
 
 
 crt_bp = Blueprint('crt', __name__, url_prefix='/api/crts')
 
+# Tablas de las que dependen los listados y el detalle de CRTs (cache y ETag)
+TABLAS_LISTADO_CRT = ("crts", "crt_gastos", "remitentes", "transportadoras",
+                      "monedas", "ciudades", "paises")
+
 # ========== FUNCIONES AUXILIARES UNIVERSALES ==========
 
 
@@ -136,92 +151,252 @@ def to_dict_crt(crt):
 
 @crt_bp.route('/next_number', methods=['GET'])
 def get_next_crt_number():
-    transportadora_id = request.args.get('transportadora_id')
+    transportadora_id = request.args.get('transportadora_id', type=int)
     codigo = request.args.get('codigo')
-    if not transportadora_id or not codigo or len(codigo) != 11 or not codigo.startswith("PY") or not codigo[2:].isdigit():
+    base = parsear_numero(codigo)
+    if not transportadora_id or base is None:
         return jsonify({'error': 'Código inválido'}), 400
 
-    ultimo_crt = (
-        CRT.query
-        .filter(
-            CRT.transportadora_id == transportadora_id,
-            CRT.numero_crt.startswith("PY"),
-            db.func.length(CRT.numero_crt) == 11
-        )
-        .order_by(CRT.numero_crt.desc())
-        .first()
-    )
+    # Sugerencia desde crt_secuencias (sin recorrer crts); se reserva al guardar
+    numero_crt = siguiente_numero(transportadora_id, base)
+    db.session.commit()
+    return jsonify({'next_number': numero_crt})
 
-    if ultimo_crt and ultimo_crt.numero_crt:
-        try:
-            ultimo_num = int(ultimo_crt.numero_crt[2:])
-            siguiente = ultimo_num + 1
-        except Exception:
-            siguiente = int(codigo[2:])
-    else:
-        siguiente = int(codigo[2:])
 
-    numero_crt = f"PY{siguiente:09d}"
-    return jsonify({'next_number': numero_crt})
+@crt_bp.route('/next_number/reservar', methods=['POST'])
+def reservar_crt_numbers():
+    """Reserva atómica de uno o varios números (carga masiva / lotes)."""
+    try:
+        data = request.get_json(silent=True) or {}
+        transportadora_id = data.get('transportadora_id')
+        cantidad = int(data.get('cantidad', 1))
+        base = parsear_numero(data.get('codigo'))
+        if not transportadora_id or (data.get('codigo') and base is None):
+            return jsonify({'error': 'Código inválido'}), 400
+        if not db.session.get(Transportadora, transportadora_id):
+            return jsonify({'error': 'Transportadora no encontrada'}), 404
+
+        numeros = reservar_numeros(transportadora_id, cantidad, base)
+        db.session.commit()
+        return jsonify({'numeros': numeros}), 201
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
 
 # ========== LISTAR CRTs ==========
 
 
+def consulta_lista_crt():
+    """
+    Proyección liviana para los listados: sólo las columnas que muestran las
+    vistas, nombres de las entidades por outerjoin y la cantidad de gastos en
+    una subconsulta correlacionada. Devuelve filas, no objetos CRT.
+    """
+    Rem = aliased(Remitente)
+    Dest = aliased(Remitente)
+    Cons = aliased(Remitente)
+    Notif = aliased(Remitente)
+    cantidad_gastos = (db.session.query(func.count(CRT_Gasto.id))
+                       .filter(CRT_Gasto.crt_id == CRT.id)
+                       .correlate(CRT).scalar_subquery())
+    return (db.session.query(
+        CRT.id, CRT.numero_crt, CRT.fecha_emision, CRT.estado,
+        CRT.remitente_id, Rem.nombre.label('remitente'),
+        CRT.transportadora_id, Transportadora.nombre.label('transportadora'),
+        CRT.destinatario_id, Dest.nombre.label('destinatario'),
+        CRT.consignatario_id, Cons.nombre.label('consignatario'),
+        CRT.notificar_a_id, Notif.nombre.label('notificar_a'),
+        CRT.moneda_id, Moneda.nombre.label('moneda'),
+        CRT.factura_exportacion, CRT.nro_despacho, CRT.incoterm,
+        CRT.valor_mercaderia,
+        cantidad_gastos.label('cantidad_gastos'))
+        .outerjoin(Rem, Rem.id == CRT.remitente_id)
+        .outerjoin(Transportadora, Transportadora.id == CRT.transportadora_id)
+        .outerjoin(Dest, Dest.id == CRT.destinatario_id)
+        .outerjoin(Cons, Cons.id == CRT.consignatario_id)
+        .outerjoin(Notif, Notif.id == CRT.notificar_a_id)
+        .outerjoin(Moneda, Moneda.id == CRT.moneda_id))
+
+
+def to_dict_crt_lista(row):
+    """Fila de consulta_lista_crt -> dict del listado (mismo formato que to_dict_crt)."""
+    return {
+        "id": row.id,
+        "numero_crt": row.numero_crt or "",
+        "fecha_emision": row.fecha_emision.strftime('%Y-%m-%d') if row.fecha_emision else "",
+        "estado": row.estado or "",
+        "remitente_id": row.remitente_id,
+        "remitente": row.remitente or "",
+        "transportadora_id": row.transportadora_id,
+        "transportadora": row.transportadora or "",
+        "destinatario_id": row.destinatario_id,
+        "destinatario": row.destinatario or "",
+        "consignatario_id": row.consignatario_id,
+        "consignatario": row.consignatario or "",
+        "notificar_a_id": row.notificar_a_id,
+        "notificar_a": row.notificar_a or "",
+        "moneda_id": row.moneda_id,
+        "moneda": row.moneda or "",
+        "factura_exportacion": row.factura_exportacion or "",
+        "nro_despacho": row.nro_despacho or "",
+        "incoterm": row.incoterm or "",
+        "valor_mercaderia": f"{float(row.valor_mercaderia):.2f}".replace(".", ",")
+        if row.valor_mercaderia is not None else "",
+        "cantidad_gastos": row.cantidad_gastos or 0,
+    }
+
+
 @crt_bp.route('/', methods=['GET'])
+@condicional_por_tablas(*TABLAS_LISTADO_CRT)
+@cache_por_tablas(*TABLAS_LISTADO_CRT, timeout=120, query_string=True)
 def listar_crts():
+    """
+    Listado de CRTs con la proyección liviana (sin hidratar objetos ni gastos).
+    ?completo=1 devuelve el formato completo de to_dict_crt (con gastos).
+    Sin page/page_size el arreglo se envía en streaming.
+    """
     # Permite page_size o per_page (ambos válidos)
     page = request.args.get('page', type=int, default=None)
     page_size = request.args.get('page_size', type=int, default=None) \
         or request.args.get('per_page', type=int, default=None)
-
-    q = CRT.query.options(
-        joinedload(CRT.gastos),
-        joinedload(CRT.remitente),
-        joinedload(CRT.transportadora),
-        joinedload(CRT.destinatario),
-        joinedload(CRT.consignatario),
-        joinedload(CRT.moneda),
-        joinedload(CRT.notificar_a)
-    ).order_by(CRT.id.desc())
+    completo = request.args.get('completo') in ('1', 'true', 'True')
+
+    if completo:
+        q = CRT.query.options(
+            selectinload(CRT.gastos),
+            joinedload(CRT.remitente),
+            joinedload(CRT.transportadora),
+            joinedload(CRT.destinatario),
+            joinedload(CRT.consignatario),
+            joinedload(CRT.moneda),
+            joinedload(CRT.notificar_a)
+        ).order_by(CRT.id.desc())
+        serializar = to_dict_crt
+    else:
+        q = consulta_lista_crt().order_by(CRT.id.desc())
+        serializar = to_dict_crt_lista
 
     if page and page_size:
-        items = q.paginate(page=page, per_page=page_size, error_out=False)
-        crts = [to_dict_crt(c) for c in items.items]
+        total = db.session.query(func.count(CRT.id)).scalar()
+        filas = q.offset((page - 1) * page_size).limit(page_size).all()
         return jsonify({
-            "total": items.total,
-            "page": items.page,
-            "pages": items.pages,
-            "crts": crts
+            "total": total,
+            "page": page,
+            "pages": (total + page_size - 1) // page_size if total else 0,
+            "crts": [serializar(f) for f in filas]
         })
     else:
-        crts = q.all()
-        return jsonify([to_dict_crt(c) for c in crts])
+        # Sin paginar: streaming por tandas, memoria constante
+        filas = entidades_en_tandas(q, CRT.id) if completo else filas_en_tandas(q)
+        return respuesta_json_streaming(filas, serializar)
+
+
+# ========== FILTROS COMUNES DEL LISTADO ==========
+
+
+def aplicar_filtros_crt(query, args):
+    """
+    Aplica los filtros del listado de CRTs (q, estado, transportadora_id,
+    fecha_desde, fecha_hasta) a una query sobre CRT.
+    Retorna (query, filtros_aplicados).
+    """
+    if not isinstance(args, MultiDict):
+        args = MultiDict(args or {})
+
+    buscar = (args.get('q', '', type=str) or '').strip()
+    estado = args.get('estado', '', type=str)
+    transportadora_id = args.get('transportadora_id', type=int)
+    fecha_desde = args.get('fecha_desde', '', type=str)
+    fecha_hasta = args.get('fecha_hasta', '', type=str)
+
+    # Filtro de búsqueda: subconsulta de ids (FTS5 / pg_trgm / ILIKE), sin joins ni distinct
+    if buscar:
+        query = query.filter(filtro_texto_crt(buscar))
+
+    if estado:
+        query = query.filter(CRT.estado == estado)
+
+    if transportadora_id:
+        query = query.filter(CRT.transportadora_id == transportadora_id)
+
+    if fecha_desde:
+        fecha_desde_dt = datetime.strptime(fecha_desde, '%Y-%m-%d')
+        query = query.filter(CRT.fecha_emision >= fecha_desde_dt)
+
+    if fecha_hasta:
+        # Inclusivo: hasta el final del día
+        fecha_hasta_dt = datetime.strptime(
+            fecha_hasta, '%Y-%m-%d') + timedelta(days=1) - timedelta(microseconds=1)
+        query = query.filter(CRT.fecha_emision <= fecha_hasta_dt)
+
+    filtros = {
+        "buscar": buscar,
+        "estado": estado,
+        "transportadora_id": transportadora_id,
+        "fecha_desde": fecha_desde,
+        "fecha_hasta": fecha_hasta
+    }
+    return query, filtros
 
 
 # ========== ✅ NUEVO: LISTADO PAGINADO CON ACCIONES ==========
 
 
+def to_dict_crt_con_acciones(crt):
+    """to_dict_crt + ciudades/países de las entidades, acciones y urls (listado paginado)."""
+    crt_dict = to_dict_crt(crt)
+    crt_dict.update({
+        "ciudad_emision": crt.ciudad_emision.nombre if crt.ciudad_emision else "",
+        "pais_emision": crt.pais_emision.nombre if crt.pais_emision else "",
+
+        "remitente_ciudad": crt.remitente.ciudad.nombre if crt.remitente and crt.remitente.ciudad else "",
+        "remitente_pais": crt.remitente.ciudad.pais.nombre if crt.remitente and crt.remitente.ciudad and crt.remitente.ciudad.pais else "",
+
+        "destinatario_ciudad": crt.destinatario.ciudad.nombre if crt.destinatario and crt.destinatario.ciudad else "",
+        "destinatario_pais": crt.destinatario.ciudad.pais.nombre if crt.destinatario and crt.destinatario.ciudad and crt.destinatario.ciudad.pais else "",
+
+        "consignatario_ciudad": crt.consignatario.ciudad.nombre if crt.consignatario and crt.consignatario.ciudad else "",
+        "consignatario_pais": crt.consignatario.ciudad.pais.nombre if crt.consignatario and crt.consignatario.ciudad and crt.consignatario.ciudad.pais else "",
+
+        "transportadora_ciudad": crt.transportadora.ciudad.nombre if crt.transportadora and crt.transportadora.ciudad else "",
+        "transportadora_pais": crt.transportadora.ciudad.pais.nombre if crt.transportadora and crt.transportadora.ciudad and crt.transportadora.ciudad.pais else "",
+
+        "acciones": {
+            "puede_editar": True,
+            "puede_eliminar": crt.estado != "FINALIZADO",
+            "puede_generar_pdf": True,
+            "puede_generar_mic": True,
+            "puede_duplicar": True
+        },
+        "urls": {
+            "detalle": f"/api/crts/{crt.id}",
+            "editar": f"/api/crts/{crt.id}",
+            "eliminar": f"/api/crts/{crt.id}",
+            "pdf": f"/api/crts/{crt.id}/pdf",
+            "mic_pdf": f"/api/mic/generate_pdf_from_crt/{crt.id}",
+            "duplicar": f"/api/crts/{crt.id}/duplicate"
+        }
+    })
+    return crt_dict
+
+
 @crt_bp.route('/paginated', methods=['GET'])
+@condicional_por_tablas(*TABLAS_LISTADO_CRT)
+@cache_por_tablas(*TABLAS_LISTADO_CRT, timeout=120, query_string=True)
 def listar_crts_paginated_con_acciones():
     """
-    Listado paginado con filtros, outerjoin + distinct, y fecha_hasta inclusivo.
+    Listado paginado con filtros, búsqueda por subconsulta de ids, y fecha_hasta inclusivo.
+    Con ?cursor= (vacío para la primera página) pagina por keyset sobre id
+    DESC y devuelve next_cursor; el total sólo con ?con_total=1 (cacheado).
     """
     try:
         # Parámetros de paginación
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
 
-        # Parámetros de filtrado
-        buscar = request.args.get('q', '', type=str).strip()
-        estado = request.args.get('estado', '', type=str)
-        transportadora_id = request.args.get('transportadora_id', type=int)
-        fecha_desde = request.args.get('fecha_desde', '', type=str)
-        fecha_hasta = request.args.get('fecha_hasta', '', type=str)
-
-        # Aliases para outerjoin
-        Rem = aliased(Remitente)
-        Trans = aliased(Transportadora)
-
         # Query base con relaciones
         query = CRT.query.options(
             joinedload(CRT.remitente).joinedload(
@@ -240,77 +415,25 @@ def listar_crts_paginated_con_acciones():
             joinedload(CRT.pais_emision)
         )
 
-        # Filtro de búsqueda (outerjoin para no excluir nulos) + distinct para evitar duplicados
-        if buscar:
-            like = f"%{buscar}%"
-            query = (query
-                     .outerjoin(Rem, CRT.remitente)
-                     .outerjoin(Trans, CRT.transportadora)
-                     .filter(or_(
-                         CRT.numero_crt.ilike(like),
-                         Rem.nombre.ilike(like),
-                         Trans.nombre.ilike(like),
-                         CRT.detalles_mercaderia.ilike(like)
-                     ))
-                     .distinct())
-
-        if estado:
-            query = query.filter(CRT.estado == estado)
-
-        if transportadora_id:
-            query = query.filter(CRT.transportadora_id == transportadora_id)
-
-        if fecha_desde:
-            fecha_desde_dt = datetime.strptime(fecha_desde, '%Y-%m-%d')
-            query = query.filter(CRT.fecha_emision >= fecha_desde_dt)
-
-        if fecha_hasta:
-            # Inclusivo: hasta el final del día
-            fecha_hasta_dt = datetime.strptime(
-                fecha_hasta, '%Y-%m-%d') + timedelta(days=1) - timedelta(microseconds=1)
-            query = query.filter(CRT.fecha_emision <= fecha_hasta_dt)
+        query, filtros_aplicados = aplicar_filtros_crt(query, request.args)
+
+        if usa_cursor(request.args):
+            per_page = por_pagina(request.args)
+            crts, next_cursor = paginar_por_cursor(
+                query, CRT.id, request.args, per_page)
+            return jsonify({
+                "crts": [to_dict_crt_con_acciones(crt) for crt in crts],
+                "pagination": respuesta_cursor(
+                    next_cursor, total_cacheado(query, 'crts', request.args), per_page),
+                "filtros_aplicados": filtros_aplicados
+            })
 
         # Orden y paginación
         query = query.order_by(CRT.id.desc())
         pagination = query.paginate(
             page=page, per_page=per_page, error_out=False)
 
-        crts_data = []
-        for crt in pagination.items:
-            crt_dict = to_dict_crt(crt)
-            crt_dict.update({
-                "ciudad_emision": crt.ciudad_emision.nombre if crt.ciudad_emision else "",
-                "pais_emision": crt.pais_emision.nombre if crt.pais_emision else "",
-
-                "remitente_ciudad": crt.remitente.ciudad.nombre if crt.remitente and crt.remitente.ciudad else "",
-                "remitente_pais": crt.remitente.ciudad.pais.nombre if crt.remitente and crt.remitente.ciudad and crt.remitente.ciudad.pais else "",
-
-                "destinatario_ciudad": crt.destinatario.ciudad.nombre if crt.destinatario and crt.destinatario.ciudad else "",
-                "destinatario_pais": crt.destinatario.ciudad.pais.nombre if crt.destinatario and crt.destinatario.ciudad and crt.destinatario.ciudad.pais else "",
-
-                "consignatario_ciudad": crt.consignatario.ciudad.nombre if crt.consignatario and crt.consignatario.ciudad else "",
-                "consignatario_pais": crt.consignatario.ciudad.pais.nombre if crt.consignatario and crt.consignatario.ciudad and crt.consignatario.ciudad.pais else "",
-
-                "transportadora_ciudad": crt.transportadora.ciudad.nombre if crt.transportadora and crt.transportadora.ciudad else "",
-                "transportadora_pais": crt.transportadora.ciudad.pais.nombre if crt.transportadora and crt.transportadora.ciudad and crt.transportadora.ciudad.pais else "",
-
-                "acciones": {
-                    "puede_editar": True,
-                    "puede_eliminar": crt.estado != "FINALIZADO",
-                    "puede_generar_pdf": True,
-                    "puede_generar_mic": True,
-                    "puede_duplicar": True
-                },
-                "urls": {
-                    "detalle": f"/api/crts/{crt.id}",
-                    "editar": f"/api/crts/{crt.id}",
-                    "eliminar": f"/api/crts/{crt.id}",
-                    "pdf": f"/api/crts/{crt.id}/pdf",
-                    "mic_pdf": f"/api/mic/generate_pdf_from_crt/{crt.id}",
-                    "duplicar": f"/api/crts/{crt.id}/duplicate"
-                }
-            })
-            crts_data.append(crt_dict)
+        crts_data = [to_dict_crt_con_acciones(crt) for crt in pagination.items]
 
         result = {
             "crts": crts_data,
@@ -324,19 +447,15 @@ def listar_crts_paginated_con_acciones():
                 "prev_num": pagination.prev_num,
                 "next_num": pagination.next_num
             },
-            "filtros_aplicados": {
-                "buscar": buscar,
-                "estado": estado,
-                "transportadora_id": transportadora_id,
-                "fecha_desde": fecha_desde,
-                "fecha_hasta": fecha_hasta
-            }
+            "filtros_aplicados": filtros_aplicados
         }
 
         print(
             f"✅ Listado paginado: {len(crts_data)} CRTs en página {page}/{pagination.pages}")
         return jsonify(result)
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"❌ Error en listado paginado: {e}")
         traceback.print_exc()
@@ -389,29 +508,12 @@ def duplicar_crt(crt_id):
             joinedload(CRT.gastos)
         ).get_or_404(crt_id)
 
-        # Generar nuevo número CRT
+        # Generar nuevo número CRT (reserva atómica en crt_secuencias)
         siguiente_numero = None
         if original_crt.transportadora:
-            # Usar la lógica existente para generar el siguiente número
-            ultimo_crt = (
-                CRT.query
-                .filter(
-                    CRT.transportadora_id == original_crt.transportadora_id,
-                    CRT.numero_crt.startswith("PY"),
-                    db.func.length(CRT.numero_crt) == 11
-                )
-                .order_by(CRT.numero_crt.desc())
-                .first()
-            )
-
-            if ultimo_crt and ultimo_crt.numero_crt:
-                try:
-                    ultimo_num = int(ultimo_crt.numero_crt[2:])
-                    siguiente_numero = f"PY{(ultimo_num + 1):09d}"
-                except Exception:
-                    siguiente_numero = f"PY{int(datetime.now().strftime('%Y%m%d%H%M')):09d}"
-            else:
-                siguiente_numero = f"PY{int(datetime.now().strftime('%Y%m%d%H%M')):09d}"
+            siguiente_numero = reservar_numero(
+                original_crt.transportadora_id,
+                parsear_numero(original_crt.transportadora.codigo))
 
         if not siguiente_numero:
             siguiente_numero = f"COPY_{original_crt.numero_crt}_{int(datetime.now().timestamp())}"
@@ -488,6 +590,7 @@ def duplicar_crt(crt_id):
 
 
 @crt_bp.route('/<int:crt_id>', methods=['GET'])
+@condicional_por_tablas(*TABLAS_LISTADO_CRT)
 def detalle_crt(crt_id):
     crt = CRT.query.options(
         joinedload(CRT.gastos),
@@ -504,6 +607,7 @@ def detalle_crt(crt_id):
 
 
 @crt_bp.route('/by_numero/<string:numero_crt>', methods=['GET'])
+@condicional_por_tablas(*TABLAS_LISTADO_CRT)
 def obtener_crt_por_numero(numero_crt):
     crt = CRT.query.options(
         joinedload(CRT.gastos),
@@ -531,10 +635,6 @@ def crear_crt():
             "valor_flete_externo", "valor_reembolso"
         ]
         data = limpiar_numericos(data, NUMERIC_FIELDS)
-        existe = CRT.query.filter_by(numero_crt=data.get("numero_crt")).first()
-        if existe:
-            return jsonify({"error": "Número de CRT ya existe, recargue la página."}), 400
-
         crt = CRT(
             numero_crt=data.get("numero_crt"),
             fecha_emision=datetime.strptime(data.get(
@@ -570,8 +670,12 @@ def crear_crt():
             firma_transportador=data.get("firma_transportador"),
             firma_destinatario=data.get("firma_destinatario")
         )
-        db.session.add(crt)
-        db.session.flush()
+        # Si el número sugerido lo guardó otro usuario se reserva el siguiente libre
+        try:
+            reasignado = insertar_con_numero_libre(crt)
+        except NumeroCRTDuplicadoError:
+            db.session.rollback()
+            return jsonify({"error": "Número de CRT ya existe, recargue la página."}), 400
 
         for gasto in data.get("gastos", []):
             g = CRT_Gasto(
@@ -584,8 +688,11 @@ def crear_crt():
                 moneda_destinatario_id=gasto.get("moneda_destinatario_id")
             )
             db.session.add(g)
+        avanzar_secuencia(crt.transportadora_id, crt.numero_crt)
         db.session.commit()
-        return jsonify({"message": "CRT creado", "id": crt.id}), 201
+        return jsonify({"message": "CRT creado", "id": crt.id,
+                        "numero_crt": crt.numero_crt,
+                        "numero_reasignado": reasignado}), 201
     except Exception as e:
         print("\nERROR EN CREAR CRT".center(80, "-"))
         print(traceback.format_exc())
@@ -763,6 +870,8 @@ def editar_crt(crt_id):
             print(
                 f"🔇 CRT {crt.numero_crt} editado - Sin cambios significativos para auditar")
 
+        # Un número cargado a mano por encima de la secuencia la adelanta
+        avanzar_secuencia(crt.transportadora_id, crt.numero_crt)
         db.session.commit()
 
         return jsonify({
@@ -805,10 +914,8 @@ def eliminar_crt(crt_id):
 def listar_crts_simple():
     try:
         sql = text("SELECT c.numero_crt FROM crts c ORDER BY c.id DESC")
-        result = db.session.execute(sql).mappings().all()
-        crts = [{"numero_crt": row["numero_crt"]} for row in result]
-        print("✅ Listado simple CRTs:", crts[:5])
-        return jsonify(crts)
+        return respuesta_json_streaming(
+            filas_en_tandas(sql), lambda row: {"numero_crt": row.numero_crt})
     except Exception as e:
         print("\nERROR EN LISTAR NÚMEROS CRT".center(80, "-"))
         print(traceback.format_exc())
@@ -819,643 +926,109 @@ def listar_crts_simple():
 
 # ========== PDF CRT CORREGIDO CON JOINEDLOAD ==========
 
-@crt_bp.route('/<int:crt_id>/pdf', methods=['POST'])
+# ========== PDF CRT ==========
+
+
+def opciones_carga_pdf_crt():
+    """joinedload completo que necesita el PDF del CRT (sin N+1)."""
+    return (
+        joinedload(CRT.remitente).joinedload(
+            Remitente.ciudad).joinedload(Ciudad.pais),
+        joinedload(CRT.transportadora).joinedload(
+            Transportadora.ciudad).joinedload(Ciudad.pais),
+        joinedload(CRT.destinatario).joinedload(
+            Remitente.ciudad).joinedload(Ciudad.pais),
+        joinedload(CRT.consignatario).joinedload(
+            Remitente.ciudad).joinedload(Ciudad.pais),
+        joinedload(CRT.notificar_a).joinedload(
+            Remitente.ciudad).joinedload(Ciudad.pais),
+        joinedload(CRT.moneda),
+        joinedload(CRT.gastos).joinedload(CRT_Gasto.moneda_remitente),
+        joinedload(CRT.gastos).joinedload(CRT_Gasto.moneda_destinatario),
+        joinedload(CRT.ciudad_emision),
+        joinedload(CRT.pais_emision)
+    )
+
+
+def _valor_plano(valor):
+    """Convierte Decimal/fechas a tipos JSON (str) para el dict de render."""
+    if valor is None or isinstance(valor, (str, int, float, bool)):
+        return valor
+    if hasattr(valor, 'isoformat'):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _entidad_pdf(entidad):
+    if entidad is None:
+        return None
+    ciudad = entidad.ciudad
+    return {
+        "nombre": entidad.nombre,
+        "direccion": entidad.direccion,
+        "tipo_documento": entidad.tipo_documento,
+        "numero_documento": entidad.numero_documento,
+        "telefono": getattr(entidad, 'telefono', None),
+        "ciudad": {
+            "nombre": ciudad.nombre,
+            "pais": {"nombre": ciudad.pais.nombre} if ciudad.pais else None
+        } if ciudad else None
+    }
+
+
+def to_dict_crt_pdf(crt):
+    """
+    Datos planos (dict JSON) que necesita el PDF del CRT.
+    Es lo que viaja a los procesos de render; no depende de la sesión.
+    """
+    data = {col.name: _valor_plano(getattr(crt, col.name))
+            for col in CRT.__table__.columns}
+    data.update({
+        "remitente": _entidad_pdf(crt.remitente),
+        "transportadora": _entidad_pdf(crt.transportadora),
+        "destinatario": _entidad_pdf(crt.destinatario),
+        "consignatario": _entidad_pdf(crt.consignatario),
+        "notificar_a": _entidad_pdf(crt.notificar_a),
+        "moneda": {"codigo": crt.moneda.codigo, "nombre": crt.moneda.nombre} if crt.moneda else None,
+        "gastos": [{
+            "tramo": g.tramo,
+            "valor_remitente": _valor_plano(g.valor_remitente),
+            "valor_destinatario": _valor_plano(g.valor_destinatario),
+        } for g in (crt.gastos or [])],
+    })
+    return data
+
+
+@crt_bp.route('/<int:crt_id>/pdf', methods=['GET', 'POST'])
 def generar_pdf_crt(crt_id):
     try:
         # ✅ CARGAR CRT CON TODAS LAS RELACIONES
-        crt = CRT.query.options(
-            joinedload(CRT.remitente).joinedload(
-                Remitente.ciudad).joinedload(Ciudad.pais),
-            joinedload(CRT.transportadora).joinedload(
-                Transportadora.ciudad).joinedload(Ciudad.pais),
-            joinedload(CRT.destinatario).joinedload(
-                Remitente.ciudad).joinedload(Ciudad.pais),
-            joinedload(CRT.consignatario).joinedload(
-                Remitente.ciudad).joinedload(Ciudad.pais),
-            joinedload(CRT.notificar_a).joinedload(
-                Remitente.ciudad).joinedload(Ciudad.pais),
-            joinedload(CRT.moneda),
-            joinedload(CRT.gastos).joinedload(CRT_Gasto.moneda_remitente),
-            joinedload(CRT.gastos).joinedload(CRT_Gasto.moneda_destinatario),
-            joinedload(CRT.ciudad_emision),
-            joinedload(CRT.pais_emision)
-        ).get_or_404(crt_id)
-
-        # ✅ AHORA SÍ TENEMOS TODOS LOS DATOS CARGADOS
-        remitente = crt.remitente
-        transportadora = crt.transportadora
-        destinatario = crt.destinatario
-        consignatario = crt.consignatario
-        notificar_a = crt.notificar_a
+        crt = CRT.query.options(*opciones_carga_pdf_crt()).get_or_404(crt_id)
 
         # ✅ DEBUG: Verificar que los datos estén cargados
         print(f"🔍 Generando PDF CRT {crt.numero_crt}")
         print(
-            f"   Remitente: {remitente.nombre if remitente else 'NO ENCONTRADO'}")
+            f"   Remitente: {crt.remitente.nombre if crt.remitente else 'NO ENCONTRADO'}")
         print(
-            f"   Transportadora: {transportadora.nombre if transportadora else 'NO ENCONTRADO'}")
+            f"   Transportadora: {crt.transportadora.nombre if crt.transportadora else 'NO ENCONTRADO'}")
         print(
-            f"   Destinatario: {destinatario.nombre if destinatario else 'NO ENCONTRADO'}")
+            f"   Destinatario: {crt.destinatario.nombre if crt.destinatario else 'NO ENCONTRADO'}")
         print(
-            f"   Consignatario: {consignatario.nombre if consignatario else 'NO ENCONTRADO'}")
+            f"   Consignatario: {crt.consignatario.nombre if crt.consignatario else 'NO ENCONTRADO'}")
         print(
-            f"   Notificar a: {notificar_a.nombre if notificar_a else 'NO ENCONTRADO'}")
+            f"   Notificar a: {crt.notificar_a.nombre if crt.notificar_a else 'NO ENCONTRADO'}")
         print(f"   Gastos: {len(crt.gastos)} items")
 
-        output = BytesIO()
-        c = canvas.Canvas(output, pagesize=A4)
-        dibujar_lineas_dinamicas(c, lineas)
-
-        def wrap_text_multiline(text, fontName, fontSize, max_width):
-            result = []
-            for original_line in (text or "").split('\n'):
-                words = original_line.split()
-                line = ""
-                for word in words:
-                    test = f"{line} {word}".strip()
-                    if stringWidth(test, fontName, fontSize) <= max_width:
-                        line = test
-                    else:
-                        if line:
-                            result.append(line)
-                        line = word
-                if line:
-                    result.append(line)
-            return result
-
-        def draw_text_fit_area(c, text, x, y, width, height, fontName="Helvetica", min_font=4.5, max_font=6.0, leading_ratio=1.1):
-            """Función mejorada para ajustar texto al área disponible con mejor reducción de fuente"""
-            if not text or text.strip() == "":
-                return y
-
-            # Calcular el número máximo de líneas que caben con fuente mínima
-            line_height_min = min_font * leading_ratio
-            max_lines = max(1, int(height // line_height_min))
-
-            font_size = max_font
-            lines = []
-            best_fit = None
-
-            # Probar diferentes tamaños de fuente desde el máximo hasta el mínimo
-            while font_size >= min_font:
-                lines = []
-                for original_line in (text or "").split('\n'):
-                    words = original_line.split()
-                    line = ""
-                    for word in words:
-                        test = f"{line} {word}".strip()
-                        if stringWidth(test, fontName, font_size) <= width:
-                            line = test
-                        else:
-                            if line:
-                                lines.append(line)
-                            line = word
-                            # Si la palabra individual es demasiado larga, truncarla
-                            if stringWidth(line, fontName, font_size) > width:
-                                truncated = line
-                                while stringWidth(truncated + "...", fontName, font_size) > width and len(truncated) > 1:
-                                    truncated = truncated[:-1]
-                                if len(truncated) > 1:
-                                    lines.append(truncated + "...")
-                                else:
-                                    lines.append("...")
-                                line = ""
-                                break
-                    if line:
-                        lines.append(line)
-
-                # Verificar si este tamaño de fuente cabe en el área
-                line_height = font_size * leading_ratio
-                required_height = len(lines) * line_height
-
-                if required_height <= height and len(lines) <= max_lines:
-                    best_fit = (lines, font_size)
-                    break  # Encontramos un ajuste perfecto
-
-                # Si no cabe, reducir fuente en incrementos más pequeños
-                font_size -= 0.25
-
-            # Si no encontramos un ajuste perfecto, usar el mejor disponible
-            if not best_fit and lines:
-                best_fit = (lines, font_size)
-
-            # Si aún no tenemos líneas, forzar con fuente mínima
-            if not best_fit:
-                font_size = min_font
-                words = (text or "").replace('\n', ' ').split()
-                current_line = ""
-                lines = []
-
-                for word in words:
-                    test = f"{current_line} {word}".strip()
-                    if stringWidth(test, fontName, font_size) <= width:
-                        current_line = test
-                    else:
-                        if current_line:
-                            lines.append(current_line)
-                            current_line = word
-                        else:
-                            # Palabra demasiado larga, truncar
-                            truncated = word
-                            while stringWidth(truncated + "...", fontName, font_size) > width and len(truncated) > 1:
-                                truncated = truncated[:-1]
-                            lines.append(
-                                truncated + "..." if len(truncated) > 1 else "...")
-                            current_line = ""
-
-                if current_line:
-                    lines.append(current_line)
-
-                best_fit = (lines, font_size)
-
-            # Limitar al número máximo de líneas y truncar si es necesario
-            lines, font_size = best_fit
-            if len(lines) > max_lines:
-                lines = lines[:max_lines]
-                if lines and len(lines[-1]) > 4:
-                    lines[-1] = lines[-1][:-3] + "..."
-
-            # Dibujar las líneas
-            c.setFont(fontName, font_size)
-            curr_y = y
-            line_height = font_size * leading_ratio
-
-            for line in lines:
-                if curr_y - line_height < y - height:
-                    break  # No dibujar fuera del área
-                c.drawString(x, curr_y, line)
-                curr_y -= line_height
-
-            return curr_y
-
-        def format_number(num, decimals=3):
-            try:
-                num = float(num)
-                s = f"{{:,.{decimals}f}}".format(num)
-                s = s.replace(",", "X").replace(".", ",").replace("X", ".")
-                return s
-            except Exception:
-                return str(num) if num not in [None, "None"] else ""
-
-        # ✅ VERIFICACIÓN ADICIONAL DE DATOS ANTES DE USAR
-        def safe_get_attr(obj, attr, default=""):
-            """Función segura para obtener atributos con fallback"""
-            if obj is None:
-                return default
-            return getattr(obj, attr, default) or default
-
-        max_width = 250
-        max_width_trans = 250
-        x_trans = 300
-
-        # =============== CAMPO 1: REMITENTE ===============
-        if remitente:
-            x_rem = 35
-            y_rem = 842 - 87 - 12
-
-            c.setFont("Helvetica-Bold", 7.98)
-            c.drawString(x_rem, y_rem, safe_get_attr(remitente, 'nombre'))
-
-            direccion_lines = wrap_text_multiline(
-                safe_get_attr(remitente, 'direccion'), "Helvetica", 6, max_width)
-            c.setFont("Helvetica", 6)
-            for linea_dir in direccion_lines:
-                y_rem -= 9
-                c.drawString(x_rem, y_rem, linea_dir)
-
-            y_rem -= 9
-            ciudad = safe_get_attr(
-                remitente.ciudad, 'nombre') if remitente.ciudad else ""
-            pais = safe_get_attr(
-                remitente.ciudad.pais, 'nombre') if remitente.ciudad and remitente.ciudad.pais else ""
-            c.drawString(x_rem, y_rem, f"{ciudad} - {pais}")
-
-            y_rem -= 9
-            tipo_doc = safe_get_attr(remitente, 'tipo_documento', 'RUC')
-            num_doc = safe_get_attr(remitente, 'numero_documento')
-            c.drawString(x_rem, y_rem, f"{tipo_doc}: {num_doc}")
-
-        # =============== CAMPO 3: TRANSPORTADORA ===============
-        if transportadora:
-            y_trans = 842 - 105 - 12
-            c.setFont("Helvetica-Bold", 9)
-            nombre = safe_get_attr(transportadora, 'nombre').strip()
-            w_nombre = stringWidth(nombre, "Helvetica-Bold", 9)
-            c.drawString(x_trans + (max_width_trans -
-                         w_nombre) / 2, y_trans, nombre)
-            c.setFont("Helvetica", 7)
-
-            # Dirección (solo si existe y no es vacío o espacios)
-            direccion = safe_get_attr(transportadora, 'direccion').strip()
-            if direccion:
-                y_trans -= 10
-                w_dir = stringWidth(direccion, "Helvetica", 7)
-                c.drawString(x_trans + (max_width_trans -
-                             w_dir) / 2, y_trans, direccion)
-
-            # Tipo y número de documento (solo si ambos existen y no son espacios)
-            tipo_doc_trans = safe_get_attr(
-                transportadora, 'tipo_documento').strip()
-            num_doc_trans = safe_get_attr(
-                transportadora, 'numero_documento').strip()
-            if tipo_doc_trans and num_doc_trans:
-                y_trans -= 10
-                doc_line = f"{tipo_doc_trans}: {num_doc_trans}"
-                w_doc = stringWidth(doc_line, "Helvetica", 7)
-                c.drawString(x_trans + (max_width_trans -
-                             w_doc) / 2, y_trans, doc_line)
-
-            # Teléfono (solo si existe, no es vacío, ni solo espacios)
-            telefono = safe_get_attr(transportadora, 'telefono').strip()
-            if telefono:
-                y_trans -= 10
-                tel = f"Tel: {telefono}"
-                w_tel = stringWidth(tel, "Helvetica", 7)
-                c.drawString(
-                    x_trans + (max_width_trans - w_tel) / 2, y_trans, tel)
-
-            # Ciudad y país (solo si al menos uno existe, no espacios)
-            ciudad_trans = safe_get_attr(
-                transportadora.ciudad, 'nombre') if transportadora.ciudad else ""
-            pais_trans = safe_get_attr(
-                transportadora.ciudad.pais, 'nombre') if transportadora.ciudad and transportadora.ciudad.pais else ""
-            if ciudad_trans or pais_trans:
-                loc = f"{ciudad_trans} - {pais_trans}".strip(" -")
-                y_trans -= 10
-                w_loc = stringWidth(loc, "Helvetica", 7)
-                c.drawString(
-                    x_trans + (max_width_trans - w_loc) / 2, y_trans, loc)
-
-        # =============== CAMPO 4: DESTINATARIO ===============
-        if destinatario:
-            x_dest = 35
-            y_dest = 842 - 147 - 12
-
-            c.setFont("Helvetica-Bold", 7.98)
-            c.drawString(x_dest, y_dest, safe_get_attr(destinatario, 'nombre'))
-
-            direccion_dest_lines = wrap_text_multiline(
-                safe_get_attr(destinatario, 'direccion'), "Helvetica", 6, max_width)
-            c.setFont("Helvetica", 6)
-            for linea_dir in direccion_dest_lines:
-                y_dest -= 9
-                c.drawString(x_dest, y_dest, linea_dir)
-
-            y_dest -= 9
-            ciudad_dest = safe_get_attr(
-                destinatario.ciudad, 'nombre') if destinatario.ciudad else ""
-            pais_dest = safe_get_attr(
-                destinatario.ciudad.pais, 'nombre') if destinatario.ciudad and destinatario.ciudad.pais else ""
-            c.drawString(x_dest, y_dest, f"{ciudad_dest} - {pais_dest}")
-
-            y_dest -= 9
-            tipo_doc_dest = safe_get_attr(
-                destinatario, 'tipo_documento', 'RUC')
-            num_doc_dest = safe_get_attr(destinatario, 'numero_documento')
-            c.drawString(x_dest, y_dest, f"{tipo_doc_dest}: {num_doc_dest}")
-
-        # =============== CAMPO 6: CONSIGNATARIO ===============
-        if consignatario:
-            x_cons = 35
-            y_cons = 842 - 206 - 12
-
-            c.setFont("Helvetica-Bold", 7.98)
-            c.drawString(x_cons, y_cons, safe_get_attr(
-                consignatario, 'nombre'))
-
-            direccion_cons_lines = wrap_text_multiline(
-                safe_get_attr(consignatario, 'direccion'), "Helvetica", 6, max_width)
-            c.setFont("Helvetica", 6)
-            for linea_dir in direccion_cons_lines:
-                y_cons -= 9
-                c.drawString(x_cons, y_cons, linea_dir)
-
-            y_cons -= 9
-            ciudad_cons = safe_get_attr(
-                consignatario.ciudad, 'nombre') if consignatario.ciudad else ""
-            pais_cons = safe_get_attr(
-                consignatario.ciudad.pais, 'nombre') if consignatario.ciudad and consignatario.ciudad.pais else ""
-            c.drawString(x_cons, y_cons, f"{ciudad_cons} - {pais_cons}")
-
-            y_cons -= 9
-            tipo_doc_cons = safe_get_attr(
-                consignatario, 'tipo_documento', 'RUC')
-            num_doc_cons = safe_get_attr(consignatario, 'numero_documento')
-            c.drawString(x_cons, y_cons, f"{tipo_doc_cons}: {num_doc_cons}")
-
-        # =============== CAMPO 9: NOTIFICAR A ===============
-        if notificar_a:
-            x_notif = 35
-            y_notif = 842 - 267 - 12
-
-            c.setFont("Helvetica-Bold", 7.98)
-            c.drawString(x_notif, y_notif, safe_get_attr(
-                notificar_a, 'nombre'))
-
-            direccion_notif_lines = wrap_text_multiline(
-                safe_get_attr(notificar_a, 'direccion'), "Helvetica", 6, max_width)
-            c.setFont("Helvetica", 6)
-            for linea_dir in direccion_notif_lines:
-                y_notif -= 9
-                c.drawString(x_notif, y_notif, linea_dir)
-
-            y_notif -= 9
-            ciudad_notif = safe_get_attr(
-                notificar_a.ciudad, 'nombre') if notificar_a.ciudad else ""
-            pais_notif = safe_get_attr(
-                notificar_a.ciudad.pais, 'nombre') if notificar_a.ciudad and notificar_a.ciudad.pais else ""
-            c.drawString(x_notif, y_notif, f"{ciudad_notif} - {pais_notif}")
-
-            y_notif -= 9
-            tipo_doc_notif = safe_get_attr(
-                notificar_a, 'tipo_documento', 'RUC')
-            num_doc_notif = safe_get_attr(notificar_a, 'numero_documento')
-            c.drawString(x_notif, y_notif,
-                         f"{tipo_doc_notif}: {num_doc_notif}")
-
-        # ========== Campo 2: Número CRT ==========
-        x_num_crt = 400
-        y_num_crt_ill = 92
-        y_num_crt_pdf = 842 - y_num_crt_ill
-        c.setFont("Helvetica-Bold", 10)
-        c.drawString(x_num_crt, y_num_crt_pdf, str(crt.numero_crt))
-
-        # ========== Campo 5 ==========
-        x_emision = 300
-        y_emision = 842 - 168 - 20
-        texto_emision = "ASUNCIÓN - PARAGUAY"
-        c.setFont("Helvetica", 8)
-        w_emision = stringWidth(texto_emision, "Helvetica", 8)
-        c.drawString(x_emision + (max_width_trans - w_emision) /
-                     2, y_emision, texto_emision)
-
-        # ========== Campo 7 ==========
-        x_campo7 = 300
-        y_campo7 = y_emision - 50
-        ciudad7 = safe_get_attr(
-            remitente.ciudad, 'nombre') if remitente and remitente.ciudad else ""
-        pais7 = safe_get_attr(
-            remitente.ciudad.pais, 'nombre') if remitente and remitente.ciudad and remitente.ciudad.pais else ""
-        fecha7 = crt.fecha_emision.strftime(
-            '%d-%m-%Y') if crt.fecha_emision else ""
-        texto_campo7 = f"{ciudad7.upper()} - {pais7.upper()}-{fecha7}"
-        c.setFont("Helvetica", 8)
-        w_campo7 = stringWidth(texto_campo7, "Helvetica", 8)
-        c.drawString(x_campo7 + (max_width_trans - w_campo7) /
-                     2, y_campo7, texto_campo7)
-
-        # ========== Campo 8 ==========
-        x_campo8 = 300
-        y_campo8 = y_campo7 - 37
-        ciudad_dest_8 = safe_get_attr(
-            destinatario.ciudad, 'nombre') if destinatario and destinatario.ciudad else ""
-        pais_dest_8 = safe_get_attr(
-            destinatario.ciudad.pais, 'nombre') if destinatario and destinatario.ciudad and destinatario.ciudad.pais else ""
-        texto_campo8 = f"{ciudad_dest_8} - {pais_dest_8}"
-        c.setFont("Helvetica", 8)
-        w_campo8 = stringWidth(texto_campo8, "Helvetica", 8)
-        c.drawString(x_campo8 + (max_width_trans - w_campo8) /
-                     2, y_campo8, texto_campo8)
-
-        # ========== Campo 10 ==========
-        x_campo10 = 300
-        y_campo10 = y_campo8 - 37
-        texto_campo10 = safe_get_attr(crt, "transporte_sucesivos")
-        c.setFont("Helvetica", 7)
-        campo10_lines = wrap_text_multiline(
-            texto_campo10, "Helvetica", 7, max_width_trans)
-        for linea in campo10_lines:
-            w_line = stringWidth(linea, "Helvetica", 7)
-            c.drawString(x_campo10 + (max_width_trans -
-                         w_line) / 2, y_campo10, linea)
-            y_campo10 -= 10
-
-        # ========== CAMPO 11: DETALLES DE MERCADERÍA ==========
-        x11 = 34
-        y11 = 498
-        width11 = 375
-        height11 = 100
-        texto_campo11 = crt.detalles_mercaderia or ""
-
-        draw_text_fit_area(
-            c, texto_campo11,
-            x=x11, y=y11, width=width11, height=height11,
-            fontName="Helvetica", min_font=4.80, max_font=7.50, leading_ratio=1.13
-        )
-
-        # ========== CAMPO 15: COSTOS ==========
-        y_start = 370
-        row_height = 14
-        y_min = 250
-
-        x_tramo = 38
-        max_tramo_width = 140 - x_tramo - 5
-        x_remitente = 180
-        x_moneda = 210
-        x_destinatario = 280
-
-        moneda_codigo = (
-            safe_get_attr(crt.moneda, "codigo") if crt.moneda and hasattr(crt.moneda, "codigo")
-            else (safe_get_attr(crt.moneda, "nombre") if crt.moneda else "")
-        )
-        gastos = crt.gastos or []
-        y_row = y_start
-        max_rows = int((y_start - y_min) // row_height)
-        gastos_visibles = gastos[:max_rows]
-
-        c.setFont("Helvetica", 8)
-        for gasto in gastos_visibles:
-            tramo_text = safe_get_attr(gasto, 'tramo')
-            draw_text_fit_area(
-                c, tramo_text, x=x_tramo, y=y_row, width=max_tramo_width,
-                height=row_height - 1, fontName="Helvetica", min_font=5, max_font=8, leading_ratio=1.13
-            )
-            valor_remitente = format_number(
-                gasto.valor_remitente, 2) if gasto.valor_remitente not in [None, "None", ""] else ""
-            valor_destinatario = format_number(
-                gasto.valor_destinatario, 2) if gasto.valor_destinatario not in [None, "None", ""] else ""
-            c.setFont("Helvetica", 8)
-            c.drawRightString(x_remitente, y_row, valor_remitente)
-            c.drawString(x_moneda, y_row, moneda_codigo)
-            c.drawRightString(x_destinatario, y_row, valor_destinatario)
-            y_row -= row_height
-
-        y_total = 308
-        total_remitente = sum(float(g.valor_remitente or 0)
-                              for g in gastos_visibles if g.valor_remitente not in [None, "None", ""])
-        total_destinatario = sum(float(g.valor_destinatario or 0)
-                                 for g in gastos_visibles if g.valor_destinatario not in [None, "None", ""])
-        c.setFont("Helvetica-Bold", 8)
-        if total_remitente:
-            c.drawRightString(x_remitente, y_total,
-                              format_number(total_remitente, 2))
-            c.drawString(x_moneda, y_total, moneda_codigo)
-        if total_destinatario:
-            c.drawRightString(x_destinatario, y_total,
-                              format_number(total_destinatario, 2))
-            c.drawString(x_moneda, y_total, moneda_codigo)
-
-        # ========== CAMPO 12: Peso bruto y neto ==========
-        x12_valor = 500
-        y12_pb = 505
-        y12_pn = 490
-
-        c.setFont("Helvetica", 10)
-        peso_bruto = format_number(crt.peso_bruto)
-        peso_neto = format_number(crt.peso_neto)
-        c.drawString(x12_valor, y12_pb, peso_bruto)
-        c.drawString(x12_valor, y12_pn, peso_neto)
-
-        # ========== CAMPO 13: Volumen ==========
-        x13 = 465
-        y13 = 472
-        volumen = format_number(crt.volumen, decimals=5)
-        c.setFont("Helvetica", 9)
-        c.drawString(x13, y13, volumen)
-
-        # ========== CAMPO 14: Incoterm, Moneda y Valor ==========
-        x14 = 415
-        y14 = 450
-        incoterm = safe_get_attr(crt, 'incoterm')
-        valor_incoterm = format_number(crt.valor_incoterm or 0, decimals=2)
-        c.setFont("Helvetica", 10)
-        c.drawString(x14, y14, incoterm)
-        c.drawString(x14 + 30, y14, moneda_codigo)
-        c.drawRightString(550, y14, valor_incoterm)
-
-        c.setFont("Helvetica", 9)
-        nombre_moneda = safe_get_attr(
-            crt.moneda, 'nombre') if crt.moneda else ""
-        c.drawString(x14, y14 - 25, nombre_moneda.upper())
-
-        # Segundo Incoterm junto a la palabra "INCOTERM"
-        x_incoterm = 475
-        y_incoterm = y14 - 39
-        c.setFont("Helvetica", 10)
-        c.drawString(x_incoterm, y_incoterm, incoterm)
-
-        # ========== CAMPO 16: Declaración del valor ==========
-        x16 = 450
-        y16 = 842 - 442 - 8
-        c.setFont("Helvetica-Bold", 8)
-        c.drawString(x16, y16, format_number(
-            crt.declaracion_mercaderia, decimals=2))
-
-        # ========== CAMPO 17: Documentos Anexos ==========
-        x_factura = 465
-        y_factura = 371
-        x_despacho = 465
-        y_despacho = 357
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(x_factura, y_factura, safe_get_attr(
-            crt, 'factura_exportacion'))
-        c.drawString(x_despacho, y_despacho,
-                     safe_get_attr(crt, 'nro_despacho'))
-
-        # ========== CAMPO 18: Formalidades Aduana ==========
-        x18 = 305
-        y18 = 235
-        width18 = 410
-        height18 = 54
-        texto_campo18 = safe_get_attr(crt, 'formalidades_aduana')
-        draw_text_fit_area(
-            c, texto_campo18, x=x18, y=y18 + height18, width=width18,
-            height=height18, fontName="Helvetica", min_font=5.0, max_font=8.5, leading_ratio=1.13
-        )
-
-        # ========== CAMPO 19 ==========
-        x_moneda_19 = 110
-        x_valor_19 = 220
-        y_19 = 288
-        valor_flete_externo = ""
-        if gastos:
-            primer_gasto = gastos[0]
-            if primer_gasto.valor_remitente not in [None, "None", ""]:
-                valor_flete_externo = format_number(
-                    primer_gasto.valor_remitente, 2)
-            elif primer_gasto.valor_destinatario not in [None, "None", ""]:
-                valor_flete_externo = format_number(
-                    primer_gasto.valor_destinatario, 2)
-        codigo_moneda_19 = safe_get_attr(crt.moneda, "codigo") if crt.moneda and hasattr(
-            crt.moneda, "codigo") else (safe_get_attr(crt.moneda, "nombre") if crt.moneda else "")
-        c.setFont("Helvetica", 8)
-        c.drawString(x_moneda_19, y_19, codigo_moneda_19)
-        c.drawRightString(x_valor_19, y_19, valor_flete_externo)
-
-        # ========== CAMPO 20 ==========
-        x_moneda_20 = x_moneda_19
-        x_valor_20 = x_valor_19
-        y_20 = y_19 - 22
-        valor_reembolso = ""
-        if hasattr(crt, "valor_reembolso") and crt.valor_reembolso not in [None, "None", ""]:
-            valor_reembolso = format_number(crt.valor_reembolso, 2)
-        c.setFont("Helvetica", 8)
-        c.drawString(x_moneda_20, y_20, codigo_moneda_19)
-        if valor_reembolso:
-            c.drawRightString(x_valor_20, y_20, valor_reembolso)
-
-        # ========== CAMPO 21: REMITENTE ==========
-        x21_nombre = 38
-        y21_nombre = 230
-        x21_fecha = 100
-        y21_fecha = 193
-        remitente_nombre = safe_get_attr(
-            remitente, 'nombre') if remitente else ""
-        fecha_emision = crt.fecha_emision.strftime(
-            '%d/%m/%Y') if crt.fecha_emision else ""
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(x21_nombre, y21_nombre, remitente_nombre)
-        c.setFont("Helvetica", 8)
-        c.drawString(x21_fecha, y21_fecha, fecha_emision)
-
-        # ========== CAMPO 23: TRANSPORTADORA ==========
-        x23_nombre = 38
-        y23_nombre = 130
-        x23_fecha = 100
-        y23_fecha = 87
-        transportadora_nombre = safe_get_attr(
-            transportadora, 'nombre') if transportadora else ""
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(x23_nombre, y23_nombre, transportadora_nombre)
-        c.setFont("Helvetica", 8)
-        c.drawString(x23_fecha, y23_fecha, fecha_emision)
-
-        # ========== CAMPO 24: DESTINATARIO ==========
-        x24_nombre = 305
-        y24_nombre = 152
-        x24_fecha = 380
-        y24_fecha = 87
-        destinatario_nombre = safe_get_attr(
-            destinatario, 'nombre') if destinatario else ""
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(x24_nombre, y24_nombre, destinatario_nombre)
-        c.setFont("Helvetica", 8)
-        c.drawString(x24_fecha, y24_fecha, fecha_emision)
-
-        # ========== CAMPO 22: Declaraciones y observaciones ==========
-        x22 = 305
-        y22 = 243
-        width22 = 260
-        height22 = 60
-        texto_campo22 = safe_get_attr(crt, 'observaciones')
-        draw_text_fit_area(
-            c, texto_campo22, x=x22, y=y22, width=width22, height=height22,
-            fontName="Helvetica", min_font=5.0, max_font=8.0, leading_ratio=1.13
-        )
-
-        # Guarda y responde
-        c.save()
-        output.seek(0)
+        # Cacheado por contenido: si el CRT no cambió se sirve el mismo PDF (ETag)
+        response = enviar_pdf(
+            "crt", to_dict_crt_pdf(crt), f"CRT_{crt.numero_crt}.pdf")
 
-        print(f"✅ PDF CRT {crt.numero_crt} generado exitosamente")
-
-        return send_file(
-            output,
-            mimetype="application/pdf",
-            as_attachment=True,
-            download_name=f"CRT_{crt.numero_crt}.pdf"
-        )
+        print(f"✅ PDF CRT {crt.numero_crt} listo "
+              f"({response.headers.get('X-PDF-Cache', 'NOT MODIFIED')})")
+        return response
 
+    except RenderSaturadoError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
     except Exception as e:
         print(f"\n❌ ERROR EN GENERAR PDF CRT {crt_id}".center(80, "-"))
         print(f"Error: {str(e)}")
@@ -1465,425 +1038,207 @@ def generar_pdf_crt(crt_id):
             "trace": traceback.format_exc()
         }), 500
 
-        # =============== CAMPO 1: REMITENTE ===============
-        x_rem = 35
-        y_rem = 842 - 87 - 12
-
-        c.setFont("Helvetica-Bold", 7.98)
-        c.drawString(x_rem, y_rem, remitente.nombre or "")
-
-        direccion_lines = wrap_text_multiline(
-            remitente.direccion or "", "Helvetica", 6, max_width)
-        c.setFont("Helvetica", 6)
-        for linea_dir in direccion_lines:
-            y_rem -= 9
-            c.drawString(x_rem, y_rem, linea_dir)
-
-        y_rem -= 9
-        ciudad = remitente.ciudad.nombre if remitente and remitente.ciudad else ""
-        pais = remitente.ciudad.pais.nombre if remitente and remitente.ciudad and remitente.ciudad.pais else ""
-        c.drawString(x_rem, y_rem, f"{ciudad} - {pais}")
-
-        y_rem -= 9
-        tipo_doc = remitente.tipo_documento or "RUC"
-        num_doc = remitente.numero_documento or ""
-        c.drawString(x_rem, y_rem, f"{tipo_doc}: {num_doc}")
-
-        # =============== CAMPO 3: TRANSPORTADORA ===============
-        y_trans = 842 - 105 - 12
-        c.setFont("Helvetica-Bold", 9)
-        nombre = (transportadora.nombre or "").strip()
-        w_nombre = stringWidth(nombre, "Helvetica-Bold", 9)
-        c.drawString(x_trans + (max_width_trans -
-                     w_nombre) / 2, y_trans, nombre)
-        c.setFont("Helvetica", 7)
-
-        # Dirección (solo si existe y no es vacío o espacios)
-        direccion = (transportadora.direccion or "").strip()
-        if direccion:
-            y_trans -= 10
-            w_dir = stringWidth(direccion, "Helvetica", 7)
-            c.drawString(x_trans + (max_width_trans - w_dir) /
-                         2, y_trans, direccion)
-
-        # Tipo y número de documento (solo si ambos existen y no son espacios)
-        tipo_doc_trans = (transportadora.tipo_documento or "").strip()
-        num_doc_trans = (transportadora.numero_documento or "").strip()
-        if tipo_doc_trans and num_doc_trans:
-            y_trans -= 10
-            doc_line = f"{tipo_doc_trans}: {num_doc_trans}"
-            w_doc = stringWidth(doc_line, "Helvetica", 7)
-            c.drawString(x_trans + (max_width_trans - w_doc) /
-                         2, y_trans, doc_line)
-
-        # Teléfono (solo si existe, no es vacío, ni solo espacios)
-        telefono = getattr(transportadora, "telefono", None)
-        telefono = (telefono or "").strip()
-        if telefono:
-            y_trans -= 10
-            tel = f"Tel: {telefono}"
-            w_tel = stringWidth(tel, "Helvetica", 7)
-            c.drawString(x_trans + (max_width_trans - w_tel) / 2, y_trans, tel)
-
-        # Ciudad y país (solo si al menos uno existe, no espacios)
-        ciudad_trans = (
-            transportadora.ciudad.nombre if transportadora and transportadora.ciudad else "").strip()
-        pais_trans = (
-            transportadora.ciudad.pais.nombre if transportadora and transportadora.ciudad and transportadora.ciudad.pais else "").strip()
-        if ciudad_trans or pais_trans:
-            loc = f"{ciudad_trans} - {pais_trans}".strip(" -")
-            y_trans -= 10
-            w_loc = stringWidth(loc, "Helvetica", 7)
-            c.drawString(x_trans + (max_width_trans - w_loc) / 2, y_trans, loc)
-
-        # =============== CAMPO 4: DESTINATARIO ===============
-        x_dest = 35
-        y_dest = 842 - 147 - 12
-
-        c.setFont("Helvetica-Bold", 7.98)
-        c.drawString(x_dest, y_dest,
-                     destinatario.nombre if destinatario else "")
-
-        direccion_dest_lines = wrap_text_multiline(
-            destinatario.direccion if destinatario else "", "Helvetica", 6, max_width)
-        c.setFont("Helvetica", 6)
-        for linea_dir in direccion_dest_lines:
-            y_dest -= 9
-            c.drawString(x_dest, y_dest, linea_dir)
-
-        y_dest -= 9
-        ciudad_dest = destinatario.ciudad.nombre if destinatario and destinatario.ciudad else ""
-        pais_dest = destinatario.ciudad.pais.nombre if destinatario and destinatario.ciudad and destinatario.ciudad.pais else ""
-        c.drawString(x_dest, y_dest, f"{ciudad_dest} - {pais_dest}")
-
-        y_dest -= 9
-        tipo_doc_dest = destinatario.tipo_documento if destinatario else "RUC"
-        num_doc_dest = destinatario.numero_documento if destinatario else ""
-        c.drawString(x_dest, y_dest, f"{tipo_doc_dest}: {num_doc_dest}")
-
-        # =============== CAMPO 6: CONSIGNATARIO ===============
-        x_cons = 35
-        y_cons = 842 - 206 - 12
-
-        c.setFont("Helvetica-Bold", 7.98)
-        c.drawString(x_cons, y_cons,
-                     consignatario.nombre if consignatario else "")
-
-        direccion_cons_lines = wrap_text_multiline(
-            consignatario.direccion if consignatario else "", "Helvetica", 6, max_width)
-        c.setFont("Helvetica", 6)
-        for linea_dir in direccion_cons_lines:
-            y_cons -= 9
-            c.drawString(x_cons, y_cons, linea_dir)
-
-        y_cons -= 9
-        ciudad_cons = consignatario.ciudad.nombre if consignatario and consignatario.ciudad else ""
-        pais_cons = consignatario.ciudad.pais.nombre if consignatario and consignatario.ciudad and consignatario.ciudad.pais else ""
-        c.drawString(x_cons, y_cons, f"{ciudad_cons} - {pais_cons}")
-
-        y_cons -= 9
-        tipo_doc_cons = consignatario.tipo_documento if consignatario else "RUC"
-        num_doc_cons = consignatario.numero_documento if consignatario else ""
-        c.drawString(x_cons, y_cons, f"{tipo_doc_cons}: {num_doc_cons}")
-
-        # =============== CAMPO 9: NOTIFICAR A ===============
-        x_notif = 35
-        y_notif = 842 - 267 - 12
-
-        c.setFont("Helvetica-Bold", 7.98)
-        c.drawString(x_notif, y_notif,
-                     notificar_a.nombre if notificar_a else "")
-
-        direccion_notif_lines = wrap_text_multiline(
-            notificar_a.direccion if notificar_a else "", "Helvetica", 6, max_width)
-        c.setFont("Helvetica", 6)
-        for linea_dir in direccion_notif_lines:
-            y_notif -= 9
-            c.drawString(x_notif, y_notif, linea_dir)
-
-        y_notif -= 9
-        ciudad_notif = notificar_a.ciudad.nombre if notificar_a and notificar_a.ciudad else ""
-        pais_notif = notificar_a.ciudad.pais.nombre if notificar_a and notificar_a.ciudad and notificar_a.ciudad.pais else ""
-        c.drawString(x_notif, y_notif, f"{ciudad_notif} - {pais_notif}")
-
-        y_notif -= 9
-        tipo_doc_notif = notificar_a.tipo_documento if notificar_a else "RUC"
-        num_doc_notif = notificar_a.numero_documento if notificar_a else ""
-        c.drawString(x_notif, y_notif, f"{tipo_doc_notif}: {num_doc_notif}")
-
-        # ========== Campo 2: Número CRT ==========
-        x_num_crt = 400
-        y_num_crt_ill = 92
-        y_num_crt_pdf = 842 - y_num_crt_ill
-        c.setFont("Helvetica-Bold", 10)
-        c.drawString(x_num_crt, y_num_crt_pdf, str(crt.numero_crt))
-
-        # ========== Campo 5 ==========
-        x_emision = 300
-        y_emision = 842 - 168 - 20
-        texto_emision = "ASUNCIÓN - PARAGUAY"
-        c.setFont("Helvetica", 8)
-        w_emision = stringWidth(texto_emision, "Helvetica", 8)
-        c.drawString(x_emision + (max_width_trans - w_emision) /
-                     2, y_emision, texto_emision)
-
-        # ========== Campo 7 ==========
-        x_campo7 = 300
-        y_campo7 = y_emision - 50
-        ciudad7 = ciudad
-        pais7 = pais
-        fecha7 = crt.fecha_emision.strftime(
-            '%d-%m-%Y') if crt.fecha_emision else ""
-        texto_campo7 = f"{ciudad7.upper()} - {pais7.upper()}-{fecha7}"
-        c.setFont("Helvetica", 8)
-        w_campo7 = stringWidth(texto_campo7, "Helvetica", 8)
-        c.drawString(x_campo7 + (max_width_trans - w_campo7) /
-                     2, y_campo7, texto_campo7)
-
-        # ========== Campo 8 ==========
-        x_campo8 = 300
-        y_campo8 = y_campo7 - 37
-        ciudad_dest_8 = destinatario.ciudad.nombre if destinatario and destinatario.ciudad else ""
-        pais_dest_8 = destinatario.ciudad.pais.nombre if destinatario and destinatario.ciudad and destinatario.ciudad.pais else ""
-        texto_campo8 = f"{ciudad_dest_8} - {pais_dest_8}"
-        c.setFont("Helvetica", 8)
-        w_campo8 = stringWidth(texto_campo8, "Helvetica", 8)
-        c.drawString(x_campo8 + (max_width_trans - w_campo8) /
-                     2, y_campo8, texto_campo8)
-
-        # ========== Campo 10 ==========
-        x_campo10 = 300
-        y_campo10 = y_campo8 - 37
-        texto_campo10 = getattr(crt, "transporte_sucesivos", "")
-        c.setFont("Helvetica", 7)
-        campo10_lines = wrap_text_multiline(
-            texto_campo10, "Helvetica", 7, max_width_trans)
-        for linea in campo10_lines:
-            w_line = stringWidth(linea, "Helvetica", 7)
-            c.drawString(x_campo10 + (max_width_trans -
-                         w_line) / 2, y_campo10, linea)
-            y_campo10 -= 10
-
-        # ========== CAMPO 11: DETALLES DE MERCADERÍA ==========
-        x11 = 34
-        y11 = 498
-        width11 = 375
-        height11 = 100
-        texto_campo11 = crt.detalles_mercaderia or ""
-
-        draw_text_fit_area(
-            c, texto_campo11,
-            x=x11, y=y11, width=width11, height=height11,
-            fontName="Helvetica", min_font=4.80, max_font=7.50, leading_ratio=1.13
-        )
 
-        # ========== CAMPO 15: COSTOS ==========
-        y_start = 370
-        row_height = 14
-        y_min = 250
+# ========== EXPORTACIÓN MASIVA DE PDFs ==========
 
-        x_tramo = 38
-        max_tramo_width = 140 - x_tramo - 5
-        x_remitente = 180
-        x_moneda = 210
-        x_destinatario = 280
+LOTE_PDF_CHUNK = 50      # CRTs cargados por consulta
+LOTE_PDF_MAXIMO = 2000   # tope de CRTs por exportación
 
-        moneda_codigo = (
-            crt.moneda.codigo if crt.moneda and hasattr(crt.moneda, "codigo")
-            else (crt.moneda.nombre if crt.moneda else "")
-        )
-        gastos = crt.gastos or []
-        y_row = y_start
-        max_rows = int((y_start - y_min) // row_height)
-        gastos_visibles = gastos[:max_rows]
-
-        c.setFont("Helvetica", 8)
-        for gasto in gastos_visibles:
-            tramo_text = gasto.tramo or ""
-            draw_text_fit_area(
-                c, tramo_text, x=x_tramo, y=y_row, width=max_tramo_width,
-                height=row_height - 1, fontName="Helvetica", min_font=5, max_font=8, leading_ratio=1.13
+
+class _SalidaZip:
+    """Destino write-only para zipfile: junta los bytes hasta que el generador los entrega."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, data):
+        self._partes.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        data = b"".join(self._partes)
+        self._partes.clear()
+        return data
+
+
+def _ids_lote_crt(datos):
+    """
+    Ids a exportar: lista explícita o los filtros del listado paginado.
+    ValueError si `ids` no es una lista de números o supera LOTE_PDF_MAXIMO.
+    """
+    if datos.get('ids') is not None:
+        ids = datos['ids']
+        if not isinstance(ids, list):
+            raise ValueError("'ids' debe ser una lista")
+        # Tope antes de convertir: una lista enorme se rechaza sin recorrerla
+        if len(ids) > LOTE_PDF_MAXIMO:
+            raise ValueError(f"Máximo {LOTE_PDF_MAXIMO} CRTs por exportación")
+        if any(isinstance(crt_id, bool) for crt_id in ids):
+            raise ValueError("'ids' debe contener solo números de CRT")
+        try:
+            ids = list(dict.fromkeys(int(crt_id) for crt_id in ids))
+        except (TypeError, ValueError):
+            raise ValueError("'ids' debe contener solo números de CRT")
+        # Solo los que existen (ids inexistentes no dan un ZIP vacío)
+        existentes = {row.id for row in db.session.query(CRT.id).filter(CRT.id.in_(ids))}
+        return [crt_id for crt_id in ids if crt_id in existentes]
+
+    filtros = datos.get('filtros') or request.args
+    query, _ = aplicar_filtros_crt(db.session.query(CRT.id), filtros)
+    return [row.id for row in query.order_by(CRT.id.desc()).limit(LOTE_PDF_MAXIMO + 1)]
+
+
+def _bloques_lote_crt(ids):
+    """
+    Carga los CRTs por bloques con el joinedload del PDF y los entrega ya
+    serializados (dicts de render), en el orden pedido.
+    """
+    for i in range(0, len(ids), LOTE_PDF_CHUNK):
+        bloque = ids[i:i + LOTE_PDF_CHUNK]
+        crts = {crt.id: crt for crt in CRT.query.options(
+            *opciones_carga_pdf_crt()).filter(CRT.id.in_(bloque)).all()}
+        datos = [to_dict_crt_pdf(crts[crt_id])
+                 for crt_id in bloque if crt_id in crts]
+        # Liberar el bloque antes de cargar el siguiente
+        db.session.expunge_all()
+        yield datos
+
+
+def _zip_lote_crt(ids):
+    """Genera el ZIP a medida que los PDFs salen del pool (nunca están todos en memoria)."""
+    salida = _SalidaZip()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_DEFLATED) as zf:
+        try:
+            for datos in _bloques_lote_crt(ids):
+                # Cada bloque se renderiza en paralelo en el pool
+                for crt_data, pdf in zip(datos, renderizar_varios("crt", datos)):
+                    zf.writestr(
+                        f"CRT_{crt_data['numero_crt'] or crt_data['id']}.pdf", pdf)
+                    yield salida.vaciar()
+        except Exception as e:
+            # El 200 ya salió: el error queda dentro del ZIP (que se cierra bien)
+            print(f"❌ Exportación masiva interrumpida: {e}")
+            traceback.print_exc()
+            zf.writestr("ERROR.txt",
+                        f"La exportación se interrumpió y está incompleta: {e}\n")
+    yield salida.vaciar()
+
+
+def _pdf_unico_lote_crt(ids):
+    """Un solo PDF con una página por CRT (un único canvas, en un proceso del pool)."""
+    datos = []
+    for bloque in _bloques_lote_crt(ids):
+        datos.extend(bloque)
+    return renderizar_pdf("crt_lote", datos)
+
+
+@crt_bp.route('/pdf/lote', methods=['POST'])
+def exportar_pdfs_lote():
+    """
+    Exportación masiva de PDFs de CRT.
+    Body JSON: {"ids": [...]} o {"filtros": {q, estado, transportadora_id,
+    fecha_desde, fecha_hasta}} (también se aceptan como query string),
+    "formato": "zip" (default, un PDF por CRT) o "pdf" (un único PDF).
+    """
+    try:
+        datos = request.get_json(silent=True) or {}
+        formato = (datos.get('formato') or request.args.get(
+            'formato') or 'zip').lower()
+        if formato not in ('zip', 'pdf'):
+            return jsonify({"error": "Formato inválido (zip o pdf)"}), 400
+
+        ids = _ids_lote_crt(datos)
+        if not ids:
+            return jsonify({"error": "No hay CRTs para exportar"}), 404
+        if len(ids) > LOTE_PDF_MAXIMO:
+            return jsonify({"error": f"Máximo {LOTE_PDF_MAXIMO} CRTs por exportación"}), 400
+
+        print(f"📦 Exportando {len(ids)} CRTs en formato {formato.upper()}")
+        fecha = datetime.now().strftime('%Y%m%d_%H%M%S')
+
+        if formato == 'pdf':
+            return send_file(
+                BytesIO(_pdf_unico_lote_crt(ids)),
+                mimetype="application/pdf",
+                as_attachment=True,
+                download_name=f"CRTs_{fecha}.pdf"
             )
-            valor_remitente = format_number(
-                gasto.valor_remitente, 2) if gasto.valor_remitente not in [None, "None", ""] else ""
-            valor_destinatario = format_number(
-                gasto.valor_destinatario, 2) if gasto.valor_destinatario not in [None, "None", ""] else ""
-            c.setFont("Helvetica", 8)
-            c.drawRightString(x_remitente, y_row, valor_remitente)
-            c.drawString(x_moneda, y_row, moneda_codigo)
-            c.drawRightString(x_destinatario, y_row, valor_destinatario)
-            y_row -= row_height
-
-        y_total = 308
-        total_remitente = sum(float(g.valor_remitente or 0)
-                              for g in gastos_visibles if g.valor_remitente not in [None, "None", ""])
-        total_destinatario = sum(float(g.valor_destinatario or 0)
-                                 for g in gastos_visibles if g.valor_destinatario not in [None, "None", ""])
-        c.setFont("Helvetica-Bold", 8)
-        if total_remitente:
-            c.drawRightString(x_remitente, y_total,
-                              format_number(total_remitente, 2))
-            c.drawString(x_moneda, y_total, moneda_codigo)
-        if total_destinatario:
-            c.drawRightString(x_destinatario, y_total,
-                              format_number(total_destinatario, 2))
-            c.drawString(x_moneda, y_total, moneda_codigo)
-
-        # ========== CAMPO 12: Peso bruto y neto ==========
-        x12_valor = 500
-        y12_pb = 505
-        y12_pn = 490
-
-        c.setFont("Helvetica", 10)
-        peso_bruto = format_number(crt.peso_bruto)
-        peso_neto = format_number(crt.peso_neto)
-        c.drawString(x12_valor, y12_pb, peso_bruto)
-        c.drawString(x12_valor, y12_pn, peso_neto)
-
-        # ========== CAMPO 13: Volumen ==========
-        x13 = 465
-        y13 = 472
-        volumen = format_number(crt.volumen, decimals=5)
-        c.setFont("Helvetica", 9)
-        c.drawString(x13, y13, volumen)
-
-        # ========== CAMPO 14: Incoterm, Moneda y Valor ==========
-        x14 = 415
-        y14 = 450
-        incoterm = crt.incoterm or ""
-        valor_incoterm = format_number(crt.valor_incoterm or 0, decimals=2)
-        c.setFont("Helvetica", 10)
-        c.drawString(x14, y14, incoterm)
-        c.drawString(x14 + 30, y14, moneda_codigo)
-        c.drawRightString(550, y14, valor_incoterm)
-
-        c.setFont("Helvetica", 9)
-        nombre_moneda = crt.moneda.nombre if crt.moneda else ""
-        c.drawString(x14, y14 - 25, nombre_moneda.upper())
-
-        # Segundo Incoterm junto a la palabra "INCOTERM"
-        x_incoterm = 475
-        y_incoterm = y14 - 39
-        c.setFont("Helvetica", 10)
-        c.drawString(x_incoterm, y_incoterm, incoterm)
-
-        # ========== CAMPO 16: Declaración del valor ==========
-        x16 = 450
-        y16 = 842 - 442 - 8
-        c.setFont("Helvetica-Bold", 8)
-        c.drawString(x16, y16, format_number(
-            crt.declaracion_mercaderia, decimals=2))
-
-        # ========== CAMPO 17: Documentos Anexos ==========
-        x_factura = 465
-        y_factura = 371
-        x_despacho = 465
-        y_despacho = 357
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(x_factura, y_factura, crt.factura_exportacion or "")
-        c.drawString(x_despacho, y_despacho, crt.nro_despacho or "")
-
-        # ========== CAMPO 18: Formalidades Aduana ==========
-        x18 = 305
-        y18 = 235
-        width18 = 410
-        height18 = 54
-        texto_campo18 = crt.formalidades_aduana or ""
-        draw_text_fit_area(
-            c, texto_campo18, x=x18, y=y18 + height18, width=width18,
-            height=height18, fontName="Helvetica", min_font=5.0, max_font=8.5, leading_ratio=1.13
-        )
 
-        # ========== CAMPO 19 ==========
-        x_moneda_19 = 110
-        x_valor_19 = 220
-        y_19 = 288
-        valor_flete_externo = ""
-        if gastos:
-            primer_gasto = gastos[0]
-            if primer_gasto.valor_remitente not in [None, "None", ""]:
-                valor_flete_externo = format_number(
-                    primer_gasto.valor_remitente, 2)
-            elif primer_gasto.valor_destinatario not in [None, "None", ""]:
-                valor_flete_externo = format_number(
-                    primer_gasto.valor_destinatario, 2)
-        codigo_moneda_19 = crt.moneda.codigo if crt.moneda and hasattr(
-            crt.moneda, "codigo") else (crt.moneda.nombre if crt.moneda else "")
-        c.setFont("Helvetica", 8)
-        c.drawString(x_moneda_19, y_19, codigo_moneda_19)
-        c.drawRightString(x_valor_19, y_19, valor_flete_externo)
-
-        # ========== CAMPO 20 ==========
-        x_moneda_20 = x_moneda_19
-        x_valor_20 = x_valor_19
-        y_20 = y_19 - 22
-        valor_reembolso = ""
-        if hasattr(crt, "valor_reembolso") and crt.valor_reembolso not in [None, "None", ""]:
-            valor_reembolso = format_number(crt.valor_reembolso, 2)
-        c.setFont("Helvetica", 8)
-        c.drawString(x_moneda_20, y_20, codigo_moneda_19)
-        if valor_reembolso:
-            c.drawRightString(x_valor_20, y_20, valor_reembolso)
-
-        # ========== CAMPO 21: REMITENTE ==========
-        x21_nombre = 38
-        y21_nombre = 230
-        x21_fecha = 100
-        y21_fecha = 193
-        remitente_nombre = remitente.nombre or ""
-        fecha_emision = crt.fecha_emision.strftime(
-            '%d/%m/%Y') if crt.fecha_emision else ""
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(x21_nombre, y21_nombre, remitente_nombre)
-        c.setFont("Helvetica", 8)
-        c.drawString(x21_fecha, y21_fecha, fecha_emision)
-
-        # ========== CAMPO 23: TRANSPORTADORA ==========
-        x23_nombre = 38
-        y23_nombre = 130
-        x23_fecha = 100
-        y23_fecha = 87
-        transportadora_nombre = transportadora.nombre or ""
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(x23_nombre, y23_nombre, transportadora_nombre)
-        c.setFont("Helvetica", 8)
-        c.drawString(x23_fecha, y23_fecha, fecha_emision)
-
-        # ========== CAMPO 24: DESTINATARIO ==========
-        x24_nombre = 305
-        y24_nombre = 152
-        x24_fecha = 380
-        y24_fecha = 87
-        destinatario_nombre = destinatario.nombre if destinatario else ""
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(x24_nombre, y24_nombre, destinatario_nombre)
-        c.setFont("Helvetica", 8)
-        c.drawString(x24_fecha, y24_fecha, fecha_emision)
-
-        # ========== CAMPO 22: Declaraciones y observaciones ==========
-        x22 = 305
-        y22 = 243
-        width22 = 260
-        height22 = 60
-        texto_campo22 = crt.observaciones or ""
-        draw_text_fit_area(
-            c, texto_campo22, x=x22, y=y22, width=width22, height=height22,
-            fontName="Helvetica", min_font=5.0, max_font=8.0, leading_ratio=1.13
-        )
+        # Con el pool lleno, 503 ahora y no un ZIP cortado después del 200
+        comprobar_cupo()
+        response = Response(stream_with_context(
+            _zip_lote_crt(ids)), mimetype="application/zip")
+        response.headers["Content-Disposition"] = f'attachment; filename="CRTs_{fecha}.zip"'
+        response.headers["X-Total-CRTs"] = str(len(ids))
+        return response
+
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros inválidos: {e}"}), 400
+    except RenderSaturadoError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    except Exception as e:
+        print(f"❌ Error en exportación masiva de PDFs: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
 
-        # Guarda y responde
-        c.save()
-        output.seek(0)
-        return send_file(
-            output,
-            mimetype="application/pdf",
-            as_attachment=True,
-            download_name=f"CRT_{crt.numero_crt}.pdf"
-        )
+
+# ========== EXPORTACIÓN CSV / XLSX ==========
+
+# clave -> Columna(título, valor de la fila de _consulta_exportacion_crt)
+COLUMNAS_EXPORTACION_CRT = {
+    "id": Columna("ID", lambda f: f.id),
+    "numero_crt": Columna("Número CRT", lambda f: f.numero_crt),
+    "fecha_emision": Columna("Fecha emisión", lambda f: f.fecha_emision),
+    "estado": Columna("Estado", lambda f: f.estado),
+    "remitente": Columna("Remitente", lambda f: f.remitente),
+    "destinatario": Columna("Destinatario", lambda f: f.destinatario),
+    "consignatario": Columna("Consignatario", lambda f: f.consignatario),
+    "notificar_a": Columna("Notificar a", lambda f: f.notificar_a),
+    "transportadora": Columna("Transportadora", lambda f: f.transportadora),
+    "moneda": Columna("Moneda", lambda f: f.moneda),
+    "incoterm": Columna("Incoterm", lambda f: f.incoterm),
+    "valor_mercaderia": Columna("Valor mercadería", lambda f: f.valor_mercaderia),
+    "valor_flete_externo": Columna("Flete externo", lambda f: f.valor_flete_externo),
+    "peso_bruto": Columna("Peso bruto", lambda f: f.peso_bruto),
+    "peso_neto": Columna("Peso neto", lambda f: f.peso_neto),
+    "volumen": Columna("Volumen", lambda f: f.volumen),
+    "factura_exportacion": Columna("Factura exportación", lambda f: f.factura_exportacion),
+    "nro_despacho": Columna("Nro. despacho", lambda f: f.nro_despacho),
+    "cantidad_gastos": Columna("Cantidad gastos", lambda f: f.cantidad_gastos or 0),
+}
+
+
+def _consulta_exportacion_crt():
+    """Proyección del listado + pesos y flete (sin hidratar objetos)."""
+    return consulta_lista_crt().add_columns(
+        CRT.valor_flete_externo, CRT.peso_bruto, CRT.peso_neto, CRT.volumen)
+
+
+@crt_bp.route('/export', methods=['GET'])
+def exportar_crts():
+    """
+    Exporta el listado de CRTs en streaming.
+    Filtros del listado (q, estado, transportadora_id, fecha_desde,
+    fecha_hasta), formato=csv|xlsx, columnas=numero_crt,fecha_emision,...
+    y separador=,|;|tab (CSV).
+    """
+    try:
+        query, _ = aplicar_filtros_crt(_consulta_exportacion_crt(), request.args)
+        print(f"📤 Exportando CRTs ({request.args.get('formato') or 'csv'})")
+        return respuesta_exportacion(
+            filas_en_tandas(query.order_by(CRT.id.desc())),
+            COLUMNAS_EXPORTACION_CRT, request.args, "CRTs")
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros inválidos: {e}"}), 400
+    except FormatoNoDisponibleError as e:
+        return jsonify({"error": str(e)}), 501
     except Exception as e:
-        print("\nERROR EN GENERAR PDF CRT".center(80, "-"))
-        print(traceback.format_exc())
-        return jsonify({"error": str(e), "trace": traceback.format_exc()}), 500
+        print(f"❌ Error exportando CRTs: {e}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
 
 
 @crt_bp.route('/<int:crt_id>/campo15', methods=['GET'])
@@ -1899,34 +1254,29 @@ def obtener_campo15(crt_id):
 # ========== ✅ NUEVOS ENDPOINTS PARA DATOS AUXILIARES ==========
 
 
+# Datos maestros del formulario: foto en memoria pre-serializada con ETag
+# (app/utils/datos_maestros.py), se reconstruye sólo al cambiar las tablas
+
+
+@crt_bp.route('/data/formulario', methods=['GET'])
+def obtener_datos_formulario():
+    """
+    Todas las secciones de /data/* en una sola respuesta para abrir el formulario
+    """
+    try:
+        return respuesta_seccion("formulario")
+    except Exception as e:
+        print(f"❌ Error obteniendo datos del formulario: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
 @crt_bp.route('/data/transportadoras', methods=['GET'])
 def obtener_transportadoras():
     """
     ✅ NUEVO: Obtener lista de transportadoras para filtros y formularios
     """
     try:
-        transportadoras = Transportadora.query.options(
-            joinedload(Transportadora.ciudad).joinedload(Ciudad.pais)
-        ).order_by(Transportadora.nombre).all()
-
-        items = []
-        for t in transportadoras:
-            items.append({
-                "id": t.id,
-                "nombre": t.nombre,
-                "direccion": t.direccion or "",
-                "tipo_documento": t.tipo_documento or "",
-                "numero_documento": t.numero_documento or "",
-                "telefono": getattr(t, 'telefono', '') or "",
-                "ciudad": t.ciudad.nombre if t.ciudad else "",
-                "pais": t.ciudad.pais.nombre if t.ciudad and t.ciudad.pais else ""
-            })
-
-        return jsonify({
-            "items": items,
-            "total": len(items)
-        })
-
+        return respuesta_seccion("transportadoras")
     except Exception as e:
         print(f"❌ Error obteniendo transportadoras: {e}")
         return jsonify({"error": str(e)}), 500
@@ -1938,27 +1288,7 @@ def obtener_entidades():
     ✅ NUEVO: Obtener lista de entidades (remitentes/destinatarios) para formularios
     """
     try:
-        entidades = Remitente.query.options(
-            joinedload(Remitente.ciudad).joinedload(Ciudad.pais)
-        ).order_by(Remitente.nombre).all()
-
-        items = []
-        for e in entidades:
-            items.append({
-                "id": e.id,
-                "nombre": e.nombre,
-                "direccion": e.direccion or "",
-                "tipo_documento": e.tipo_documento or "",
-                "numero_documento": e.numero_documento or "",
-                "ciudad": e.ciudad.nombre if e.ciudad else "",
-                "pais": e.ciudad.pais.nombre if e.ciudad and e.ciudad.pais else ""
-            })
-
-        return jsonify({
-            "items": items,
-            "total": len(items)
-        })
-
+        return respuesta_seccion("entidades")
     except Exception as e:
         print(f"❌ Error obteniendo entidades: {e}")
         return jsonify({"error": str(e)}), 500
@@ -1970,21 +1300,7 @@ def obtener_monedas():
     ✅ NUEVO: Obtener lista de monedas para formularios
     """
     try:
-        monedas = Moneda.query.order_by(Moneda.nombre).all()
-
-        items = []
-        for m in monedas:
-            items.append({
-                "id": m.id,
-                "nombre": m.nombre,
-                "codigo": getattr(m, 'codigo', m.nombre[:3].upper()) if hasattr(m, 'codigo') else m.nombre[:3].upper()
-            })
-
-        return jsonify({
-            "items": items,
-            "total": len(items)
-        })
-
+        return respuesta_seccion("monedas")
     except Exception as e:
         print(f"❌ Error obteniendo monedas: {e}")
         return jsonify({"error": str(e)}), 500
@@ -1996,24 +1312,7 @@ def obtener_ciudades():
     ✅ NUEVO: Obtener lista de ciudades con países
     """
     try:
-        ciudades = Ciudad.query.options(
-            joinedload(Ciudad.pais)
-        ).order_by(Ciudad.nombre).all()
-
-        items = []
-        for c in ciudades:
-            items.append({
-                "id": c.id,
-                "nombre": c.nombre,
-                "pais_id": c.pais_id,
-                "pais": c.pais.nombre if c.pais else ""
-            })
-
-        return jsonify({
-            "items": items,
-            "total": len(items)
-        })
-
+        return respuesta_seccion("ciudades")
     except Exception as e:
         print(f"❌ Error obteniendo ciudades: {e}")
         return jsonify({"error": str(e)}), 500
@@ -2025,21 +1324,7 @@ def obtener_paises():
     ✅ NUEVO: Obtener lista de países
     """
     try:
-        paises = Pais.query.order_by(Pais.nombre).all()
-
-        items = []
-        for p in paises:
-            items.append({
-                "id": p.id,
-                "nombre": p.nombre,
-                "codigo": p.codigo
-            })
-
-        return jsonify({
-            "items": items,
-            "total": len(items)
-        })
-
+        return respuesta_seccion("paises")
     except Exception as e:
         print(f"❌ Error obteniendo países: {e}")
         return jsonify({"error": str(e)}), 500
@@ -1,24 +1,80 @@
+from datetime import datetime
+
 from flask import Blueprint, request, jsonify
 from app.models import Honorario, Transportadora, Moneda
 from app import db
+from app.utils.cache_tablas import condicional_por_tablas
+from app.utils.streaming_json import respuesta_json_streaming, filas_en_tandas
+from app.utils.exportacion import Columna, respuesta_exportacion, FormatoNoDisponibleError
 
 honorarios_bp = Blueprint('honorarios', __name__, url_prefix='/api/honorarios')
 
+
+def consulta_honorarios():
+    """Columnas del honorario + nombres de transportadora y moneda por outerjoin."""
+    return (db.session.query(
+        Honorario.id, Honorario.fecha, Honorario.descripcion, Honorario.monto,
+        Honorario.transportadora_id, Transportadora.nombre.label('transportadora_nombre'),
+        Honorario.moneda_id, Moneda.nombre.label('moneda_nombre'))
+        .outerjoin(Transportadora, Transportadora.id == Honorario.transportadora_id)
+        .outerjoin(Moneda, Moneda.id == Honorario.moneda_id))
+
+
+# clave -> Columna(título, valor de la fila de consulta_honorarios)
+COLUMNAS_EXPORTACION_HONORARIOS = {
+    "id": Columna("ID", lambda h: h.id),
+    "fecha": Columna("Fecha", lambda h: h.fecha),
+    "descripcion": Columna("Descripción", lambda h: h.descripcion),
+    "transportadora": Columna("Transportadora", lambda h: h.transportadora_nombre),
+    "moneda": Columna("Moneda", lambda h: h.moneda_nombre),
+    "monto": Columna("Monto", lambda h: h.monto),
+}
+
+
 @honorarios_bp.route('/', methods=['GET'])
+@condicional_por_tablas("honorarios", "transportadoras", "monedas")
 def listar_honorarios():
-    honorarios = Honorario.query.order_by(Honorario.id.desc()).all()
-    resultado = []
-    for h in honorarios:
-        resultado.append({
-            "id": h.id,
-            "codigo": h.id,
-            "monto": float(h.monto),
-            "transportadora_id": h.transportadora_id,
-            "transportadora_nombre": h.transportadora.nombre if h.transportadora else "",
-            "moneda_id": h.moneda_id,
-            "moneda_nombre": h.moneda.nombre if h.moneda else "",
-        })
-    return jsonify(resultado)
+    # Columnas + nombres por outerjoin (sin cargar objetos), enviado en streaming
+    filas = consulta_honorarios().order_by(Honorario.id.desc())
+    return respuesta_json_streaming(filas_en_tandas(filas), lambda h: {
+        "id": h.id,
+        "codigo": h.id,
+        "monto": float(h.monto),
+        "transportadora_id": h.transportadora_id,
+        "transportadora_nombre": h.transportadora_nombre or "",
+        "moneda_id": h.moneda_id,
+        "moneda_nombre": h.moneda_nombre or "",
+    })
+
+@honorarios_bp.route('/export', methods=['GET'])
+def exportar_honorarios():
+    """
+    Exporta honorarios en streaming. Filtros: transportadora_id, moneda_id,
+    fecha_desde, fecha_hasta (YYYY-MM-DD); formato=csv|xlsx, columnas=..., separador=,|;|tab.
+    """
+    try:
+        query = consulta_honorarios()
+        transportadora_id = request.args.get('transportadora_id', type=int)
+        moneda_id = request.args.get('moneda_id', type=int)
+        fecha_desde = request.args.get('fecha_desde', '')
+        fecha_hasta = request.args.get('fecha_hasta', '')
+        if transportadora_id:
+            query = query.filter(Honorario.transportadora_id == transportadora_id)
+        if moneda_id:
+            query = query.filter(Honorario.moneda_id == moneda_id)
+        if fecha_desde:
+            query = query.filter(Honorario.fecha >= datetime.strptime(fecha_desde, '%Y-%m-%d').date())
+        if fecha_hasta:
+            query = query.filter(Honorario.fecha <= datetime.strptime(fecha_hasta, '%Y-%m-%d').date())
+        return respuesta_exportacion(
+            filas_en_tandas(query.order_by(Honorario.fecha.desc(), Honorario.id.desc())),
+            COLUMNAS_EXPORTACION_HONORARIOS, request.args, "Honorarios")
+    except ValueError as e:
+        return jsonify({"error": f"Parámetros inválidos: {e}"}), 400
+    except FormatoNoDisponibleError as e:
+        return jsonify({"error": str(e)}), 501
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 @honorarios_bp.route('/', methods=['POST'])
 def crear_honorario():
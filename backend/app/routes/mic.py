@@ -4,8 +4,10 @@ from flask import Blueprint, request, jsonify, send_file
 from sqlalchemy.orm import joinedload
 from sqlalchemy import or_
 from datetime import datetime, timedelta, date
+from io import BytesIO
 from app.models import db, MIC, CRT, CRT_Gasto, Ciudad, Transportadora, Remitente
-from app.utils.layout_mic import generar_micdta_pdf_con_datos
+from app.utils.render_pdf import renderizar_pdf, RenderSaturadoError
+from app.utils.cache_pdf import enviar_pdf
 
 mic_bp = Blueprint('mic', __name__, url_prefix='/api/mic')
 
@@ -356,26 +358,21 @@ def generar_pdf_mic_desde_crt(crt_id):
                     "pdf_url": f"/api/mic/{saved_mic.id}/pdf"
                 }), 201
 
-        # Generar PDF (temporal) y devolver binario
-        import tempfile
-        import os
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
-            filename = tmp_file.name
-
-        generar_micdta_pdf_con_datos(mic_data, filename)
-
+        # Generar PDF en memoria y devolver binario
         response = send_file(
-            filename,
+            BytesIO(renderizar_pdf("mic", mic_data)),
+            mimetype="application/pdf",
             as_attachment=True,
             download_name=f"MIC_CRT_{crt.numero_crt or crt.id}.pdf"
         )
-        response.call_on_close(lambda: os.unlink(filename))
 
         print(f"✅ PDF MIC GENERADO EXITOSAMENTE para CRT {crt.numero_crt}")
         print(
             f"   💰 Incluye gastos: Flete={mic_data['campo_28_total']} | Seguro={mic_data['campo_29_seguro']}")
         return response
 
+    except RenderSaturadoError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
     except Exception as e:
         import traceback
         print("="*50)
@@ -395,14 +392,16 @@ def mic_pdf(mic_id):
     # Blindaje: campo 9 = campo 1
     mic_data["campo_9_datos_transporte"] = mic_data["campo_1_transporte"]
 
-    filename = f"mic_{mic.id}.pdf"
     print("🎯 GENERANDO PDF DESDE MIC GUARDADO:")
     print(f"   📋 Campo 1 len: {len(mic_data['campo_1_transporte'])}")
     print(f"   📋 Campo 9 len: {len(mic_data['campo_9_datos_transporte'])}")
     print(f"   📦 Campo 38 len: {len(mic_data['campo_38_datos_campo11_crt'])}")
 
-    generar_micdta_pdf_con_datos(mic_data, filename)
-    return send_file(filename, as_attachment=True)
+    try:
+        # Cacheado por contenido: reimpresiones sin volver a renderizar
+        return enviar_pdf("mic", mic_data, f"mic_{mic.id}.pdf")
+    except RenderSaturadoError as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
 
 # ✅ RUTA: Verificar clonación de datos específicos
 
@@ -997,16 +996,13 @@ def guardar_mic_desde_crt(crt_id):
         if not want_pdf:
             return jsonify(resp), 201
 
-        import tempfile
-        import os
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as tmp_file:
-            filename = tmp_file.name
-        generar_micdta_pdf_con_datos(mic_data, filename)
-        response = send_file(filename, as_attachment=True,
-                             download_name=f"MIC_CRT_{crt.numero_crt or crt.id}.pdf")
-        response.call_on_close(lambda: os.unlink(filename))
-        return response
+        return send_file(BytesIO(renderizar_pdf("mic", mic_data)),
+                         mimetype="application/pdf", as_attachment=True,
+                         download_name=f"MIC_CRT_{crt.numero_crt or crt.id}.pdf")
 
+    except RenderSaturadoError as e:
+        # El MIC ya quedó guardado; sólo falló el PDF
+        return jsonify({**resp, "error": str(e)}), 503, {"Retry-After": "5"}
     except Exception as e:
         import traceback
         db.session.rollback()
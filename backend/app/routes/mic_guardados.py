@@ -5,15 +5,20 @@ Rutas para gestionar MICs guardados en base de datos.
 
 from datetime import datetime, date, time, timedelta
 from decimal import Decimal, InvalidOperation
-import tempfile
-import os
 
-from flask import Blueprint, request, jsonify, send_file
-from sqlalchemy import or_, func
+from flask import Blueprint, request, jsonify
+from sqlalchemy import func
 from sqlalchemy.orm import joinedload
 
 from app.models import db, MIC, CRT
-from app.utils.layout_mic import generar_micdta_pdf_con_datos
+from app.utils.render_pdf import RenderSaturadoError
+from app.utils.cache_pdf import enviar_pdf
+from app.utils.paginacion import (
+    usa_cursor, por_pagina, paginar_por_cursor, total_cacheado, respuesta_cursor)
+from app.utils.busqueda import filtro_texto_mic
+from app.utils.cache_tablas import cache_por_tablas, condicional_por_tablas
+from app.utils.streaming_json import filas_en_tandas
+from app.utils.exportacion import Columna, respuesta_exportacion, FormatoNoDisponibleError
 
 mic_guardados_bp = Blueprint(
     "mic_guardados", __name__, url_prefix="/api/mic-guardados"
@@ -284,9 +289,69 @@ def registrar_cambio_estado(mic_id, estado_anterior, estado_nuevo, usuario=None,
         print(f"⚠️ Error registrando auditoría: {e}")
 
 
+def aplicar_filtros_mic(query, args):
+    """
+    Aplica los filtros del listado de MICs (estado, numero_carta,
+    transportadora, placa, destino, fecha_desde, fecha_hasta) a una query
+    sobre MIC. Retorna (query, filtros_aplicados).
+    """
+    estado = (args.get("estado", "") or "").strip().upper()
+    numero_carta = (args.get("numero_carta", "") or "").strip()
+    transportadora = (args.get("transportadora", "") or "").strip()
+    placa = (args.get("placa", "") or "").strip()
+    destino = (args.get("destino", "") or "").strip()
+    fecha_desde = (args.get("fecha_desde", "") or "").strip()
+    fecha_hasta = (args.get("fecha_hasta", "") or "").strip()
+
+    if estado:
+        query = query.filter(MIC.campo_4_estado == estado)
+
+    # Texto libre: FTS5 trigram en SQLite, índices pg_trgm en PostgreSQL
+    if numero_carta:
+        query = query.filter(filtro_texto_mic(["campo_23_numero_campo2_crt"], numero_carta))
+
+    if transportadora:
+        query = query.filter(filtro_texto_mic(["campo_1_transporte"], transportadora))
+
+    if placa:
+        query = query.filter(
+            filtro_texto_mic(["campo_11_placa", "campo_15_placa_semi"], placa))
+
+    if destino:
+        query = query.filter(filtro_texto_mic(["campo_8_destino"], destino))
+
+    # Fechas en campo_6_fecha (Date)
+    if fecha_desde:
+        try:
+            fd = datetime.strptime(fecha_desde, "%Y-%m-%d").date()
+            query = query.filter(MIC.campo_6_fecha >= fd)
+        except Exception:
+            pass
+
+    if fecha_hasta:
+        try:
+            fh = datetime.strptime(fecha_hasta, "%Y-%m-%d").date()
+            query = query.filter(MIC.campo_6_fecha <= fh)
+        except Exception:
+            pass
+
+    filtros = {
+        "estado": estado,
+        "numero_carta": numero_carta,
+        "transportadora": transportadora,
+        "placa": placa,
+        "destino": destino,
+        "fecha_desde": fecha_desde,
+        "fecha_hasta": fecha_hasta
+    }
+    return query, filtros
+
+
 # ========= Endpoints =========
 
 @mic_guardados_bp.route("/", methods=["GET"])
+@condicional_por_tablas("mics", "crts")
+@cache_por_tablas("mics", "crts", timeout=120, query_string=True)
 def listar_mics_guardados():
     """
     Lista MICs guardados con paginación + filtros.
@@ -296,51 +361,20 @@ def listar_mics_guardados():
         page = request.args.get("page", 1, type=int)
         per_page = request.args.get("per_page", 20, type=int)
 
-        estado = (request.args.get("estado", "") or "").strip().upper()
-        numero_carta = (request.args.get("numero_carta", "") or "").strip()
-        transportadora = (request.args.get("transportadora", "") or "").strip()
-        placa = (request.args.get("placa", "") or "").strip()
-        destino = (request.args.get("destino", "") or "").strip()
-        fecha_desde = (request.args.get("fecha_desde", "") or "").strip()
-        fecha_hasta = (request.args.get("fecha_hasta", "") or "").strip()
-
-        query = MIC.query.options(joinedload(MIC.crt))
-
-        if estado:
-            query = query.filter(MIC.campo_4_estado == estado)
-
-        if numero_carta:
-            like = f"%{numero_carta}%"
-            query = query.filter(MIC.campo_23_numero_campo2_crt.ilike(like))
-
-        if transportadora:
-            query = query.filter(
-                MIC.campo_1_transporte.ilike(f"%{transportadora}%"))
-
-        if placa:
-            like_placa = f"%{placa}%"
-            query = query.filter(
-                or_(MIC.campo_11_placa.ilike(like_placa),
-                    MIC.campo_15_placa_semi.ilike(like_placa))
-            )
-
-        if destino:
-            query = query.filter(MIC.campo_8_destino.ilike(f"%{destino}%"))
-
-        # Fechas en campo_6_fecha (Date)
-        if fecha_desde:
-            try:
-                fd = datetime.strptime(fecha_desde, "%Y-%m-%d").date()
-                query = query.filter(MIC.campo_6_fecha >= fd)
-            except Exception:
-                pass
-
-        if fecha_hasta:
-            try:
-                fh = datetime.strptime(fecha_hasta, "%Y-%m-%d").date()
-                query = query.filter(MIC.campo_6_fecha <= fh)
-            except Exception:
-                pass
+        query, filtros = aplicar_filtros_mic(
+            MIC.query.options(joinedload(MIC.crt)), request.args)
+
+        # Keyset: ?cursor= (vacío = primera página) -> next_cursor, sin OFFSET ni COUNT
+        if usa_cursor(request.args):
+            per_page = por_pagina(request.args)
+            mics, next_cursor = paginar_por_cursor(
+                query, MIC.id, request.args, per_page)
+            return jsonify({
+                "mics": [to_dict_mic_completo(m) for m in mics],
+                "pagination": respuesta_cursor(
+                    next_cursor, total_cacheado(query, 'mics', request.args), per_page),
+                "filtros": filtros
+            })
 
         query = query.order_by(MIC.id.desc())
         pagination = query.paginate(
@@ -360,17 +394,11 @@ def listar_mics_guardados():
                 "prev_num": pagination.prev_num,
                 "next_num": pagination.next_num
             },
-            "filtros": {
-                "estado": estado,
-                "numero_carta": numero_carta,
-                "transportadora": transportadora,
-                "placa": placa,
-                "destino": destino,
-                "fecha_desde": fecha_desde,
-                "fecha_hasta": fecha_hasta
-            }
+            "filtros": filtros
         })
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         import traceback
         print(f"❌ Error listando MICs guardados: {e}")
@@ -378,7 +406,61 @@ def listar_mics_guardados():
         return jsonify({"error": str(e)}), 500
 
 
+# ========= Exportación CSV / XLSX =========
+
+_CAMPOS_MIC = [c.name for c in MIC.__table__.columns if c.name.startswith("campo_")]
+
+# clave -> Columna(título, valor de la fila de _consulta_exportacion_mic)
+COLUMNAS_EXPORTACION_MIC = {
+    "id": Columna("ID", lambda f: f.id),
+    "creado_en": Columna("Creado en", lambda f: f.creado_en),
+    "crt_numero": Columna("Número CRT", lambda f: f.crt_numero),
+    "crt_fecha_emision": Columna("Fecha emisión CRT", lambda f: f.crt_fecha_emision),
+    "crt_estado": Columna("Estado CRT", lambda f: f.crt_estado),
+    **{
+        campo: Columna(campo.replace("_", " ").capitalize(),
+                       lambda f, campo=campo: getattr(f, campo))
+        for campo in _CAMPOS_MIC
+    },
+}
+
+
+def _consulta_exportacion_mic():
+    """Columnas del MIC + número/fecha/estado del CRT por outerjoin (sin objetos)."""
+    return (db.session.query(
+        MIC.id, MIC.creado_en,
+        CRT.numero_crt.label("crt_numero"),
+        CRT.fecha_emision.label("crt_fecha_emision"),
+        CRT.estado.label("crt_estado"),
+        *[getattr(MIC, campo) for campo in _CAMPOS_MIC])
+        .outerjoin(CRT, CRT.id == MIC.crt_id))
+
+
+@mic_guardados_bp.route("/export", methods=["GET"])
+def exportar_mics_guardados():
+    """
+    Exporta los MICs guardados en streaming, con los filtros del listado.
+    formato=csv|xlsx, columnas=crt_numero,campo_6_fecha,... y separador=,|;|tab.
+    """
+    try:
+        query, _ = aplicar_filtros_mic(_consulta_exportacion_mic(), request.args)
+        print(f"📤 Exportando MICs ({request.args.get('formato') or 'csv'})")
+        return respuesta_exportacion(
+            filas_en_tandas(query.order_by(MIC.id.desc())),
+            COLUMNAS_EXPORTACION_MIC, request.args, "MICs")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except FormatoNoDisponibleError as e:
+        return jsonify({"error": str(e)}), 501
+    except Exception as e:
+        import traceback
+        print(f"❌ Error exportando MICs: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+
 @mic_guardados_bp.route("/<int:mic_id>", methods=["GET"])
+@condicional_por_tablas("mics", "crts")
 def obtener_mic_guardado(mic_id):
     """Detalle de un MIC guardado (para modal en el front)."""
     mic = MIC.query.options(joinedload(MIC.crt)).get_or_404(mic_id)
@@ -395,17 +477,12 @@ def generar_pdf_mic_guardado(mic_id):
         # Blindaje: campo 9 = campo 1
         mic_data["campo_9_datos_transporte"] = mic_data["campo_1_transporte"]
 
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_file:
-            filename = tmp_file.name
-
-        generar_micdta_pdf_con_datos(mic_data, filename)
-
         download_name = f"MIC_{mic.campo_23_numero_campo2_crt or mic.id}_{datetime.now().strftime('%Y%m%d')}.pdf"
-        response = send_file(filename, as_attachment=True,
-                             download_name=download_name, mimetype="application/pdf")
-        response.call_on_close(lambda: os.unlink(filename))
-        return response
+        # Cacheado por contenido: reimpresiones sin volver a renderizar
+        return enviar_pdf("mic", mic_data, download_name)
 
+    except RenderSaturadoError as e:
+        return jsonify({"success": False, "error": str(e)}), 503, {"Retry-After": "5"}
     except Exception as e:
         import traceback
         print(f"❌ Error generando PDF MIC {mic_id}: {e}")
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from app.models import Moneda
-from app import db, cache
+from app import db
+from app.utils.cache_tablas import cache_por_tablas, condicional_por_tablas
 from sqlalchemy.exc import IntegrityError
 
 monedas_bp = Blueprint('monedas', __name__, url_prefix='/api/monedas')
@@ -9,7 +10,8 @@ monedas_bp = Blueprint('monedas', __name__, url_prefix='/api/monedas')
 
 
 @monedas_bp.route('/', methods=['GET'])
-@cache.cached(timeout=600)  # Cache por 10 minutos
+@condicional_por_tablas("monedas")
+@cache_por_tablas("monedas", timeout=600)  # Cache por 10 minutos (se invalida al escribir)
 def listar_monedas():
     monedas = Moneda.query.order_by(Moneda.nombre).all()
     return jsonify([
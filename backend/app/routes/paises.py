@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from app.models import Pais
-from app import db, cache
+from app import db
+from app.utils.cache_tablas import cache_por_tablas, condicional_por_tablas
 from sqlalchemy.exc import IntegrityError
 
 paises_bp = Blueprint('paises', __name__, url_prefix='/api/paises')
@@ -9,7 +10,8 @@ paises_bp = Blueprint('paises', __name__, url_prefix='/api/paises')
 
 
 @paises_bp.route('/', methods=['GET'])
-@cache.cached(timeout=600)  # Cache por 10 minutos
+@condicional_por_tablas("paises")
+@cache_por_tablas("paises", timeout=600)  # Cache por 10 minutos (se invalida al escribir)
 def listar_paises():
     paises = Pais.query.order_by(Pais.nombre).all()
     return jsonify([
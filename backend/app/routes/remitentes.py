@@ -1,21 +1,40 @@
 from flask import Blueprint, request, jsonify
+from sqlalchemy.orm import joinedload
 from app.models import Remitente, Ciudad
-from app import db, cache
+from app import db
+from app.utils.cache_tablas import cache_por_tablas, condicional_por_tablas
+from app.utils.paginacion import (
+    usa_cursor, por_pagina, paginar_por_cursor, total_cacheado, respuesta_cursor)
 
 remitentes_bp = Blueprint('remitentes', __name__, url_prefix='/api/remitentes')
 
 # Listar remitentes (paginado, búsqueda por nombre/documento)
 
 
+def to_dict_remitente_lista(r):
+    return {
+        "id": r.id,
+        "nombre": r.nombre,
+        "tipo_documento": r.tipo_documento,
+        "numero_documento": r.numero_documento,
+        "direccion": r.direccion,
+        "ciudad_id": r.ciudad_id,
+        "ciudad_nombre": r.ciudad.nombre if r.ciudad else ""
+    }
+
+
 @remitentes_bp.route('/', methods=['GET'])
-# Cache por 5 minutos (más corto por paginación/búsqueda)
-@cache.cached(timeout=300)
+# Cache por 5 minutos (más corto por paginación/búsqueda).
+# La clave incluye el query string: cada página/cursor/búsqueda es distinta,
+# y la versión de remitentes/ciudades: se invalida al escribir
+@condicional_por_tablas("remitentes", "ciudades")
+@cache_por_tablas("remitentes", "ciudades", timeout=300, query_string=True)
 def listar_remitentes():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 50, type=int)  # Cambiar de 10 a 50
     q = request.args.get('q', '', type=str).strip()
 
-    query = Remitente.query
+    query = Remitente.query.options(joinedload(Remitente.ciudad))
 
     if q:
         search = f"%{q}%"
@@ -26,6 +45,20 @@ def listar_remitentes():
             )
         )
 
+    # Keyset: ?cursor= (vacío = primera página) -> next_cursor, sin OFFSET ni COUNT
+    if usa_cursor(request.args):
+        per_page = por_pagina(request.args, 50)
+        try:
+            remitentes, next_cursor = paginar_por_cursor(
+                query, Remitente.id, request.args, per_page)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({
+            "items": [to_dict_remitente_lista(r) for r in remitentes],
+            **respuesta_cursor(next_cursor, total_cacheado(
+                query, 'remitentes', request.args), per_page)
+        })
+
     remitentes = query.order_by(Remitente.id.desc()).paginate(
         page=page,
         per_page=per_page,
@@ -33,18 +66,7 @@ def listar_remitentes():
     )
 
     return jsonify({
-        "items": [
-            {
-                "id": r.id,
-                "nombre": r.nombre,
-                "tipo_documento": r.tipo_documento,
-                "numero_documento": r.numero_documento,
-                "direccion": r.direccion,
-                "ciudad_id": r.ciudad_id,
-                "ciudad_nombre": r.ciudad.nombre if r.ciudad else ""
-            }
-            for r in remitentes.items
-        ],
+        "items": [to_dict_remitente_lista(r) for r in remitentes.items],
         "total": remitentes.total,
         "pages": remitentes.pages,
         "current_page": remitentes.page
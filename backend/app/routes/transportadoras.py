@@ -1,6 +1,10 @@
 from flask import Blueprint, request, jsonify
+from sqlalchemy.orm import selectinload
 from app.models import Transportadora, Ciudad
 from app import db
+from app.utils.cache_tablas import cache_por_tablas, condicional_por_tablas
+from app.utils.paginacion import (
+    usa_cursor, por_pagina, paginar_por_cursor, total_cacheado, respuesta_cursor)
 
 transportadoras_bp = Blueprint(
     'transportadoras', __name__, url_prefix='/api/transportadoras')
@@ -8,7 +12,34 @@ transportadoras_bp = Blueprint(
 # Listar transportadoras (paginado y búsqueda opcional, honorarios relacionados)
 
 
+def to_dict_transportadora_lista(t):
+    return {
+        "id": t.id,
+        "codigo": t.codigo,
+        "honorario": float(t.honorario) if t.honorario else 0,
+        "nombre": t.nombre,
+        "direccion": t.direccion,
+        "ciudad_id": t.ciudad_id,
+        "tipo_documento": t.tipo_documento,
+        "numero_documento": t.numero_documento,
+        "telefono": t.telefono,
+        # "honorarios" ahora es una lista de honorarios registrados para esa transportadora
+        "honorarios": [
+            {
+                "id": h.id,
+                "descripcion": h.descripcion,
+                "monto": float(h.monto),
+                "fecha": h.fecha.isoformat() if h.fecha else None,
+                # Si existe el campo en tu modelo
+                "moneda_id": getattr(h, "moneda_id", None)
+            } for h in t.honorarios_registrados
+        ]
+    }
+
+
 @transportadoras_bp.route('/', methods=['GET'])
+@condicional_por_tablas("transportadoras", "honorarios")
+@cache_por_tablas("transportadoras", "honorarios", timeout=300, query_string=True)
 def listar_transportadoras():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
@@ -23,34 +54,26 @@ def listar_transportadoras():
                 Transportadora.direccion.ilike(search)
             )
         )
+
+    # Keyset: ?cursor= (vacío = primera página) -> next_cursor, sin OFFSET ni COUNT
+    if usa_cursor(request.args):
+        per_page = por_pagina(request.args, 10)
+        try:
+            transportadoras, next_cursor = paginar_por_cursor(
+                query.options(selectinload(Transportadora.honorarios_registrados)),
+                Transportadora.id, request.args, per_page)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({
+            "items": [to_dict_transportadora_lista(t) for t in transportadoras],
+            **respuesta_cursor(next_cursor, total_cacheado(
+                query, 'transportadoras', request.args), per_page)
+        })
+
     transportadoras = query.order_by(
         Transportadora.id.desc()).paginate(page=page, per_page=per_page)
     return jsonify({
-        "items": [
-            {
-                "id": t.id,
-                "codigo": t.codigo,
-                "honorario": float(t.honorario) if t.honorario else 0,
-                "nombre": t.nombre,
-                "direccion": t.direccion,
-                "ciudad_id": t.ciudad_id,
-                "tipo_documento": t.tipo_documento,
-                "numero_documento": t.numero_documento,
-                "telefono": t.telefono,
-                # "honorarios" ahora es una lista de honorarios registrados para esa transportadora
-                "honorarios": [
-                    {
-                        "id": h.id,
-                        "descripcion": h.descripcion,
-                        "monto": float(h.monto),
-                        "fecha": h.fecha.isoformat() if h.fecha else None,
-                        # Si existe el campo en tu modelo
-                        "moneda_id": getattr(h, "moneda_id", None)
-                    } for h in t.honorarios_registrados
-                ]
-            }
-            for t in transportadoras.items
-        ],
+        "items": [to_dict_transportadora_lista(t) for t in transportadoras.items],
         "total": transportadoras.total,
         "pages": transportadoras.pages,
         "current_page": transportadoras.page
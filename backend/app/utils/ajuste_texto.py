@@ -0,0 +1,259 @@
+# ========== backend/app/utils/ajuste_texto.py ==========
+"""
+Motor único de ajuste de texto para los PDF (CRT y MIC/DTA).
+
+- Anchos de palabras cacheados por fuente (se miden una vez a 1pt y se
+  escalan linealmente al tamaño pedido).
+- Búsqueda binaria del tamaño de fuente en lugar de probar tamaño por tamaño.
+- Resultados memoizados por (texto, fuente, caja, config): los textos que se
+  repiten entre documentos (direcciones, tramos, leyendas) no se recalculan.
+
+Las funciones de dibujo sólo posicionan las líneas ya calculadas.
+"""
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+ELLIPSIS = "..."
+
+
+# =============================
+#      ANCHOS CACHEADOS
+# =============================
+
+@lru_cache(maxsize=65536)
+def ancho_palabra(palabra, fuente):
+    """Ancho de una palabra a 1pt (se escala multiplicando por el tamaño)."""
+    return stringWidth(palabra, fuente, 1)
+
+
+@lru_cache(maxsize=4096)
+def _anchos_acumulados(texto, fuente):
+    """Ancho acumulado (a 1pt) de cada prefijo de `texto`."""
+    return tuple(accumulate(ancho_palabra(ch, fuente) for ch in texto))
+
+
+def ancho_texto(texto, fuente, tamano):
+    """Equivalente a stringWidth usando la tabla de palabras de la fuente."""
+    if not texto:
+        return 0.0
+    palabras = texto.split(' ')
+    total = sum(ancho_palabra(p, fuente) for p in palabras if p)
+    return (total + ancho_palabra(' ', fuente) * (len(palabras) - 1)) * tamano
+
+
+def prefijo_que_entra(texto, fuente, tamano, ancho_max):
+    """Cantidad máxima de caracteres iniciales de `texto` que entran en ancho_max."""
+    if tamano <= 0:
+        return len(texto)
+    return bisect_right(_anchos_acumulados(texto, fuente), ancho_max / tamano)
+
+
+def _envolver_linea(linea, fuente, tamano, ancho_max):
+    """Word-wrap de una línea sin saltos. Retorna lista de líneas."""
+    limite = ancho_max / tamano if tamano > 0 else float('inf')
+    espacio = ancho_palabra(' ', fuente)
+    resultado = []
+    actual, ancho_actual = "", 0.0
+    for palabra in linea.split():
+        w = ancho_palabra(palabra, fuente)
+        prueba = ancho_actual + espacio + w if actual else w
+        if prueba <= limite:
+            actual = f"{actual} {palabra}" if actual else palabra
+            ancho_actual = prueba
+        else:
+            if actual:
+                resultado.append(actual)
+            actual, ancho_actual = palabra, w
+    if actual:
+        resultado.append(actual)
+    return resultado
+
+
+# =============================
+#      CORTE EN LÍNEAS
+# =============================
+
+@lru_cache(maxsize=8192)
+def wrap_text_multiline(text, fontName, fontSize, max_width):
+    """
+    Corta el texto respetando los saltos manuales (las líneas vacías se omiten).
+    Retorna una tupla de líneas.
+    """
+    result = []
+    for original_line in (text or "").split('\n'):
+        result.extend(_envolver_linea(original_line, fontName, fontSize, max_width))
+    return tuple(result)
+
+
+def _truncar_palabra(palabra, fuente, tamano, ancho_max):
+    """Recorta una palabra demasiado larga agregando '...'."""
+    n = prefijo_que_entra(palabra, fuente, tamano,
+                          ancho_max - ancho_texto(ELLIPSIS, fuente, tamano))
+    n = max(1, min(n, len(palabra)))
+    return palabra[:n] + ELLIPSIS if n > 1 else ELLIPSIS
+
+
+def _lineas_area(texto, fuente, tamano, ancho):
+    """Corte usado por los campos de área del CRT: palabras largas se truncan."""
+    limite = ancho / tamano
+    espacio = ancho_palabra(' ', fuente)
+    lineas = []
+    for original_line in texto.split('\n'):
+        actual, ancho_actual = "", 0.0
+        for palabra in original_line.split():
+            w = ancho_palabra(palabra, fuente)
+            prueba = ancho_actual + espacio + w if actual else w
+            if prueba <= limite:
+                actual = f"{actual} {palabra}" if actual else palabra
+                ancho_actual = prueba
+                continue
+            if actual:
+                lineas.append(actual)
+            actual, ancho_actual = palabra, w
+            # Si la palabra individual es demasiado larga, truncarla (y cortar la línea)
+            if w > limite:
+                lineas.append(_truncar_palabra(palabra, fuente, tamano, ancho))
+                actual = ""
+                break
+        if actual:
+            lineas.append(actual)
+    return lineas
+
+
+# =============================
+#   AJUSTE CON BÚSQUEDA BINARIA
+# =============================
+
+@lru_cache(maxsize=4096)
+def ajustar_area(text, fontName, width, height, min_font, max_font, leading_ratio, paso=0.25):
+    """
+    Busca el mayor tamaño (en pasos de `paso` desde max_font) con el que el
+    texto entra en el área. Retorna (lineas, tamaño).
+    """
+    line_height_min = min_font * leading_ratio
+    max_lines = max(1, int(height // line_height_min))
+
+    def cabe(tamano):
+        lineas = _lineas_area(text, fontName, tamano, width)
+        return lineas, (len(lineas) * tamano * leading_ratio <= height
+                        and len(lineas) <= max_lines)
+
+    # Tamaños candidatos: max_font, max_font - paso, ... mientras >= min_font
+    pasos = -1
+    while max_font - (pasos + 1) * paso >= min_font:
+        pasos += 1
+
+    mejor = None
+    palabra_max = max((ancho_palabra(p, fontName) for p in text.split()), default=0)
+    if palabra_max * max_font > width:
+        # Con palabras truncadas el ajuste deja de ser monótono: se recorre
+        # de mayor a menor como antes para mantener el mismo resultado
+        for k in range(pasos + 1):
+            lineas, ok = cabe(max_font - k * paso)
+            if ok:
+                mejor = (lineas, max_font - k * paso)
+                break
+    else:
+        lo, hi = 0, pasos
+        while lo <= hi:
+            k = (lo + hi) // 2
+            lineas, ok = cabe(max_font - k * paso)
+            if ok:
+                mejor = (lineas, max_font - k * paso)
+                hi = k - 1
+            else:
+                lo = k + 1
+
+    if mejor is None and pasos >= 0:
+        # Nada entra: líneas del tamaño más chico probado, un paso por debajo
+        tamano = max_font - pasos * paso
+        mejor = (cabe(tamano)[0], tamano - paso)
+    elif mejor is None:
+        mejor = (_lineas_area(text.replace('\n', ' '), fontName, min_font, width), min_font)
+
+    lineas, tamano = mejor
+    if len(lineas) > max_lines:
+        lineas = lineas[:max_lines]
+        if lineas and len(lineas[-1]) > 4:
+            lineas[-1] = lineas[-1][:-3] + ELLIPSIS
+    return tuple(lineas), tamano
+
+
+@lru_cache(maxsize=4096)
+def ajustar_caja(text, font, eff_w, eff_h, min_font, max_font, leading_ratio, allow_multiline):
+    """
+    Ajuste de los campos del MIC: búsqueda binaria sobre tamaños enteros.
+    Retorna (tamaño, lineas, iteraciones); iteraciones = tamaños probados.
+    """
+    def wrap_text_for_size(sz):
+        if not allow_multiline:
+            # Para campos de una línea, simplemente truncar
+            single_line = text.replace('\n', ' ').replace('\r', ' ')
+            max_chars = prefijo_que_entra(single_line, font, sz, eff_w)
+            if max_chars < len(single_line) and max_chars > 3:
+                return (single_line[:max_chars-3] + ELLIPSIS,)
+            elif max_chars > 0:
+                return (single_line[:max_chars],)
+            return ("",)
+
+        lines = []
+        for manual_line in text.split('\n'):
+            if not manual_line.strip():
+                lines.append("")
+                continue
+            lines.extend(_envolver_linea(manual_line, font, sz, eff_w))
+        return tuple(lines)
+
+    lo, hi = min_font, max_font
+    best_sz, best_lines = min_font, ()
+    iteraciones = 0
+
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        lines = wrap_text_for_size(mid)
+        iteraciones += 1
+        if mid * leading_ratio * len(lines) <= eff_h:
+            best_sz, best_lines = mid, lines
+            lo = mid + 1
+        else:
+            hi = mid - 1
+
+    if not best_lines:
+        best_sz = min_font
+        best_lines = wrap_text_for_size(best_sz)
+        iteraciones += 1
+    return best_sz, best_lines, iteraciones
+
+
+# =============================
+#          DIBUJO
+# =============================
+
+def draw_text_fit_area(c, text, x, y, width, height, fontName="Helvetica", min_font=4.5, max_font=6.0, leading_ratio=1.1):
+    """Dibuja texto ajustado al área (de arriba hacia abajo desde `y`)."""
+    if not text or text.strip() == "":
+        return y
+
+    lines, font_size = ajustar_area(
+        text, fontName, width, height, min_font, max_font, leading_ratio)
+
+    c.setFont(fontName, font_size)
+    curr_y = y
+    line_height = font_size * leading_ratio
+
+    for line in lines:
+        if curr_y - line_height < y - height:
+            break  # No dibujar fuera del área
+        c.drawString(x, curr_y, line)
+        curr_y -= line_height
+
+    return curr_y
+
+
+def info_caches():
+    """Estadísticas de los caches del motor (para diagnóstico)."""
+    return {f.__name__: f.cache_info()._asdict() for f in (
+        ancho_palabra, _anchos_acumulados, wrap_text_multiline, ajustar_area, ajustar_caja)}
@@ -0,0 +1,230 @@
+# ========== backend/app/utils/busqueda.py ==========
+"""
+Búsqueda de texto libre en CRTs y MICs.
+
+Un ILIKE '%texto%' no puede usar un índice B-tree, así que la búsqueda usa
+el motor que tenga la base:
+
+- PostgreSQL: índices GIN pg_trgm (migración 8c41f0e2d7b5). Los mismos ILIKE
+  pasan a usar índice; el ranking sale de similarity()/ts_rank.
+- SQLite: tablas FTS5 con tokenizer trigram (external content sobre crts,
+  remitentes, transportadoras y mics) sincronizadas por triggers. Se crean
+  al arrancar la app (init_busqueda).
+- Sin ninguno de los dos (o textos de menos de 3 caracteres, que no forman
+  un trigrama): ILIKE como antes.
+
+Las subconsultas de ids reemplazan a los outerjoin + DISTINCT del listado.
+"""
+from flask import current_app
+from sqlalchemy import Integer, column, inspect, or_, select, text, union
+
+from app import db
+from app.models import CRT, MIC, Remitente, Transportadora
+
+MIN_TRIGRAMA = 3
+
+# Tablas FTS5 (SQLite): nombre -> (tabla origen, columnas indexadas)
+TABLAS_FTS = {
+    "fts_crts": ("crts", ["numero_crt", "detalles_mercaderia"]),
+    "fts_remitentes": ("remitentes", ["nombre"]),
+    "fts_transportadoras": ("transportadoras", ["nombre"]),
+    "fts_mics": ("mics", ["campo_1_transporte", "campo_11_placa", "campo_15_placa_semi",
+                          "campo_8_destino", "campo_23_numero_campo2_crt"]),
+}
+
+# Columnas de MIC que entran en la búsqueda libre
+COLUMNAS_MIC = ["campo_1_transporte", "campo_11_placa", "campo_15_placa_semi",
+                "campo_8_destino", "campo_23_numero_campo2_crt"]
+
+
+# =============================
+#       INICIALIZACIÓN
+# =============================
+
+def init_busqueda(app):
+    """Detecta el motor de búsqueda y, en SQLite, crea/sincroniza las tablas FTS5."""
+    motor = "like"
+    try:
+        with app.app_context():
+            dialecto = db.engine.dialect.name
+            if dialecto == "postgresql":
+                hay_trgm = db.session.execute(text(
+                    "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar()
+                motor = "postgresql" if hay_trgm else "like"
+            elif dialecto == "sqlite":
+                motor = "sqlite" if _crear_tablas_fts() else "like"
+            db.session.commit()
+    except Exception as e:
+        print(f"⚠️ Búsqueda sin índice de texto (ILIKE): {e}")
+        motor = "like"
+    app.extensions["busqueda"] = motor
+    print(f"🔎 Motor de búsqueda: {motor}")
+    return motor
+
+
+def _crear_tablas_fts():
+    """Crea las tablas FTS5 trigram + triggers. False si faltan tablas o FTS5."""
+    existentes = set(inspect(db.engine).get_table_names())
+    if not {origen for origen, _ in TABLAS_FTS.values()} <= existentes:
+        return False
+
+    for fts, (origen, columnas) in TABLAS_FTS.items():
+        nueva = fts not in existentes
+        cols = ", ".join(columnas)
+        viejos = ", ".join(f"old.{c}" for c in columnas)
+        nuevos = ", ".join(f"new.{c}" for c in columnas)
+        db.session.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+            f"{cols}, content='{origen}', content_rowid='id', tokenize='trigram')"))
+        db.session.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {origen} BEGIN "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {nuevos}); END"))
+        db.session.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {origen} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {viejos}); END"))
+        db.session.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {origen} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {viejos}); "
+            f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {nuevos}); END"))
+        if nueva:
+            # Indexar lo que ya existía
+            db.session.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+    return True
+
+
+def motor_busqueda():
+    return current_app.extensions.get("busqueda", "like")
+
+
+def _usa_fts(texto):
+    return motor_busqueda() == "sqlite" and len(texto) >= MIN_TRIGRAMA
+
+
+def _frase_fts(texto, columnas=None):
+    """Consulta MATCH de substring (frase trigram), opcionalmente por columnas."""
+    frase = '"' + texto.replace('"', '""') + '"'
+    if columnas:
+        return "{" + " ".join(columnas) + "} : " + frase
+    return frase
+
+
+# =============================
+#     FILTROS PARA LISTADOS
+# =============================
+
+def ids_crt_coincidentes(texto):
+    """Subconsulta con los ids de CRT cuyo número, mercadería, remitente o transportadora contienen `texto`."""
+    if _usa_fts(texto):
+        return text(
+            "SELECT rowid FROM fts_crts WHERE fts_crts MATCH :busq_crt "
+            "UNION SELECT crts.id FROM crts JOIN fts_remitentes "
+            "ON fts_remitentes.rowid = crts.remitente_id WHERE fts_remitentes MATCH :busq_crt "
+            "UNION SELECT crts.id FROM crts JOIN fts_transportadoras "
+            "ON fts_transportadoras.rowid = crts.transportadora_id "
+            "WHERE fts_transportadoras MATCH :busq_crt"
+        ).bindparams(busq_crt=_frase_fts(texto)).columns(column("id", Integer))
+
+    # PostgreSQL (índices trigram) o ILIKE: cada rama usa su propio índice
+    like = f"%{texto}%"
+    return union(
+        select(CRT.id).where(or_(CRT.numero_crt.ilike(like),
+                                 CRT.detalles_mercaderia.ilike(like))),
+        select(CRT.id).join(Remitente, Remitente.id == CRT.remitente_id)
+        .where(Remitente.nombre.ilike(like)),
+        select(CRT.id).join(Transportadora, Transportadora.id == CRT.transportadora_id)
+        .where(Transportadora.nombre.ilike(like)),
+    )
+
+
+def filtro_texto_crt(texto):
+    """Condición para query.filter(): CRTs que contienen `texto`."""
+    return CRT.id.in_(ids_crt_coincidentes(texto))
+
+
+def filtro_texto_mic(columnas, texto):
+    """Condición para query.filter(): MICs con `texto` en alguna de `columnas`."""
+    if _usa_fts(texto):
+        nombre = "busq_" + "_".join(c.split("_")[1] for c in columnas)
+        return MIC.id.in_(text(
+            f"SELECT rowid FROM fts_mics WHERE fts_mics MATCH :{nombre}"
+        ).bindparams(**{nombre: _frase_fts(texto, columnas)}).columns(column("id", Integer)))
+    like = f"%{texto}%"
+    return or_(*[getattr(MIC, c).ilike(like) for c in columnas])
+
+
+# =============================
+#     BÚSQUEDA CON RANKING
+# =============================
+
+def buscar_crts(texto, limite=50):
+    """Ids de CRT ordenados por relevancia (los mejores primero)."""
+    texto = (texto or "").strip()
+    if not texto:
+        return []
+    motor = motor_busqueda()
+
+    if _usa_fts(texto):
+        filas = db.session.execute(text(
+            "SELECT id FROM ("
+            " SELECT rowid AS id, bm25(fts_crts) AS rank FROM fts_crts"
+            "  WHERE fts_crts MATCH :m"
+            " UNION ALL SELECT crts.id, bm25(fts_remitentes) FROM crts JOIN fts_remitentes"
+            "  ON fts_remitentes.rowid = crts.remitente_id WHERE fts_remitentes MATCH :m"
+            " UNION ALL SELECT crts.id, bm25(fts_transportadoras) FROM crts JOIN fts_transportadoras"
+            "  ON fts_transportadoras.rowid = crts.transportadora_id"
+            "  WHERE fts_transportadoras MATCH :m"
+            ") GROUP BY id ORDER BY min(rank), id DESC LIMIT :limite"
+        ), {"m": _frase_fts(texto), "limite": limite})
+        return [f.id for f in filas]
+
+    if motor == "postgresql":
+        filas = db.session.execute(text(
+            "SELECT c.id FROM crts c"
+            " LEFT JOIN remitentes r ON r.id = c.remitente_id"
+            " LEFT JOIN transportadoras t ON t.id = c.transportadora_id"
+            " WHERE c.id IN (SELECT id FROM crts WHERE numero_crt ILIKE :like"
+            "                OR detalles_mercaderia ILIKE :like"
+            "                UNION SELECT crts.id FROM crts JOIN remitentes"
+            "                ON remitentes.id = crts.remitente_id WHERE remitentes.nombre ILIKE :like"
+            "                UNION SELECT crts.id FROM crts JOIN transportadoras"
+            "                ON transportadoras.id = crts.transportadora_id"
+            "                WHERE transportadoras.nombre ILIKE :like)"
+            " ORDER BY GREATEST(similarity(c.numero_crt, :q),"
+            "   word_similarity(:q, coalesce(r.nombre, '')),"
+            "   word_similarity(:q, coalesce(t.nombre, '')),"
+            "   ts_rank(to_tsvector('spanish', coalesce(c.detalles_mercaderia, '')),"
+            "           plainto_tsquery('spanish', :q))) DESC, c.id DESC"
+            " LIMIT :limite"
+        ), {"q": texto, "like": f"%{texto}%", "limite": limite})
+        return [f.id for f in filas]
+
+    ids = select(CRT.id).where(filtro_texto_crt(texto)).order_by(CRT.id.desc()).limit(limite)
+    return [f.id for f in db.session.execute(ids)]
+
+
+def buscar_mics(texto, limite=50):
+    """Ids de MIC ordenados por relevancia (los mejores primero)."""
+    texto = (texto or "").strip()
+    if not texto:
+        return []
+    motor = motor_busqueda()
+
+    if _usa_fts(texto):
+        filas = db.session.execute(text(
+            "SELECT rowid AS id FROM fts_mics WHERE fts_mics MATCH :m"
+            " ORDER BY bm25(fts_mics), rowid DESC LIMIT :limite"
+        ), {"m": _frase_fts(texto), "limite": limite})
+        return [f.id for f in filas]
+
+    if motor == "postgresql":
+        similitud = ", ".join(f"word_similarity(:q, coalesce({c}, ''))" for c in COLUMNAS_MIC)
+        condicion = " OR ".join(f"{c} ILIKE :like" for c in COLUMNAS_MIC)
+        filas = db.session.execute(text(
+            f"SELECT id FROM mics WHERE {condicion}"
+            f" ORDER BY GREATEST({similitud}) DESC, id DESC LIMIT :limite"
+        ), {"q": texto, "like": f"%{texto}%", "limite": limite})
+        return [f.id for f in filas]
+
+    ids = (select(MIC.id).where(filtro_texto_mic(COLUMNAS_MIC, texto))
+           .order_by(MIC.id.desc()).limit(limite))
+    return [f.id for f in db.session.execute(ids)]
@@ -0,0 +1,212 @@
+# ========== backend/app/utils/cache_pdf.py ==========
+"""
+Cache de PDFs generados, direccionado por contenido.
+
+La clave es un hash del dict que se renderiza (to_dict_mic, to_dict_mic_completo,
+to_dict_crt_pdf) más la huella de las plantillas: si el documento no cambió, el
+PDF tampoco, y se sirve desde disco sin volver a renderizar. La misma clave es
+el ETag de la respuesta (If-None-Match -> 304).
+
+Almacenamiento: <PDF_CACHE_DIR>/<2 primeros>/<clave>.pdf, acotado a
+PDF_CACHE_MAX_MB con desalojo LRU (el mtime se renueva en cada acierto).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from io import BytesIO
+
+from flask import make_response, request, send_file
+
+from app.utils.render_pdf import renderizar_pdf
+
+# Subir si cambia el dibujo de los datos (la huella de plantillas cubre lo estático)
+VERSION_PDF = 1
+
+_config = {
+    "dir": None,
+    "max_bytes": 0,
+}
+_estado = {"bytes": 0, "aciertos": 0, "fallos": 0, "desalojos": 0}
+_lock = threading.Lock()
+
+
+def init_cache_pdf(app):
+    """Configura el directorio y el tamaño máximo del cache de PDFs."""
+    directorio = app.config.get('PDF_CACHE_DIR') or os.path.join(
+        app.instance_path, 'pdf_cache')
+    max_mb = float(app.config.get('PDF_CACHE_MAX_MB', 256) or 0)
+    _config["max_bytes"] = int(max_mb * 1024 * 1024)
+    if _config["max_bytes"] <= 0:
+        _config["dir"] = None
+        return
+    os.makedirs(directorio, exist_ok=True)
+    _config["dir"] = directorio
+    _estado["bytes"] = sum(tam for _, _, tam in _archivos())
+    print(f"🗄️ Cache de PDFs en {directorio} "
+          f"({_estado['bytes'] // 1024} KB de {int(max_mb)} MB)")
+
+
+def _huella_plantillas(tipo):
+    if tipo.startswith("crt"):
+        from app.utils.layout_crt import obtener_plantilla_crt
+        return obtener_plantilla_crt().huella
+    from app.utils.layout_mic import obtener_plantilla_mic
+    return obtener_plantilla_mic().huella
+
+
+def _con_valores_del_render(tipo, datos):
+    """
+    Lo que el render tomaría del momento (la fecha de un MIC sin fecha) se
+    fija en los datos antes de calcular la clave y se renderiza con eso.
+    """
+    if tipo == "mic":
+        from app.utils.layout_mic import con_fecha_efectiva
+        return con_fecha_efectiva(datos)
+    return datos
+
+
+def _contar(evento):
+    with _lock:
+        _estado[evento] += 1
+
+
+def clave_pdf(tipo, datos):
+    """Hash estable del documento a renderizar (también es su ETag)."""
+    crudo = json.dumps([VERSION_PDF, tipo, _huella_plantillas(tipo), datos],
+                       sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(crudo.encode('utf-8')).hexdigest()
+
+
+def _ruta(clave):
+    return os.path.join(_config["dir"], clave[:2], f"{clave}.pdf")
+
+
+def _archivos():
+    """(ruta, mtime, tamaño) de todos los PDFs del cache."""
+    resultado = []
+    for raiz, _, nombres in os.walk(_config["dir"]):
+        for nombre in nombres:
+            if not nombre.endswith('.pdf'):
+                continue
+            ruta = os.path.join(raiz, nombre)
+            try:
+                st = os.stat(ruta)
+            except FileNotFoundError:
+                continue
+            resultado.append((ruta, st.st_mtime, st.st_size))
+    return resultado
+
+
+def _leer(clave):
+    ruta = _ruta(clave)
+    try:
+        with open(ruta, 'rb') as f:
+            pdf = f.read()
+        os.utime(ruta)  # LRU: marcar como usado recién
+        return pdf
+    except FileNotFoundError:
+        return None
+
+
+def _guardar(clave, pdf):
+    """Escritura atómica (tmp + rename) y desalojo si se pasa del tamaño máximo."""
+    ruta = _ruta(clave)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(ruta))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp, ruta)
+    except OSError:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+    with _lock:
+        _estado["bytes"] += len(pdf)
+        if _estado["bytes"] > _config["max_bytes"]:
+            _desalojar()
+
+
+def _desalojar():
+    """Borra los PDFs menos usados hasta quedar en el 90% del máximo."""
+    archivos = sorted(_archivos(), key=lambda a: a[1])
+    total = sum(tam for _, _, tam in archivos)
+    objetivo = int(_config["max_bytes"] * 0.9)
+    for ruta, _, tam in archivos:
+        if total <= objetivo:
+            break
+        try:
+            os.unlink(ruta)
+            _estado["desalojos"] += 1
+        except FileNotFoundError:
+            pass
+        total -= tam
+    _estado["bytes"] = total
+
+
+def obtener_pdf(tipo, datos, clave=None):
+    """
+    Devuelve (bytes, clave, acierto) del PDF del documento: desde el cache si
+    ya se generó con el mismo contenido, o renderizándolo (y guardándolo) si no.
+    """
+    datos = _con_valores_del_render(tipo, datos)
+    clave = clave or clave_pdf(tipo, datos)
+    if _config["dir"]:
+        pdf = _leer(clave)
+        if pdf is not None:
+            _contar("aciertos")
+            return pdf, clave, True
+
+    _contar("fallos")
+    pdf = renderizar_pdf(tipo, datos)
+    if _config["dir"]:
+        try:
+            _guardar(clave, pdf)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el PDF en cache: {e}")
+    return pdf, clave, False
+
+
+def enviar_pdf(tipo, datos, download_name):
+    """Respuesta de descarga con ETag; si el cliente ya tiene esa versión, 304 sin renderizar."""
+    datos = _con_valores_del_render(tipo, datos)
+    clave = clave_pdf(tipo, datos)
+    if request.method in ("GET", "HEAD") and request.if_none_match.contains(clave):
+        _contar("aciertos")
+        response = make_response("", 304)
+        response.set_etag(clave)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    pdf, clave, acierto = obtener_pdf(tipo, datos, clave)
+    response = send_file(
+        BytesIO(pdf),
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name=download_name,
+        etag=clave,
+        max_age=0,
+    )
+    response.headers["X-PDF-Cache"] = "HIT" if acierto else "MISS"
+    return response
+
+
+def limpiar_cache_pdf():
+    """Vacía el cache de PDFs."""
+    if not _config["dir"]:
+        return
+    with _lock:
+        for ruta, _, _ in _archivos():
+            try:
+                os.unlink(ruta)
+            except FileNotFoundError:
+                pass
+        _estado["bytes"] = 0
+
+
+def estadisticas_cache_pdf():
+    """Aciertos, fallos, desalojos y bytes en disco (para diagnóstico)."""
+    return {**_estado, "max_bytes": _config["max_bytes"], "dir": _config["dir"]}
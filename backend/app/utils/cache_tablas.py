@@ -0,0 +1,238 @@
+# ========== backend/app/utils/cache_tablas.py ==========
+"""
+Cache de respuestas invalidado por tabla.
+
+Cada tabla tiene en el cache una "versión" (instante del último cambio en
+ms + sufijo aleatorio, en hex). Las claves de
+las respuestas cacheadas incluyen la versión de las tablas de las que
+dependen; al hacer commit de un cambio en una tabla se genera una versión
+nueva y las entradas viejas dejan de encontrarse (vencen solas por timeout).
+
+Los cambios se detectan con eventos de la sesión de SQLAlchemy (flush de
+objetos y UPDATE/DELETE masivos), así que las rutas de escritura no tienen
+que acordarse de invalidar nada. Para SQL crudo: invalidar_tablas().
+
+La clave de una respuesta es: ruta + alcance del token (rol o usuario) +
+versiones de las tablas + query string normalizado (orden, vacíos y "_"
+no cuentan). Aciertos y fallos se exportan por endpoint en /metrics.
+
+Las mismas versiones sirven de validadores HTTP (condicional_por_tablas):
+ETag y Last-Modified sin ejecutar la vista, 304 si el cliente ya tiene la
+respuesta vigente. Last-Modified tiene resolución de segundos: mientras el
+último cambio sea del segundo en curso no se envía ni se acepta
+If-Modified-Since (otra escritura en ese mismo segundo tendría la misma
+fecha); en ese lapso valida solo el ETag.
+
+Con CACHE_REDIS_URL (config.py) el backend es Redis y las versiones se
+comparten entre workers; con SimpleCache cada proceso tiene las suyas, así
+que con varios workers hace falta Redis (o CONDITIONAL_GET=0).
+"""
+import functools
+import hashlib
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app, has_app_context, request, make_response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import cache
+from app.metrics import CACHE_REQUESTS
+from app.utils.auth import get_current_user
+
+CLAVE_TABLAS = "tablas_modificadas"
+
+
+# =============================
+#      VERSIONES POR TABLA
+# =============================
+
+def _clave_version(tabla):
+    return f"version_tabla:{tabla}"
+
+
+def _ahora():
+    return time.time()
+
+
+def _nueva_version():
+    return f"{int(_ahora() * 1000):x}.{uuid.uuid4().hex[:6]}"
+
+
+def version_tablas(tablas):
+    """Versiones actuales de `tablas` (se crean si faltan)."""
+    claves = [_clave_version(t) for t in tablas]
+    versiones = list(cache.get_many(*claves)) if claves else []
+    for i, version in enumerate(versiones):
+        if version is None:
+            # Versión nueva (no 0): una entrada vieja nunca coincide tras un desalojo
+            cache.add(claves[i], _nueva_version(), timeout=0)
+            versiones[i] = cache.get(claves[i])
+    return versiones
+
+
+def fecha_version(versiones):
+    """Instante (UTC, al segundo) del cambio más reciente entre `versiones`."""
+    try:
+        ms = max(int(v.split(".")[0], 16) for v in versiones)
+    except (ValueError, AttributeError):
+        ms = int(_ahora() * 1000)  # versión de formato viejo: cuenta como recién cambiada
+    return datetime.fromtimestamp(ms // 1000, tz=timezone.utc)
+
+
+def invalidar_tablas(*tablas):
+    """Descarta todo lo cacheado que depende de `tablas`."""
+    for tabla in tablas:
+        cache.set(_clave_version(tabla), _nueva_version(), timeout=0)
+
+
+# =============================
+#     EVENTOS DE LA SESIÓN
+# =============================
+
+def _marcar(session, tablas):
+    session.info.setdefault(CLAVE_TABLAS, set()).update(tablas)
+
+
+def _despues_de_flush(session, flush_context):
+    _marcar(session, {
+        obj.__table__.name
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if hasattr(obj, "__table__")
+    })
+
+
+def _al_ejecutar(estado):
+    # query.update()/delete() y update(Modelo) ejecutados por la sesión
+    if estado.is_update or estado.is_delete:
+        tabla = getattr(estado.statement, "table", None)
+        if tabla is not None and getattr(tabla, "name", None):
+            _marcar(estado.session, {tabla.name})
+
+
+def _despues_de_commit(session):
+    tablas = session.info.pop(CLAVE_TABLAS, None)
+    # Commits fuera de la app (scripts) o en apps sin cache: nada que invalidar
+    if tablas and has_app_context() and "cache" in current_app.extensions:
+        invalidar_tablas(*sorted(tablas))
+
+
+def _despues_de_rollback(session):
+    session.info.pop(CLAVE_TABLAS, None)
+
+
+def init_cache_tablas(app):
+    """Engancha la invalidación a todas las sesiones de SQLAlchemy."""
+    if not event.contains(Session, "after_commit", _despues_de_commit):
+        event.listen(Session, "after_flush", _despues_de_flush)
+        event.listen(Session, "do_orm_execute", _al_ejecutar)
+        event.listen(Session, "after_commit", _despues_de_commit)
+        event.listen(Session, "after_rollback", _despues_de_rollback)
+    print(f"🧊 Cache de respuestas: {app.config.get('CACHE_TYPE')}")
+
+
+# =============================
+#         DECORADOR
+# =============================
+
+# Parámetros que no cambian la respuesta (anti-cache del navegador)
+ARGS_IGNORADOS = {"_"}
+
+
+def _args_normalizados():
+    """Query string canónico: sin vacíos ni ignorados, ordenado, valores sin espacios."""
+    pares = sorted(
+        (k, v.strip()) for k, v in request.args.items(multi=True)
+        if k not in ARGS_IGNORADOS and v.strip()
+    )
+    return "&".join(f"{k}={v}" for k, v in pares)
+
+
+def _alcance(alcance):
+    """Parte de la clave según quién pide: por rol, por usuario o común a todos."""
+    if alcance is None:
+        return "todos"
+    usuario = get_current_user()
+    if not usuario:
+        return "anonimo"
+    if alcance == "usuario":
+        return f"usuario:{usuario['user_id']}"
+    return f"rol:{usuario['rol']}"
+
+
+def cache_por_tablas(*tablas, timeout=None, query_string=False, alcance="rol"):
+    """
+    Como @cache.cached, pero la clave incluye la versión de `tablas`
+    (cualquier commit sobre ellas invalida la respuesta), el query string
+    normalizado y el alcance del token (alcance="rol" | "usuario" | None).
+    Sólo se cachean respuestas 200 que no sean streaming. Aciertos/fallos por
+    endpoint en /metrics.
+    """
+    def decorador(f):
+        @functools.wraps(f)
+        def envoltura(*args, **kwargs):
+            partes = [request.path, _alcance(alcance), *version_tablas(tablas)]
+            if query_string:
+                partes.append(_args_normalizados())
+            clave = "vista:" + hashlib.sha1("|".join(partes).encode()).hexdigest()
+            endpoint = request.endpoint or f.__name__
+
+            guardado = cache.get(clave)
+            if guardado is not None:
+                CACHE_REQUESTS.labels(endpoint=endpoint, result="hit").inc()
+                cuerpo, mimetype = guardado
+                return make_response(cuerpo, 200, {"Content-Type": mimetype, "X-Cache": "HIT"})
+
+            CACHE_REQUESTS.labels(endpoint=endpoint, result="miss").inc()
+            respuesta = make_response(f(*args, **kwargs))
+            # Las respuestas en streaming no se materializan para el cache
+            if respuesta.status_code == 200 and not respuesta.is_streamed:
+                cache.set(clave, (respuesta.get_data(), respuesta.content_type),
+                          timeout=timeout)
+            respuesta.headers["X-Cache"] = "MISS"
+            return respuesta
+        return envoltura
+    return decorador
+
+
+def condicional_por_tablas(*tablas, alcance="rol"):
+    """
+    GET condicional: ETag (ruta + alcance + query + versiones de `tablas`) y
+    Last-Modified (último cambio de `tablas`). Si el cliente manda un
+    If-None-Match / If-Modified-Since vigente responde 304 sin ejecutar la vista.
+    """
+    def decorador(f):
+        @functools.wraps(f)
+        def envoltura(*args, **kwargs):
+            if (request.method not in ("GET", "HEAD")
+                    or not current_app.config.get("CONDITIONAL_GET", True)):
+                return f(*args, **kwargs)
+
+            versiones = version_tablas(tablas)
+            etag = hashlib.sha1("|".join(
+                [request.path, _alcance(alcance), _args_normalizados(), *versiones]
+            ).encode()).hexdigest()
+            modificado = fecha_version(versiones)
+            # Cambio en el segundo en curso: la fecha no distingue versiones
+            if modificado.timestamp() >= int(_ahora()):
+                modificado = None
+
+            if request.if_none_match:
+                vigente = request.if_none_match.contains(etag)
+            else:
+                vigente = bool(modificado and request.if_modified_since
+                               and modificado <= request.if_modified_since)
+            if vigente:
+                respuesta = make_response("", 304)
+            else:
+                respuesta = make_response(f(*args, **kwargs))
+                if respuesta.status_code != 200:
+                    return respuesta
+            respuesta.set_etag(etag)
+            if modificado:
+                respuesta.last_modified = modificado
+            respuesta.headers["Cache-Control"] = "no-cache"
+            return respuesta
+        return envoltura
+    return decorador
@@ -0,0 +1,154 @@
+# ========== backend/app/utils/datos_maestros.py ==========
+"""
+Foto en memoria de los datos maestros del formulario de CRT.
+
+/api/crts/data/* (transportadoras, entidades, monedas, ciudades, países)
+consultaba y serializaba las tablas completas en cada apertura del
+formulario. Ahora cada sección se serializa una vez y se guarda como bytes
+JSON en una foto inmutable por app (app.extensions['datos_maestros']).
+
+En cada pedido se comparan las versiones de tablas de cache_tablas (que
+cambian con cada commit que las toca) con las de la foto: sólo se
+reconstruyen las secciones cuyas tablas cambiaron y la foto nueva
+reemplaza a la anterior de una sola vez. El ETag de cada sección y del
+paquete combinado sale del contenido, así el navegador revalida con 304.
+"""
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from flask import current_app, request, Response
+from sqlalchemy.orm import joinedload
+
+from app.models import Transportadora, Remitente, Moneda, Ciudad, Pais
+from app.utils.cache_tablas import version_tablas
+
+Seccion = namedtuple("Seccion", "versiones cuerpo etag creada")
+
+# Con SimpleCache las versiones son de cada proceso y no ven las escrituras de
+# otros workers: ninguna sección vive más que esto sin reconstruirse
+MAX_EDAD = 300
+
+_lock = threading.Lock()
+
+
+# =============================
+#        SERIALIZADORES
+# =============================
+
+def _transportadoras():
+    return [{
+        "id": t.id,
+        "nombre": t.nombre,
+        "direccion": t.direccion or "",
+        "tipo_documento": t.tipo_documento or "",
+        "numero_documento": t.numero_documento or "",
+        "telefono": getattr(t, 'telefono', '') or "",
+        "ciudad": t.ciudad.nombre if t.ciudad else "",
+        "pais": t.ciudad.pais.nombre if t.ciudad and t.ciudad.pais else ""
+    } for t in Transportadora.query.options(
+        joinedload(Transportadora.ciudad).joinedload(Ciudad.pais)
+    ).order_by(Transportadora.nombre)]
+
+
+def _entidades():
+    return [{
+        "id": e.id,
+        "nombre": e.nombre,
+        "direccion": e.direccion or "",
+        "tipo_documento": e.tipo_documento or "",
+        "numero_documento": e.numero_documento or "",
+        "ciudad": e.ciudad.nombre if e.ciudad else "",
+        "pais": e.ciudad.pais.nombre if e.ciudad and e.ciudad.pais else ""
+    } for e in Remitente.query.options(
+        joinedload(Remitente.ciudad).joinedload(Ciudad.pais)
+    ).order_by(Remitente.nombre)]
+
+
+def _monedas():
+    return [{
+        "id": m.id,
+        "nombre": m.nombre,
+        "codigo": m.codigo
+    } for m in Moneda.query.order_by(Moneda.nombre)]
+
+
+def _ciudades():
+    return [{
+        "id": c.id,
+        "nombre": c.nombre,
+        "pais_id": c.pais_id,
+        "pais": c.pais.nombre if c.pais else ""
+    } for c in Ciudad.query.options(joinedload(Ciudad.pais)).order_by(Ciudad.nombre)]
+
+
+def _paises():
+    return [{"id": p.id, "nombre": p.nombre, "codigo": p.codigo}
+            for p in Pais.query.order_by(Pais.nombre)]
+
+
+# sección -> (tablas de las que depende, serializador)
+SECCIONES = {
+    "transportadoras": (("transportadoras", "ciudades", "paises"), _transportadoras),
+    "entidades": (("remitentes", "ciudades", "paises"), _entidades),
+    "monedas": (("monedas",), _monedas),
+    "ciudades": (("ciudades", "paises"), _ciudades),
+    "paises": (("paises",), _paises),
+}
+
+
+# =============================
+#            FOTO
+# =============================
+
+def _construir_seccion(nombre, versiones):
+    items = SECCIONES[nombre][1]()
+    cuerpo = current_app.json.dumps({"items": items, "total": len(items)}).encode()
+    return Seccion(versiones, cuerpo, hashlib.sha1(cuerpo).hexdigest(), time.monotonic())
+
+
+def _combinar(secciones):
+    """Paquete {"paises": {...}, ...} armado con los bytes ya serializados."""
+    partes = [f'"{nombre}":'.encode() + secciones[nombre].cuerpo for nombre in SECCIONES]
+    cuerpo = b"{" + b",".join(partes) + b"}"
+    etag = hashlib.sha1("".join(secciones[n].etag for n in SECCIONES).encode()).hexdigest()
+    return Seccion(None, cuerpo, etag, min(secciones[n].creada for n in SECCIONES))
+
+
+def obtener_foto():
+    """Foto vigente; reconstruye sólo las secciones con tablas modificadas."""
+    tablas = sorted({t for dependencias, _ in SECCIONES.values() for t in dependencias})
+    actuales = dict(zip(tablas, version_tablas(tablas)))
+
+    ahora = time.monotonic()
+
+    def vigente(foto, nombre):
+        versiones = tuple(actuales[t] for t in SECCIONES[nombre][0])
+        return (foto is not None and foto[nombre].versiones == versiones
+                and ahora - foto[nombre].creada < MAX_EDAD), versiones
+
+    foto = current_app.extensions.get("datos_maestros")
+    if foto is not None and all(vigente(foto, n)[0] for n in SECCIONES):
+        return foto
+
+    with _lock:
+        foto = current_app.extensions.get("datos_maestros")
+        nuevas = {}
+        for nombre in SECCIONES:
+            es_vigente, versiones = vigente(foto, nombre)
+            nuevas[nombre] = foto[nombre] if es_vigente else _construir_seccion(nombre, versiones)
+        nuevas["formulario"] = _combinar(nuevas)
+        foto = MappingProxyType(nuevas)
+        current_app.extensions["datos_maestros"] = foto
+        return foto
+
+
+def respuesta_seccion(nombre):
+    """Respuesta JSON pre-serializada con ETag (304 si el cliente ya la tiene)."""
+    seccion = obtener_foto()[nombre]
+    respuesta = Response(seccion.cuerpo, mimetype="application/json")
+    respuesta.set_etag(seccion.etag)
+    respuesta.headers["Cache-Control"] = "no-cache"
+    return respuesta.make_conditional(request)
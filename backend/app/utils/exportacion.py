@@ -0,0 +1,168 @@
+# ========== backend/app/utils/exportacion.py ==========
+"""
+Exportación de listados a CSV (y XLSX si está openpyxl).
+
+Las filas llegan de filas_en_tandas (cursor del lado del servidor, de a
+FILAS_POR_TANDA) y el CSV se escribe por bloques a medida que salen de la
+base: la descarga empieza enseguida (sin timeouts del proxy) y la memoria
+no depende de la cantidad de filas.
+
+XLSX no se puede enviar a medida que se arma (es un ZIP con índice al
+final): openpyxl en modo write_only vuelca las filas a un temporal en disco
+y el archivo se envía por bloques cuando está completo. Para exportaciones
+muy grandes conviene CSV.
+
+Cada listado define sus columnas como {clave: Columna(titulo, valor)};
+?columnas=a,b,c elige cuáles y en qué orden.
+
+Los textos cargados por usuarios (nombres, detalles de mercadería) que
+empiezan con =, +, -, @, tab o CR se escriben con un ' adelante: Excel los
+tomaría como fórmulas (inyección de fórmulas / CSV injection).
+"""
+import csv
+import io
+import re
+import tempfile
+import traceback
+from collections import namedtuple
+from datetime import date, datetime
+
+from flask import Response, stream_with_context
+
+try:
+    import openpyxl
+except ImportError:  # XLSX opcional
+    openpyxl = None
+
+Columna = namedtuple("Columna", "titulo valor")
+
+FORMATOS = ("csv", "xlsx")
+SEPARADORES = {",": ",", ";": ";", "tab": "\t"}
+BYTES_POR_BLOQUE = 64 * 1024
+
+INICIO_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+_NUMERO = re.compile(r"-?\d+(?:[.,]\d+)*")
+
+MIMETYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+class FormatoNoDisponibleError(Exception):
+    """El formato pedido necesita una dependencia que no está instalada."""
+    pass
+
+
+def elegir_columnas(disponibles, args):
+    """
+    Columnas pedidas en ?columnas=a,b (en ese orden) o todas.
+    ValueError si alguna no existe.
+    """
+    pedidas = [c.strip() for c in (args.get("columnas") or "").split(",") if c.strip()]
+    if not pedidas:
+        return list(disponibles.items())
+    desconocidas = [c for c in pedidas if c not in disponibles]
+    if desconocidas:
+        raise ValueError(f"Columnas desconocidas: {', '.join(desconocidas)}")
+    return [(c, disponibles[c]) for c in dict.fromkeys(pedidas)]
+
+
+def _sin_formula(valor):
+    """Texto que Excel interpretaría como fórmula -> con ' adelante (los números negativos no)."""
+    if (isinstance(valor, str) and valor.startswith(INICIO_FORMULA)
+            and not _NUMERO.fullmatch(valor)):
+        return "'" + valor
+    return valor
+
+
+def _texto(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, datetime):
+        return valor.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(valor, date):
+        return valor.strftime("%Y-%m-%d")
+    return _sin_formula(valor)
+
+
+# =============================
+#            CSV
+# =============================
+
+def _generar_csv(filas, columnas, separador):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=separador)
+    # BOM: Excel abre el UTF-8 con acentos correctamente
+    buffer.write("\ufeff")
+    escritor.writerow([col.titulo for _, col in columnas])
+    try:
+        for fila in filas:
+            escritor.writerow([_texto(col.valor(fila)) for _, col in columnas])
+            if buffer.tell() >= BYTES_POR_BLOQUE:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+    except Exception as e:
+        # El 200 ya salió: se marca el archivo como incompleto y se corta la
+        # conexión, para que no pase por un CSV completo más corto
+        print("❌ Error durante la exportación CSV, archivo cortado")
+        print(traceback.format_exc())
+        escritor.writerow(["#ERROR", f"exportación incompleta: {e}"])
+        yield buffer.getvalue().encode("utf-8")
+        raise
+    yield buffer.getvalue().encode("utf-8")
+
+
+# =============================
+#            XLSX
+# =============================
+
+def _generar_xlsx(filas, columnas, titulo):
+    libro = openpyxl.Workbook(write_only=True)
+    hoja = libro.create_sheet(title=titulo[:31])
+    hoja.append([col.titulo for _, col in columnas])
+    for fila in filas:
+        hoja.append([_sin_formula(col.valor(fila)) for _, col in columnas])
+
+    with tempfile.TemporaryFile() as archivo:
+        libro.save(archivo)
+        archivo.seek(0)
+        while True:
+            bloque = archivo.read(BYTES_POR_BLOQUE)
+            if not bloque:
+                break
+            yield bloque
+
+
+# =============================
+#          RESPUESTA
+# =============================
+
+def respuesta_exportacion(filas, disponibles, args, nombre):
+    """
+    Response de descarga con `filas` (iterable, idealmente filas_en_tandas)
+    en el formato de ?formato= (csv por defecto) y las columnas de ?columnas=.
+    ValueError con parámetros inválidos; FormatoNoDisponibleError si piden
+    xlsx sin openpyxl.
+    """
+    formato = (args.get("formato") or "csv").lower()
+    if formato not in FORMATOS:
+        raise ValueError("Formato inválido (csv o xlsx)")
+    if formato == "xlsx" and openpyxl is None:
+        raise FormatoNoDisponibleError("Exportación XLSX no disponible: falta instalar openpyxl")
+    separador = SEPARADORES.get(args.get("separador") or ",")
+    if separador is None:
+        raise ValueError("Separador inválido (',', ';' o 'tab')")
+    columnas = elegir_columnas(disponibles, args)
+
+    if formato == "csv":
+        generador = _generar_csv(filas, columnas, separador)
+    else:
+        generador = _generar_xlsx(filas, columnas, nombre)
+
+    fecha = datetime.now().strftime('%Y%m%d_%H%M%S')
+    respuesta = Response(stream_with_context(generador), mimetype=MIMETYPES[formato])
+    respuesta.headers["Content-Disposition"] = f'attachment; filename="{nombre}_{fecha}.{formato}"'
+    respuesta.headers["Cache-Control"] = "no-store"
+    return respuesta
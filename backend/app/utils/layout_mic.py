@@ -16,6 +16,7 @@ MIC/DTA PDF Generator - Versión consolidada y estable
 import os
 import re
 from datetime import datetime
+from io import BytesIO
 
 from reportlab.pdfgen import canvas
 from reportlab.platypus import Paragraph, Frame
@@ -24,6 +25,9 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfbase import pdfmetrics
 
+from app.utils.plantilla_pdf import obtener_plantilla, huella_layout
+from app.utils.ajuste_texto import ajustar_caja
+
 # =============================
 #        CONFIG / CONSTANTES
 # =============================
@@ -293,6 +297,10 @@ def fit_text_box_universal(
 ):
     """
     Ajusta texto usando configuración específica por campo.
+    El cálculo (búsqueda binaria + corte) lo hace el motor compartido
+    de ajuste_texto, memoizado por texto/caja/config.
+    Retorna tamaño usado, líneas, truncado e iteraciones de la búsqueda
+    (se exportan como métricas de render).
     """
     if font is None:
         font = FONT_REGULAR
@@ -300,7 +308,7 @@ def fit_text_box_universal(
     text = safe_clean_text(text)
     if not text:
         return {'font_size_used': 8, 'lines_drawn': 0, 'truncated': False,
-                'effective_area': f"{w:.1f}x{h:.1f}"}
+                'iterations': 0, 'effective_area': f"{w:.1f}x{h:.1f}"}
 
     config = get_field_config(campo_numero)
 
@@ -309,64 +317,11 @@ def fit_text_box_universal(
 
     if eff_w <= 0 or eff_h <= 0:
         return {'font_size_used': config['min_font'], 'lines_drawn': 0, 'truncated': True,
-                'effective_area': f"{w:.1f}x{h:.1f}"}
-
-    def wrap_text_for_size(sz):
-        if not config['allow_multiline']:
-            # Para campos de una línea, simplemente truncar
-            single_line = text.replace('\n', ' ').replace('\r', ' ')
-            max_chars = len(single_line)
-            while max_chars > 0:
-                test_text = single_line[:max_chars]
-                if c.stringWidth(test_text, font, sz) <= eff_w:
-                    break
-                max_chars -= 1
-
-            if max_chars < len(single_line) and max_chars > 3:
-                return [single_line[:max_chars-3] + "..."]
-            elif max_chars > 0:
-                return [single_line[:max_chars]]
-            else:
-                return [""]
-
-        # Para campos multilinea
-        lines = []
-        for manual_line in text.split('\n'):
-            if not manual_line.strip():
-                lines.append("")
-                continue
-            words, cur = manual_line.split(), ""
-            for word in words:
-                test = (cur + " " + word) if cur else word
-                if c.stringWidth(test, font, sz) <= eff_w:
-                    cur = test
-                else:
-                    if cur:
-                        lines.append(cur)
-                    cur = word
-            if cur:
-                lines.append(cur)
-        return lines
-
-    # Búsqueda binaria del tamaño óptimo
-    lo, hi = config['min_font'], config['max_font']
-    best_sz, best_lines = config['min_font'], []
-
-    while lo <= hi:
-        mid = (lo + hi) // 2
-        lines = wrap_text_for_size(mid)
-        lh = mid * config['leading_ratio']
-        total_h = lh * len(lines)
-
-        if total_h <= eff_h:
-            best_sz, best_lines = mid, lines
-            lo = mid + 1
-        else:
-            hi = mid - 1
+                'iterations': 0, 'effective_area': f"{w:.1f}x{h:.1f}"}
 
-    if not best_lines:
-        best_sz = config['min_font']
-        best_lines = wrap_text_for_size(best_sz)
+    best_sz, best_lines, iteraciones = ajustar_caja(
+        text, font, eff_w, eff_h, config['min_font'], config['max_font'],
+        config['leading_ratio'], config['allow_multiline'])
 
     # Dibujar el texto
     c.saveState()
@@ -398,6 +353,7 @@ def fit_text_box_universal(
             'font_size_used': best_sz,
             'lines_drawn': len(drawn),
             'truncated': truncated,
+            'iterations': iteraciones,
             'effective_area': f"{eff_w:.1f}x{eff_h:.1f}"
         }
     finally:
@@ -506,13 +462,42 @@ def normalized_date(mic_data):
     return datetime.now().strftime('%d/%m/%Y')
 
 
-def draw_campo39(c, x_px, y_px, w_px, h_px, height_px, mic_data=None):
+def con_fecha_efectiva(mic_data):
     """
-    Campo 39: texto legal, línea de firma, transportador + fecha.
+    mic_data con la fecha que imprime el campo 39 fijada en 'fecha' si no
+    trae ninguna: así forma parte del dict (y de la clave del cache de PDFs)
+    en lugar de salir de datetime.now() al renderizar.
     """
-    styles = get_styles()
+    if any((mic_data or {}).get(k) for k in ('campo_6_fecha', 'fecha_emision', 'fecha')):
+        return mic_data
+    return {**(mic_data or {}), 'fecha': normalized_date(mic_data)}
+
+
+TXT_39_ES = ("Declaramos que las informaciones presentadas en este Documento son expresión de verdad, "
+             "que los datos referentes a las mercaderías fueron transcriptos exactamente conforme a la "
+             "declaración del remitente, las cuales son de su exclusiva responsabilidad, y que esta operación "
+             "obedece a lo dispuesto en el Convenio sobre Transporte Internacional Terrestre de los países del Cono Sur.")
+TXT_39_PT = ("Declaramos que as informações prestadas neste Documento são a expressão de verdade que os dados referentes "
+             "às mercadorias foram transcritos exatamente conforme a declaração do remetente, os quais são de sua exclusiva "
+             "responsabilidade, e que esta operação obedece ao disposto no Convênio sobre Transporte Internacional Terrestre.")
+TXT_39_FIRMA = "39 Firma y sello del porteador / Assinatura e carimbo do transportador"
+
+
+def _frame_campo39(x_px, y_px, w_px, h_px, height_px):
     X, Y, W, H = px2pt(x_px), px2pt(
         height_px - y_px - h_px), px2pt(w_px), px2pt(h_px)
+    f = Frame(X + FIELD_PADDING_PT, Y + FIELD_PADDING_PT,
+              W - 2*FIELD_PADDING_PT, H - 2*FIELD_PADDING_PT, showBoundary=0)
+    return X, Y, W, H, f
+
+
+def draw_campo39_estatico(c, x_px, y_px, w_px, h_px, height_px):
+    """
+    Campo 39, parte fija: caja, texto legal ES/PT y línea de firma.
+    Retorna la posición Y del frame donde continúa el transportador.
+    """
+    styles = get_styles()
+    X, Y, W, H, f = _frame_campo39(x_px, y_px, w_px, h_px, height_px)
 
     c.saveState()
     try:
@@ -520,14 +505,22 @@ def draw_campo39(c, x_px, y_px, w_px, h_px, height_px, mic_data=None):
     finally:
         c.restoreState()
 
-    txt_es = ("Declaramos que las informaciones presentadas en este Documento son expresión de verdad, "
-              "que los datos referentes a las mercaderías fueron transcriptos exactamente conforme a la "
-              "declaración del remitente, las cuales son de su exclusiva responsabilidad, y que esta operación "
-              "obedece a lo dispuesto en el Convenio sobre Transporte Internacional Terrestre de los países del Cono Sur.")
-    txt_pt = ("Declaramos que as informações prestadas neste Documento são a expressão de verdade que os dados referentes "
-              "às mercadorias foram transcritos exatamente conforme a declaração do remetente, os quais são de sua exclusiva "
-              "responsabilidade, e que esta operação obedece ao disposto no Convênio sobre Transporte Internacional Terrestre.")
-    txt_firma = "39 Firma y sello del porteador / Assinatura e carimbo do transportador"
+    c.saveState()
+    try:
+        f.addFromList([Paragraph(TXT_39_ES, styles['es']),
+                       Paragraph(TXT_39_PT, styles['es']),
+                       Paragraph(TXT_39_FIRMA, styles['firma'])], c)
+    finally:
+        c.restoreState()
+    return f._y
+
+
+def draw_campo39_datos(c, x_px, y_px, w_px, h_px, height_px, mic_data, frame_y):
+    """
+    Campo 39, parte variable: transportador (continúa el frame en frame_y) + fecha.
+    """
+    styles = get_styles()
+    X, Y, W, H, f = _frame_campo39(x_px, y_px, w_px, h_px, height_px)
 
     nombre_transportador = ""
     if mic_data:
@@ -541,17 +534,12 @@ def draw_campo39(c, x_px, y_px, w_px, h_px, height_px, mic_data=None):
             nombre_transportador = nombre_transportador.split('\n')[0].strip()
     fecha_actual = normalized_date(mic_data)
 
-    para_es = Paragraph(txt_es, styles['es'])
-    para_pt = Paragraph(txt_pt, styles['es'])
-    para_firma = Paragraph(txt_firma, styles['firma'])
-    para_transportador = Paragraph(
-        nombre_transportador, styles['transportador'])
-
     c.saveState()
     try:
-        f = Frame(X + FIELD_PADDING_PT, Y + FIELD_PADDING_PT,
-                  W - 2*FIELD_PADDING_PT, H - 2*FIELD_PADDING_PT, showBoundary=0)
-        f.addFromList([para_es, para_pt, para_firma, para_transportador], c)
+        # Retomar el frame donde lo dejó la parte estática
+        f._y = frame_y
+        f._atTop = 0
+        f.add(Paragraph(nombre_transportador, styles['transportador']), c)
     finally:
         c.restoreState()
 
@@ -564,6 +552,14 @@ def draw_campo39(c, x_px, y_px, w_px, h_px, height_px, mic_data=None):
         c.restoreState()
 
 
+def draw_campo39(c, x_px, y_px, w_px, h_px, height_px, mic_data=None):
+    """
+    Campo 39: texto legal, línea de firma, transportador + fecha.
+    """
+    frame_y = draw_campo39_estatico(c, x_px, y_px, w_px, h_px, height_px)
+    draw_campo39_datos(c, x_px, y_px, w_px, h_px, height_px, mic_data, frame_y)
+
+
 def draw_campo40_robust(c, x_pt, y_pt, w_pt, h_pt, valor):
     """
     Campo 40 usando fit_text_box_universal.
@@ -651,149 +647,209 @@ def validar_entidades_33_34_35(mic_data: dict, autofix=False):
 # =============================
 
 
-def generar_micdta_pdf_con_datos(mic_data: dict, filename: str = "mic.pdf"):
-    """
-    Entry point para generar el PDF del MIC/DTA.
-    Ahora TODOS los campos usan fit_text_box_universal.
-    """
-    register_unicode_fonts()
+# =============================
+#     LAYOUT MIC/DTA (px)
+# =============================
 
-    width_px, height_px = 1700, 2800
-    width_pt, height_pt = px2pt(width_px), px2pt(height_px)
+MIC_WIDTH_PX, MIC_HEIGHT_PX = 1700, 2800
+
+# Encabezado: banda, recuadro "MIC/DTA" y títulos
+MIC_HEADER = {
+    "x": 55, "y": 55, "w": 1616, "h": 108.5,
+    "mic_dx": 24, "mic_dy": 15, "mic_w": 235, "mic_h": 70,
+    "title_dx": 280, "title_dy": 36,
+    "titulo_es": "Manifiesto Internacional de Carga por Carretera / Declaración de Tránsito Aduanero",
+    "titulo_pt": "Manifesto Internacional de Carga Rodoviária / Declaração de Trânsito",
+}
+
+MIC_BORDE = (55, 55, 1616.75, 2672.75)
+
+# (n, x, y, w, h, título, subtítulo, clave en mic_data)
+CAMPOS_MIC = [
+    (1,  55, 162, 863, 450, "1 Nombre y domicilio del porteador",
+     "Nome e endereço do transportador", "campo_1_transporte"),
+    (2,  55, 610, 861, 142, "2 Rol de contribuyente",
+     "Cadastro geral de contribuintes", "campo_2_numero"),
+    (3, 916, 162, 389, 169, "3 Tránsito aduanero",
+     "Trânsito aduaneiro", "campo_3_transporte"),
+    (4, 1305, 162, 365, 167, "4 Nº", "", "campo_4_estado"),
+    (5, 916, 330, 388, 115, "5 Hoja / Folha", "", "campo_5_hoja"),
+    (6, 1305, 330, 365, 115, "6 Fecha de emisión",
+     "Data de emissão", "campo_6_fecha"),
+    (7, 916, 445, 752, 166, "7 Aduana, ciudad y país de partida",
+     "Alfândega, cidade e país de partida", "campo_7_pto_seguro"),
+    (8, 916, 610, 752, 142, "8 Ciudad y país de destino final",
+     "Cidade e país de destino final", "campo_8_destino"),
+    (9,  55, 750, 861, 165, "9 CAMION ORIGINAL: Nombre y domicilio del propietario",
+     "CAMINHÃO ORIGINAL: Nome e endereço do proprietário", "campo_9_datos_transporte"),
+    (10, 55, 915, 417, 142, "10 Rol de contribuyente",
+     "Cadastro geral de", "campo_10_numero"),
+    (11, 470, 915, 445, 142, "11 Placa de camión",
+     "Placa do caminhão", "campo_11_placa"),
+    (12, 55, 1055, 417, 142, "12 Marca y número",
+     "Marca e número", "campo_12_modelo_chasis"),
+    (13, 470, 1055, 445, 142, "13 Capacidad de arrastre",
+     "Capacidade de tração (t)", "campo_13_siempre_45"),
+    (14, 55, 1197, 417, 135, "14 AÑO", "ANO", "campo_14_anio"),
+    (15, 470, 1197, 445, 135, "15 Semirremolque / Remolque",
+     "Semi-reboque / Reboque", "campo_15_placa_semi"),
+    (16, 915, 752, 753, 163, "16 CAMION SUSTITUTO: Nombre y domicilio del",
+     "CAMINHÃO SUBSTITUTO: Nome e endereço do", "campo_16"),
+    (17, 915, 915, 395, 140, "17 Rol de contribuyente",
+     "Cadastro geral de", "campo_17"),
+    (18, 1310, 915, 360, 140, "18 Placa del camión", "Placa do", "campo_18"),
+    (19, 915, 1055, 395, 140, "19 Marca y número", "Marca e número", "campo_19"),
+    (20, 1310, 1055, 360, 140, "20 Capacidad de arrastre",
+     "Capacidade de tração", "campo_20"),
+    (21, 915, 1195, 395, 135, "21 AÑO", "ANO", "campo_21"),
+    (22, 1310, 1195, 360, 135, "22 Semirremolque / Remolque",
+     "Semi-reboque / Reboque", "campo_22"),
+    (23, 55, 1330, 313, 154, "23 Nº carta de porte",
+     "Nº do conhecimento", "campo_23_numero_campo2_crt"),
+    (24, 366, 1330, 550, 154, "24 Aduana de destino",
+     "Alfândega de destino", "campo_24_aduana"),
+    (25, 55, 1482, 313, 136, "25 Moneda", "Moeda", "campo_25_moneda"),
+    (26, 366, 1482, 550, 136, "26 Origen de las mercaderías",
+     "Origem das mercadorias", "campo_26_pais"),
+    (27, 55, 1618, 313, 136, "27 Valor FOT",
+     "Valor FOT", "campo_27_valor_campo16"),
+    (28, 366, 1618, 275, 136, "28 Flete en U$S",
+     "Flete em U$S", "campo_28_total"),
+    (29, 641, 1618, 275, 136, "29 Seguro en U$S",
+     "Seguro em U$S", "campo_29_seguro"),
+    (30, 55, 1754, 313, 119, "30 Tipo de Bultos",
+     "Tipo dos volumes", "campo_30_tipo_bultos"),
+    (31, 366, 1754, 275, 119, "31 Cantidad de",
+     "Quantidade de", "campo_31_cantidad"),
+    (32, 641, 1754, 275, 119, "32 Peso bruto",
+     "Peso bruto", "campo_32_peso_bruto"),
+    (33, 915, 1330, 753, 154, "33 Remitente",
+     "Remetente", "campo_33_datos_campo1_crt"),
+    (34, 915, 1482, 753, 136, "34 Destinatario",
+     "Destinatario", "campo_34_datos_campo4_crt"),
+    (35, 915, 1618, 753, 136, "35 Consignatario",
+     "Consignatário", "campo_35_datos_campo6_crt"),
+    (36, 915, 1754, 753, 250, "36 Documentos anexos",
+     "Documentos anexos", "campo_36_factura_despacho"),
+    (37, 55, 1873, 861, 131, "37 Número de precintos",
+     "Número dos lacres", "campo_37_valor_manual"),
+    (38, 55, 2004, 1613, 222, "38 Marcas y números de los bultos, descripción de las mercaderías",
+     "Marcas e números dos volumes, descrição das mercadorias", "campo_38_datos_campo11_crt"),
+    (39, 55, 2226, 838, 498, "", "", None),
+    (40, 891, 2226, 780, 326, "40 Nº DTA, ruta y plazo de transporte",
+     "Nº DTA, rota e prazo de transporte", "campo_40_tramo"),
+    (41, 891, 2552, 780, 175, "41 Firma y sello de la Aduana de Partida",
+     "Assinatura e carimbo de Alfândega de", None),
+]
 
-    c = canvas.Canvas(filename, pagesize=(width_pt, height_pt))
-    c.setStrokeColorRGB(0, 0, 0)
-    c.setFillColorRGB(0, 0, 0)
+
+def dibujar_capa_estatica_mic(c):
+    """
+    Parte fija del MIC/DTA: encabezado, las 41 cajas con sus títulos,
+    texto legal del campo 39 y borde exterior.
+    Retorna las áreas de contenido por campo y la Y del frame del campo 39.
+    """
+    height_px = MIC_HEIGHT_PX
+    hd = MIC_HEADER
 
     # Encabezado
-    x0, y0 = 55, 55
-    rect_w, rect_h = 1616, 108.5
-    rect_pt(c, x0, y0, rect_w, rect_h, height_px, line_width=2)
+    x0, y0 = hd["x"], hd["y"]
+    rect_pt(c, x0, y0, hd["w"], hd["h"], height_px, line_width=2)
 
-    mic_x, mic_y = x0 + 24, y0 + 15
-    mic_w, mic_h = 235, 70
-    mx, my, mw, mh = rect_pt(c, mic_x, mic_y, mic_w,
-                             mic_h, height_px, line_width=1)
+    mx, my, mw, mh = rect_pt(c, x0 + hd["mic_dx"], y0 + hd["mic_dy"],
+                             hd["mic_w"], hd["mic_h"], height_px, line_width=1)
 
     c.saveState()
     try:
         c.setFont(FONT_BOLD, 28)
         c.drawCentredString(mx + mw / 2, my + mh / 2 - 12, "MIC/DTA")
-        title_x, title_y = x0 + 280, y0 + 36
+        title_x, title_y = x0 + hd["title_dx"], y0 + hd["title_dy"]
         c.setFont(FONT_BOLD, 20)
-        c.drawString(px2pt(title_x), px2pt(height_px - title_y),
-                     "Manifiesto Internacional de Carga por Carretera / Declaración de Tránsito Aduanero")
+        c.drawString(px2pt(title_x), px2pt(height_px - title_y), hd["titulo_es"])
         c.setFont(FONT_REGULAR, 20)
-        c.drawString(px2pt(title_x), px2pt(height_px - title_y - 38),
-                     "Manifesto Internacional de Carga Rodoviária / Declaração de Trânsito")
+        c.drawString(px2pt(title_x), px2pt(height_px - title_y - 38), hd["titulo_pt"])
     finally:
         c.restoreState()
 
-    campos = [
-        (1,  55, 162, 863, 450, "1 Nombre y domicilio del porteador",
-         "Nome e endereço do transportador", "campo_1_transporte"),
-        (2,  55, 610, 861, 142, "2 Rol de contribuyente",
-         "Cadastro geral de contribuintes", "campo_2_numero"),
-        (3, 916, 162, 389, 169, "3 Tránsito aduanero",
-         "Trânsito aduaneiro", "campo_3_transporte"),
-        (4, 1305, 162, 365, 167, "4 Nº", "", "campo_4_estado"),
-        (5, 916, 330, 388, 115, "5 Hoja / Folha", "", "campo_5_hoja"),
-        (6, 1305, 330, 365, 115, "6 Fecha de emisión",
-         "Data de emissão", "campo_6_fecha"),
-        (7, 916, 445, 752, 166, "7 Aduana, ciudad y país de partida",
-         "Alfândega, cidade e país de partida", "campo_7_pto_seguro"),
-        (8, 916, 610, 752, 142, "8 Ciudad y país de destino final",
-         "Cidade e país de destino final", "campo_8_destino"),
-        (9,  55, 750, 861, 165, "9 CAMION ORIGINAL: Nombre y domicilio del propietario",
-         "CAMINHÃO ORIGINAL: Nome e endereço do proprietário", "campo_9_datos_transporte"),
-        (10, 55, 915, 417, 142, "10 Rol de contribuyente",
-         "Cadastro geral de", "campo_10_numero"),
-        (11, 470, 915, 445, 142, "11 Placa de camión",
-         "Placa do caminhão", "campo_11_placa"),
-        (12, 55, 1055, 417, 142, "12 Marca y número",
-         "Marca e número", "campo_12_modelo_chasis"),
-        (13, 470, 1055, 445, 142, "13 Capacidad de arrastre",
-         "Capacidade de tração (t)", "campo_13_siempre_45"),
-        (14, 55, 1197, 417, 135, "14 AÑO", "ANO", "campo_14_anio"),
-        (15, 470, 1197, 445, 135, "15 Semirremolque / Remolque",
-         "Semi-reboque / Reboque", "campo_15_placa_semi"),
-        (16, 915, 752, 753, 163, "16 CAMION SUSTITUTO: Nombre y domicilio del",
-         "CAMINHÃO SUBSTITUTO: Nome e endereço do", "campo_16"),
-        (17, 915, 915, 395, 140, "17 Rol de contribuyente",
-         "Cadastro geral de", "campo_17"),
-        (18, 1310, 915, 360, 140, "18 Placa del camión", "Placa do", "campo_18"),
-        (19, 915, 1055, 395, 140, "19 Marca y número", "Marca e número", "campo_19"),
-        (20, 1310, 1055, 360, 140, "20 Capacidad de arrastre",
-         "Capacidade de tração", "campo_20"),
-        (21, 915, 1195, 395, 135, "21 AÑO", "ANO", "campo_21"),
-        (22, 1310, 1195, 360, 135, "22 Semirremolque / Remolque",
-         "Semi-reboque / Reboque", "campo_22"),
-        (23, 55, 1330, 313, 154, "23 Nº carta de porte",
-         "Nº do conhecimento", "campo_23_numero_campo2_crt"),
-        (24, 366, 1330, 550, 154, "24 Aduana de destino",
-         "Alfândega de destino", "campo_24_aduana"),
-        (25, 55, 1482, 313, 136, "25 Moneda", "Moeda", "campo_25_moneda"),
-        (26, 366, 1482, 550, 136, "26 Origen de las mercaderías",
-         "Origem das mercadorias", "campo_26_pais"),
-        (27, 55, 1618, 313, 136, "27 Valor FOT",
-         "Valor FOT", "campo_27_valor_campo16"),
-        (28, 366, 1618, 275, 136, "28 Flete en U$S",
-         "Flete em U$S", "campo_28_total"),
-        (29, 641, 1618, 275, 136, "29 Seguro en U$S",
-         "Seguro em U$S", "campo_29_seguro"),
-        (30, 55, 1754, 313, 119, "30 Tipo de Bultos",
-         "Tipo dos volumes", "campo_30_tipo_bultos"),
-        (31, 366, 1754, 275, 119, "31 Cantidad de",
-         "Quantidade de", "campo_31_cantidad"),
-        (32, 641, 1754, 275, 119, "32 Peso bruto",
-         "Peso bruto", "campo_32_peso_bruto"),
-        (33, 915, 1330, 753, 154, "33 Remitente",
-         "Remetente", "campo_33_datos_campo1_crt"),
-        (34, 915, 1482, 753, 136, "34 Destinatario",
-         "Destinatario", "campo_34_datos_campo4_crt"),
-        (35, 915, 1618, 753, 136, "35 Consignatario",
-         "Consignatário", "campo_35_datos_campo6_crt"),
-        (36, 915, 1754, 753, 250, "36 Documentos anexos",
-         "Documentos anexos", "campo_36_factura_despacho"),
-        (37, 55, 1873, 861, 131, "37 Número de precintos",
-         "Número dos lacres", "campo_37_valor_manual"),
-        (38, 55, 2004, 1613, 222, "38 Marcas y números de los bultos, descripción de las mercaderías",
-         "Marcas e números dos volumes, descrição das mercadorias", "campo_38_datos_campo11_crt"),
-        (39, 55, 2226, 838, 498, "", "", None),
-        (40, 891, 2226, 780, 326, "40 Nº DTA, ruta y plazo de transporte",
-         "Nº DTA, rota e prazo de transporte", "campo_40_tramo"),
-        (41, 891, 2552, 780, 175, "41 Firma y sello de la Aduana de Partida",
-         "Assinatura e carimbo de Alfândega de", None),
-    ]
-
-    for n, x, y, w, h, titulo, subtitulo, key in campos:
+    areas = {}
+    campo39_y = None
+    for n, x, y, w, h, titulo, subtitulo, key in CAMPOS_MIC:
         if n == 39:
-            draw_campo39(c, x, y, w, h, height_px, mic_data)
+            campo39_y = draw_campo39_estatico(c, x, y, w, h, height_px)
             continue
 
         x_pt, y_pt, w_pt, h_pt = rect_pt(
             c, x, y, w, h, height_px, line_width=1)
         # CAMBIO: usar el área de contenido devuelta para empezar más abajo
-        cx, cy, cw, ch = draw_field_title(
+        areas[n] = draw_field_title(
             c, x_pt, y_pt, w_pt, h_pt, titulo, subtitulo)
 
+    # Borde exterior
+    rect_pt(c, *MIC_BORDE, height_px, line_width=1)
+    return {"areas": areas, "campo39_y": campo39_y}
+
+
+def obtener_plantilla_mic():
+    """
+    Capa estática del MIC precompilada (una vez por proceso).
+    Se recompila sola si cambia la tabla de layout o las fuentes.
+    """
+    register_unicode_fonts()
+    huella = huella_layout(CAMPOS_MIC, MIC_HEADER, MIC_BORDE,
+                           TXT_39_ES, TXT_39_PT, TXT_39_FIRMA,
+                           FONT_REGULAR, FONT_BOLD, MIC_WIDTH_PX, MIC_HEIGHT_PX)
+    pagesize = (px2pt(MIC_WIDTH_PX), px2pt(MIC_HEIGHT_PX))
+    return obtener_plantilla("mic", dibujar_capa_estatica_mic, pagesize, huella)
+
+
+def generar_micdta_pdf_con_datos(mic_data: dict, filename=None, campos=None):
+    """
+    Entry point para generar el PDF del MIC/DTA.
+    La capa estática se estampa desde la plantilla precompilada; acá solo
+    se dibujan los valores. TODOS los campos usan fit_text_box_universal.
+    Sin filename se renderiza en memoria y devuelve los bytes del PDF.
+    Si se pasa la lista `campos`, se le agrega el ajuste de cada campo
+    (número, iteraciones, truncado) para las métricas.
+    """
+    plantilla = obtener_plantilla_mic()
+    height_px = MIC_HEIGHT_PX
+
+    output = filename or BytesIO()
+    c = canvas.Canvas(output, pagesize=plantilla.pagesize)
+    c.setStrokeColorRGB(0, 0, 0)
+    c.setFillColorRGB(0, 0, 0)
+
+    plantilla.estampar(c)
+    areas = plantilla.datos["areas"]
+
+    for n, x, y, w, h, titulo, subtitulo, key in CAMPOS_MIC:
+        if n == 39:
+            draw_campo39_datos(c, x, y, w, h, height_px, mic_data,
+                               plantilla.datos["campo39_y"])
+            continue
+
         valor = obtener_valor_campo(mic_data, key, n) if key else ""
 
         if n in [33, 34, 35] and valor:
             valor = formatear_campo_entidad(mic_data, key)
 
         # APLICAR fit_text_box_universal a TODOS los campos con valor
-        if valor and n != 39:  # El 39 tiene manejo especial
+        if valor:
+            cx, cy, cw, ch = areas[n]
             log(f"📝 Campo {n}: Aplicando fit_text_box_universal")
             result = fit_text_box_universal(
                 c, valor, cx, cy, cw, ch, n, FONT_REGULAR)
+            if campos is not None:
+                campos.append({'campo': n, 'iterations': result['iterations'],
+                               'truncated': result['truncated']})
             if DEBUG:
                 log(f"   → Fuente: {result['font_size_used']}pt, Líneas: {result['lines_drawn']}, "
                     f"Truncado: {result['truncated']}, Área: {result['effective_area']}")
 
-    # Borde exterior
-    rect_pt(c, 55, 55, 1616.75, 2672.75, height_px, line_width=1)
     c.save()
+    if filename is None:
+        log(f"✅ PDF generado en memoria ({output.tell()} bytes)")
+        return output.getvalue()
     log(f"✅ PDF generado: {filename}")
 
 
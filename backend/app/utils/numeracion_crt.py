@@ -0,0 +1,168 @@
+# ========== backend/app/utils/numeracion_crt.py ==========
+"""
+Numeración PY######### de CRTs por transportadora.
+
+Antes cada carga del formulario buscaba el mayor número de la
+transportadora y sumaba 1 en Python: dos usuarios obtenían el mismo número
+y el segundo crear_crt fallaba por la restricción unique.
+
+Ahora cada transportadora tiene una fila en crt_secuencias con el último
+número asignado:
+
+- siguiente_numero(): lectura de la fila (sugerencia para el formulario,
+  no reserva nada).
+- reservar_numeros(): UPDATE ... SET ultimo_numero = ultimo_numero + n
+  RETURNING, atómico (lock de fila en PostgreSQL, de escritura en SQLite).
+  Si la transacción del llamador hace rollback, los números vuelven.
+- avanzar_secuencia(): números cargados a mano por encima de la secuencia
+  la empujan hacia adelante.
+- insertar_con_numero_libre(): INSERT del CRT en un savepoint; si otra
+  sesión guardó el mismo número entre la sugerencia y el INSERT (unique de
+  numero_crt) reserva el siguiente y reintenta.
+
+La fila se crea la primera vez a partir del mayor número existente (la
+única búsqueda sobre crts, por el índice transportadora_id + numero_crt).
+"""
+from datetime import datetime
+
+from sqlalchemy import update, func
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import CRT, CRT_Secuencia
+
+PREFIJO = "PY"
+DIGITOS = 9
+MAX_RESERVA = 100
+INTENTOS_INSERT = 10
+
+
+def formatear_numero(n):
+    return f"{PREFIJO}{n:0{DIGITOS}d}"
+
+
+def parsear_numero(numero_crt):
+    """Parte numérica de un PY#########, o None si no tiene ese formato."""
+    if (numero_crt and len(numero_crt) == len(PREFIJO) + DIGITOS
+            and numero_crt.startswith(PREFIJO) and numero_crt[len(PREFIJO):].isdigit()):
+        return int(numero_crt[len(PREFIJO):])
+    return None
+
+
+def _ultimo_existente(transportadora_id):
+    ultimo = (
+        db.session.query(CRT.numero_crt)
+        .filter(
+            CRT.transportadora_id == transportadora_id,
+            CRT.numero_crt.startswith(PREFIJO),
+            func.length(CRT.numero_crt) == len(PREFIJO) + DIGITOS
+        )
+        .order_by(CRT.numero_crt.desc())
+        .first()
+    )
+    return parsear_numero(ultimo.numero_crt) if ultimo else None
+
+
+def _asegurar_secuencia(transportadora_id, base=None):
+    """Crea la fila de la transportadora si falta (idempotente entre procesos)."""
+    if db.session.get(CRT_Secuencia, transportadora_id) is not None:
+        return
+
+    ultimo = _ultimo_existente(transportadora_id)
+    if ultimo is None:
+        # Sin CRTs: el primero es el código base de la transportadora
+        ultimo = (base or 1) - 1
+    valores = {"transportadora_id": transportadora_id, "ultimo_numero": ultimo,
+               "actualizado_en": datetime.utcnow()}
+
+    dialecto = db.session.get_bind().dialect.name
+    if dialecto in ("postgresql", "sqlite"):
+        if dialecto == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        db.session.execute(insert(CRT_Secuencia).values(**valores)
+                           .on_conflict_do_nothing(index_elements=["transportadora_id"]))
+        return
+
+    try:
+        with db.session.begin_nested():
+            db.session.execute(CRT_Secuencia.__table__.insert().values(**valores))
+    except IntegrityError:
+        pass  # Otro proceso la creó primero
+
+
+def siguiente_numero(transportadora_id, base=None):
+    """Número sugerido para el próximo CRT (sin reservarlo)."""
+    _asegurar_secuencia(transportadora_id, base)
+    ultimo = db.session.query(CRT_Secuencia.ultimo_numero).filter_by(
+        transportadora_id=transportadora_id).scalar()
+    return formatear_numero(ultimo + 1)
+
+
+def reservar_numeros(transportadora_id, cantidad=1, base=None):
+    """
+    Reserva `cantidad` números consecutivos de forma atómica.
+    Devuelve la lista de PY#########; el llamador hace commit.
+    """
+    if not 1 <= cantidad <= MAX_RESERVA:
+        raise ValueError(f"cantidad debe estar entre 1 y {MAX_RESERVA}")
+    _asegurar_secuencia(transportadora_id, base)
+    ultimo = db.session.execute(
+        update(CRT_Secuencia)
+        .where(CRT_Secuencia.transportadora_id == transportadora_id)
+        .values(ultimo_numero=CRT_Secuencia.ultimo_numero + cantidad,
+                actualizado_en=datetime.utcnow())
+        .returning(CRT_Secuencia.ultimo_numero)
+    ).scalar_one()
+    return [formatear_numero(n) for n in range(ultimo - cantidad + 1, ultimo + 1)]
+
+
+def reservar_numero(transportadora_id, base=None):
+    return reservar_numeros(transportadora_id, 1, base)[0]
+
+
+def avanzar_secuencia(transportadora_id, numero_crt):
+    """Si `numero_crt` quedó por encima de la secuencia, la adelanta hasta él."""
+    n = parsear_numero(numero_crt)
+    if n is None or not transportadora_id:
+        return
+    _asegurar_secuencia(transportadora_id, n)
+    db.session.execute(
+        update(CRT_Secuencia)
+        .where(CRT_Secuencia.transportadora_id == transportadora_id,
+               CRT_Secuencia.ultimo_numero < n)
+        .values(ultimo_numero=n, actualizado_en=datetime.utcnow())
+    )
+
+
+class NumeroCRTDuplicadoError(Exception):
+    """El número de CRT ya existe y no se puede reasignar (no es PY#########)."""
+
+
+def insertar_con_numero_libre(crt):
+    """
+    Agrega y hace flush de `crt` dentro de un savepoint. Si su numero_crt ya
+    existe se reserva el siguiente de la secuencia de su transportadora y se
+    reintenta. Devuelve True si el número se reasignó; NumeroCRTDuplicadoError
+    si el número no tiene formato PY#########.
+    """
+    reasignado = False
+    for _ in range(INTENTOS_INSERT):
+        try:
+            with db.session.begin_nested():
+                db.session.add(crt)
+                db.session.flush()
+            return reasignado
+        except IntegrityError:
+            # Solo se reintenta si el choque es por el número (no otra restricción)
+            if not db.session.query(CRT.id).filter_by(numero_crt=crt.numero_crt).first():
+                raise
+            n = parsear_numero(crt.numero_crt)
+            if n is None or not crt.transportadora_id:
+                raise NumeroCRTDuplicadoError(f"El número de CRT {crt.numero_crt} ya existe")
+            # n + 1 como base: si la transportadora aún no tiene secuencia (el
+            # número ocupado es de otra) arranca después del ocupado y no en 1
+            crt.numero_crt = reservar_numero(crt.transportadora_id, n + 1)
+            reasignado = True
+    raise NumeroCRTDuplicadoError("No se pudo asignar un número de CRT libre, intente nuevamente")
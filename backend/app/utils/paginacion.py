@@ -0,0 +1,94 @@
+# ========== backend/app/utils/paginacion.py ==========
+"""
+Paginación por cursor (keyset) para los listados ordenados por id DESC.
+
+En lugar de OFFSET + COUNT(*) en cada página, se filtra `id < último id visto`
+y se pide una fila de más para saber si hay siguiente página: la página 500
+cuesta lo mismo que la 1. El total es opcional (?con_total=1) y sale de un
+conteo cacheado por filtros.
+
+Uso en las rutas: si el request trae `cursor` (aunque sea vacío, para la
+primera página) se usa este modo; si no, se mantiene page/per_page.
+"""
+import base64
+import hashlib
+import json
+
+from app import cache
+from app.utils.cache_tablas import version_tablas
+
+TOTAL_TIMEOUT = 60      # segundos que se reutiliza un total calculado
+MAX_POR_PAGINA = 500
+
+
+def usa_cursor(args):
+    """True si el request pide paginación por cursor."""
+    return 'cursor' in args
+
+
+def por_pagina(args, defecto=20):
+    """per_page del request, acotado a [1, MAX_POR_PAGINA]."""
+    return max(1, min(args.get('per_page', defecto, type=int) or defecto, MAX_POR_PAGINA))
+
+
+def codificar_cursor(ultimo_id):
+    """Cursor opaco a partir del último id entregado."""
+    crudo = json.dumps({"id": int(ultimo_id)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Id del cursor. ValueError si el cursor es inválido."""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return int(datos["id"])
+    except Exception:
+        raise ValueError("Cursor inválido")
+
+
+def paginar_por_cursor(query, columna_id, args, per_page):
+    """
+    Aplica el keyset a `query` (orden columna_id DESC).
+    Retorna (filas, next_cursor); next_cursor es None en la última página.
+    """
+    cursor = args.get('cursor') or ''
+    if cursor:
+        query = query.filter(columna_id < decodificar_cursor(cursor))
+
+    filas = (query.order_by(None).order_by(columna_id.desc())
+             .limit(per_page + 1).all())
+    hay_mas = len(filas) > per_page
+    filas = filas[:per_page]
+    next_cursor = codificar_cursor(filas[-1].id) if hay_mas and filas else None
+    return filas, next_cursor
+
+
+def total_cacheado(query, nombre, args):
+    """
+    Total de filas del listado sólo si se pide (?con_total=1).
+    Se cachea por (listado, SQL, parámetros) durante TOTAL_TIMEOUT segundos,
+    o hasta el próximo cambio en la tabla `nombre`.
+    """
+    if args.get('con_total') not in ('1', 'true', 'True'):
+        return None
+
+    compilado = query.order_by(None).statement.compile()
+    huella = hashlib.sha1(
+        f"{compilado}|{sorted(compilado.params.items(), key=str)}".encode()).hexdigest()
+    clave = f"total:{nombre}:{version_tablas([nombre])[0]}:{huella}"
+    total = cache.get(clave)
+    if total is None:
+        total = query.order_by(None).count()
+        cache.set(clave, total, timeout=TOTAL_TIMEOUT)
+    return total
+
+
+def respuesta_cursor(next_cursor, total, per_page):
+    """Bloque 'pagination' común para el modo cursor."""
+    return {
+        "per_page": per_page,
+        "next_cursor": next_cursor,
+        "has_next": next_cursor is not None,
+        "total": total,
+    }
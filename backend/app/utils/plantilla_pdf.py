@@ -0,0 +1,136 @@
+# ========== backend/app/utils/plantilla_pdf.py ==========
+"""
+Plantillas PDF precompiladas.
+
+La parte estática de un formulario (cajas, líneas, títulos y textos legales)
+se dibuja UNA sola vez por proceso en un canvas descartable. Se guardan los
+operadores PDF generados y luego se re-estampan en cada documento nuevo, sin
+volver a recorrer el layout ni medir textos.
+
+Las fuentes se remapean al documento destino:
+- Fuentes estándar (Helvetica...): nombre interno /F<n> del documento.
+- Fuentes TTF (DejaVuSans...): se replica el estado de subsets del documento
+  plantilla, así los glifos ya codificados siguen siendo válidos.
+"""
+import copy
+import hashlib
+import json
+import re
+import threading
+from io import BytesIO
+
+from reportlab.pdfgen import canvas
+from reportlab.pdfbase import pdfmetrics
+
+# Operando de fuente en "/F1 7 Tf" o "/F3+0 9 Tf"
+_RE_FUENTE = re.compile(r'/(F\d+)(\+\d+)?(?= -?[\d.]+ Tf)')
+
+# Operadores que usan recursos a nivel documento que no se replican
+_RE_RECURSOS = re.compile(r'(?:^|\s)(?:Do|gs|sh)$')
+
+_PLANTILLAS = {}
+_LOCK = threading.Lock()
+
+
+def huella_layout(*partes):
+    """Huella estable de una tabla de layout (cambia si cambia el layout)."""
+    crudo = json.dumps(partes, sort_keys=True, default=repr)
+    return hashlib.sha1(crudo.encode('utf-8')).hexdigest()
+
+
+class PlantillaPDF:
+    """Capa estática de una página, capturada como operadores PDF."""
+
+    def __init__(self, dibujar, pagesize):
+        self.dibujar = dibujar
+        self.pagesize = pagesize
+
+        c = canvas.Canvas(BytesIO(), pagesize=pagesize)
+        inicio = len(c._code)
+        # Lo que devuelva `dibujar` (posiciones calculadas, etc.) queda en .datos
+        self.datos = dibujar(c)
+        self.codigo = list(c._code[inicio:])
+        self.reutilizable = not any(_RE_RECURSOS.search(op) for op in self.codigo)
+
+        # Fuentes usadas: nombre interno en la plantilla -> (fuente, estado TTF)
+        self.fuentes = []
+        doc = c._doc
+        for nombre, interno in doc.fontMapping.items():
+            fuente = pdfmetrics.getFont(nombre)
+            estado = getattr(fuente, 'state', None)
+            if estado is not None:
+                estado = copy.deepcopy(estado.get(doc))
+                if estado is None:
+                    continue
+            self.fuentes.append((interno.lstrip('/'), nombre, estado))
+        self.fuentes.sort(key=lambda f: int(f[0][1:]))
+        self._remapeos = {}
+
+    def _preparar_fuentes(self, doc):
+        """Registra las fuentes en el documento destino. None si hay conflicto."""
+        for _, nombre, estado in self.fuentes:
+            fuente = pdfmetrics.getFont(nombre)
+            if estado is not None and doc in fuente.state:
+                # El documento ya codificó glifos con esta fuente
+                return None
+
+        mapa = {}
+        for interno, nombre, estado in self.fuentes:
+            fuente = pdfmetrics.getFont(nombre)
+            if estado is None:
+                nuevo = doc.getInternalFontName(nombre)
+            else:
+                st = copy.deepcopy(estado)
+                st.internalName = None
+                fuente.state[doc] = st
+                nuevo = fuente.getSubsetInternalName(0, doc).split('+')[0]
+            mapa[interno] = nuevo.lstrip('/')
+        return mapa
+
+    def estampar(self, c):
+        """Estampa la plantilla en el canvas. Si no es posible, dibuja en vivo."""
+        mapa = self._preparar_fuentes(c._doc) if self.reutilizable else None
+        if mapa is None:
+            self.dibujar(c)
+            return False
+
+        clave = tuple(sorted(mapa.items()))
+        codigo = self._remapeos.get(clave)
+        if codigo is None:
+            if all(k == v for k, v in mapa.items()):
+                codigo = self.codigo
+            else:
+                def remapear(m):
+                    return '/' + mapa.get(m.group(1), m.group(1)) + (m.group(2) or '')
+                codigo = [_RE_FUENTE.sub(remapear, op) for op in self.codigo]
+            self._remapeos[clave] = codigo
+
+        c._code.append('q')
+        c._code.extend(codigo)
+        c._code.append('Q')
+        return True
+
+
+def obtener_plantilla(nombre, dibujar, pagesize, huella):
+    """Devuelve la plantilla cacheada para (nombre, huella), creándola si falta."""
+    clave = (nombre, huella)
+    plantilla = _PLANTILLAS.get(clave)
+    if plantilla is None:
+        with _LOCK:
+            plantilla = _PLANTILLAS.get(clave)
+            if plantilla is None:
+                plantilla = PlantillaPDF(dibujar, pagesize)
+                plantilla.huella = huella
+                # Una sola versión viva por plantilla
+                for k in [k for k in _PLANTILLAS if k[0] == nombre]:
+                    del _PLANTILLAS[k]
+                _PLANTILLAS[clave] = plantilla
+                print(f"🧩 Plantilla PDF '{nombre}' precompilada "
+                      f"({len(plantilla.codigo)} operadores)")
+    return plantilla
+
+
+def limpiar_plantillas():
+    """Descarta todas las plantillas (se recompilan en el próximo uso)."""
+    with _LOCK:
+        _PLANTILLAS.clear()
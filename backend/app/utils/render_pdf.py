@@ -0,0 +1,261 @@
+# ========== backend/app/utils/render_pdf.py ==========
+"""
+Servicio de renderizado de PDFs (CRT y MIC/DTA) en un pool de procesos.
+
+ReportLab es CPU puro: renderizar en el hilo del request bloquea el GIL y
+frena al resto de la API. Los documentos viajan como dicts planos a un
+ProcessPoolExecutor de workers "calientes" (fuentes registradas y plantillas
+estáticas ya compiladas en el initializer).
+
+Configuración (config.py / variables de entorno):
+- PDF_RENDER_WORKERS: procesos del pool (0 = renderizar en el proceso actual)
+- PDF_RENDER_MAX_PENDIENTES: renders en vuelo antes de rechazar (backpressure)
+- PDF_RENDER_ESPERA: segundos que un request espera un lugar libre
+- PDF_RENDER_TIMEOUT: segundos máximos por documento
+
+Cada render se mide donde ocurre (duración, bytes, ajuste de cada campo) y
+la medición vuelve con el PDF: las métricas se registran en el proceso de
+la API aunque el documento se haya renderizado en el pool.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+_pool = None
+_cupos = None
+_motores = []  # engines de SQLAlchemy que los workers heredan por fork
+_config = {
+    "workers": 0,
+    "max_pendientes": 8,
+    "espera": 10,
+    "timeout": 120,
+}
+_lock = threading.Lock()
+
+
+class RenderSaturadoError(Exception):
+    """El pool de render está lleno; el cliente debe reintentar más tarde."""
+
+
+# =============================
+#     LADO WORKER (proceso)
+# =============================
+
+def _inicializar_worker():
+    """Deja el worker listo: fuentes registradas y plantillas precompiladas."""
+    # Las conexiones heredadas son del proceso padre: el worker no las usa ni
+    # las cierra (close=False), solo se olvida de ellas
+    for motor in _motores:
+        motor.dispose(close=False)
+
+    from app.utils.layout_crt import obtener_plantilla_crt
+    from app.utils.layout_mic import obtener_plantilla_mic
+    obtener_plantilla_crt()
+    obtener_plantilla_mic()
+
+
+def _generar(tipo, datos, destino, campos):
+    if tipo == "crt":
+        from app.utils.layout_crt import generar_crt_pdf_con_datos
+        return generar_crt_pdf_con_datos(datos, destino)
+    if tipo == "crt_lote":
+        from app.utils.layout_crt import generar_crts_pdf_unico
+        return generar_crts_pdf_unico(datos)
+    if tipo == "mic":
+        from app.utils.layout_mic import generar_micdta_pdf_con_datos
+        return generar_micdta_pdf_con_datos(datos, destino, campos)
+    raise ValueError(f"Tipo de documento desconocido: {tipo}")
+
+
+def _render(tipo, datos, destino=None):
+    """
+    Renderiza un documento. Devuelve (bytes o None si se escribió en
+    `destino`, medición del render para las métricas).
+    """
+    campos = []
+    inicio = time.perf_counter()
+    pdf = _generar(tipo, datos, destino, campos)
+    segundos = time.perf_counter() - inicio
+
+    if pdf is not None:
+        tamano = len(pdf)
+    elif isinstance(destino, (str, os.PathLike)):
+        tamano = os.path.getsize(destino)
+    else:
+        tamano = None
+    return pdf, {"tipo": tipo, "segundos": segundos, "bytes": tamano, "campos": campos}
+
+
+def _ping():
+    return True
+
+
+# =============================
+#     LADO API (request)
+# =============================
+
+def _entregar(resultado):
+    """Registra la medición del render y devuelve el PDF."""
+    from app.metrics import observe_pdf_render
+    pdf, medicion = resultado
+    observe_pdf_render(medicion)
+    return pdf
+
+
+def init_render_pool(app):
+    """Crea el pool según la configuración de la app y precalienta los workers."""
+    global _pool, _cupos
+    _config.update({
+        "workers": int(app.config.get('PDF_RENDER_WORKERS', 0) or 0),
+        "max_pendientes": int(app.config.get('PDF_RENDER_MAX_PENDIENTES', 8)),
+        "espera": float(app.config.get('PDF_RENDER_ESPERA', 10)),
+        "timeout": float(app.config.get('PDF_RENDER_TIMEOUT', 120)),
+    })
+    if multiprocessing.parent_process() is not None:
+        # Dentro de un worker (spawn re-ejecuta el módulo principal): sin pool propio
+        _config["workers"] = 0
+    from app import db
+    with app.app_context():
+        _motores[:] = db.engines.values()
+    with _lock:
+        _cupos = threading.BoundedSemaphore(
+            max(_config["max_pendientes"], _config["workers"], 1))
+        if _config["workers"] > 0 and _pool is None:
+            _pool = _crear_pool()
+            # Arrancar todos los workers ahora y no en el primer PDF
+            for _ in range(_config["workers"]):
+                _pool.submit(_ping)
+            atexit.register(shutdown_render_pool)
+            print(f"🖨️ Pool de render PDF iniciado ({_config['workers']} procesos)")
+
+
+def _crear_pool():
+    # fork: los workers heredan fuentes y plantillas ya compiladas y no vuelven
+    # a importar run.py/wsgi.py (que crean la app a nivel de módulo).
+    # spawn sólo donde fork no existe (Windows).
+    metodo = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(
+        max_workers=_config["workers"],
+        mp_context=multiprocessing.get_context(metodo),
+        initializer=_inicializar_worker,
+    )
+
+
+def shutdown_render_pool():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _reservar_cupo():
+    if _cupos is not None and not _cupos.acquire(timeout=_config["espera"]):
+        raise RenderSaturadoError(
+            "Servidor de PDFs ocupado, intente nuevamente en unos segundos")
+
+
+def _liberar_cupo():
+    if _cupos is not None:
+        _cupos.release()
+
+
+def _liberar_al_terminar(futuro):
+    """
+    Libera el cupo cuando el render termina de verdad: cancel() no frena un
+    render en curso (p. ej. tras un timeout) y ese worker sigue ocupado.
+    """
+    futuro.cancel()
+    futuro.add_done_callback(lambda _: _liberar_cupo())
+
+
+def comprobar_cupo():
+    """
+    RenderSaturadoError si no hay lugar en el pool. Para respuestas en
+    streaming, donde un error a mitad de camino ya no puede ser un 503.
+    """
+    _reservar_cupo()
+    _liberar_cupo()
+
+
+def _enviar(tipo, datos, destino=None):
+    """Envía un render al pool; si un worker murió, recrea el pool y reintenta una vez."""
+    global _pool
+    for intento in range(2):
+        pool = _pool
+        if pool is None:
+            return None
+        try:
+            return pool.submit(_render, tipo, datos, destino)
+        except BrokenProcessPool:
+            with _lock:
+                if _pool is pool:
+                    print("⚠️ Pool de render roto, recreando workers")
+                    _pool = _crear_pool()
+    raise RuntimeError("No se pudo recrear el pool de render")
+
+
+def renderizar_pdf(tipo, datos, destino=None):
+    """
+    Renderiza un documento ("crt", "crt_lote" o "mic") a partir de su dict.
+    Devuelve los bytes del PDF, o None si se pidió escribirlo en `destino`.
+    """
+    _reservar_cupo()
+    futuro = None
+    try:
+        futuro = _enviar(tipo, datos, destino)
+        if futuro is None:
+            return _entregar(_render(tipo, datos, destino))
+        return _entregar(futuro.result(timeout=_config["timeout"]))
+    finally:
+        if futuro is None:
+            _liberar_cupo()
+        else:
+            _liberar_al_terminar(futuro)
+
+
+def renderizar_varios(tipo, lista_datos):
+    """
+    Renderiza varios documentos en paralelo y los entrega en orden.
+    Nunca hay más de `workers` renders en vuelo por llamada.
+    """
+    if _pool is None:
+        for datos in lista_datos:
+            yield renderizar_pdf(tipo, datos)
+        return
+
+    ventana = max(1, _config["workers"])
+    pendientes = []
+    try:
+        for datos in lista_datos:
+            _reservar_cupo()
+            try:
+                futuro = _enviar(tipo, datos)
+                if futuro is None:
+                    futuro = Future()
+                    futuro.set_result(_render(tipo, datos))
+                pendientes.append(futuro)
+            except Exception:
+                _liberar_cupo()
+                raise
+            if len(pendientes) >= ventana:
+                futuro = pendientes.pop(0)
+                try:
+                    yield _entregar(futuro.result(timeout=_config["timeout"]))
+                finally:
+                    _liberar_al_terminar(futuro)
+        while pendientes:
+            futuro = pendientes.pop(0)
+            try:
+                yield _entregar(futuro.result(timeout=_config["timeout"]))
+            finally:
+                _liberar_al_terminar(futuro)
+    finally:
+        # Si el consumidor abandona (cliente desconectado) liberar lo que quede
+        # a medida que termina
+        for futuro in pendientes:
+            _liberar_al_terminar(futuro)
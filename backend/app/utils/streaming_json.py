@@ -0,0 +1,78 @@
+# ========== backend/app/utils/streaming_json.py ==========
+"""
+Respuestas JSON en streaming para listados sin paginar.
+
+jsonify([...]) arma la lista completa de dicts y el string JSON entero en
+memoria antes de responder. Aquí las filas se leen del cursor en tandas
+(yield_per / stream_results: cursor del lado del servidor en PostgreSQL) y
+el arreglo JSON se escribe por bloques a medida que llegan, así la memoria
+del worker no depende del tamaño de la tabla.
+
+El status y los headers salen antes que los datos: si la consulta falla a
+mitad de camino sólo se puede cortar la respuesta (queda un JSON truncado
+que el cliente detecta como inválido) y se registra el error.
+"""
+import traceback
+
+from flask import Response, current_app, stream_with_context
+
+from app import db
+
+FILAS_POR_TANDA = 1000
+BYTES_POR_BLOQUE = 64 * 1024
+
+
+def filas_en_tandas(consulta, tanda=FILAS_POR_TANDA):
+    """Itera una Query/Select del ORM o un text() sin cargar todo el resultado."""
+    if hasattr(consulta, "yield_per"):
+        return consulta.yield_per(tanda)
+    return db.session.execute(
+        consulta, execution_options={"stream_results": True, "yield_per": tanda})
+
+
+def entidades_en_tandas(consulta, columna_id, tanda=FILAS_POR_TANDA):
+    """
+    Objetos de una Query ordenada por `columna_id` descendente, de a `tanda`
+    por keyset (id < último visto). Para consultas con selectinload de
+    colecciones, que no se pueden combinar con yield_per: cada tanda es una
+    consulta completa con sus cargas anticipadas.
+    Cuando el consumidor pide la tanda siguiente la anterior ya se serializó
+    y se saca de la sesión (expunge_all), para que el identity map no crezca
+    con la tabla. Sólo para listados de lectura: la sesión se vacía.
+    """
+    ultimo = None
+    while True:
+        pagina = consulta if ultimo is None else consulta.filter(columna_id < ultimo)
+        objetos = pagina.limit(tanda).all()
+        yield from objetos
+        if len(objetos) < tanda:
+            return
+        ultimo = getattr(objetos[-1], columna_id.key)
+        db.session.expunge_all()
+
+
+def respuesta_json_streaming(filas, serializar):
+    """Response que escribe [serializar(f) for f in filas] por bloques."""
+    dumps = current_app.json.dumps
+
+    def generar():
+        bloque = bytearray(b"[")
+        primero = True
+        try:
+            for fila in filas:
+                if not primero:
+                    bloque += b","
+                bloque += dumps(serializar(fila)).encode()
+                primero = False
+                if len(bloque) >= BYTES_POR_BLOQUE:
+                    yield bytes(bloque)
+                    bloque.clear()
+        except Exception:
+            print("❌ Error durante el streaming JSON, respuesta cortada")
+            print(traceback.format_exc())
+            yield bytes(bloque)
+            return
+        bloque += b"]"
+        yield bytes(bloque)
+
+    return Response(stream_with_context(generar()), mimetype="application/json")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Verifica que las consultas calientes usen índices.
+
+Corre EXPLAIN sobre cada consulta de los listados (crt.py, mic_guardados.py),
+de los reportes (background_jobs.py) y de los joins por FK, y termina con
+código 1 si alguna recorre una tabla completa (Seq Scan / SCAN).
+
+Uso:
+    DATABASE_URL=postgresql://... python check_indices.py
+    python check_indices.py sqlite:///instance/logistica.db
+
+En PostgreSQL se desactiva enable_seqscan durante el chequeo: en tablas
+chicas el planner prefiere un Seq Scan aunque exista el índice, así que
+sólo aparece uno cuando realmente no hay índice utilizable.
+"""
+import json
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, select, func
+
+from app.models import (
+    CRT, CRT_Gasto, MIC, Honorario, Movimiento, Reporte, Remitente,
+    Transportadora, Ciudad
+)
+
+
+def consultas_calientes():
+    """(nombre, tabla, consulta) con valores representativos."""
+    desde = datetime(2025, 1, 1)
+    hasta = desde + timedelta(days=30)
+    return [
+        # Listado de CRTs: filtros + orden por id DESC (cursor)
+        ("crt_por_estado", "crts", select(CRT.id).where(
+            CRT.estado == "EMITIDO").order_by(CRT.id.desc()).limit(20)),
+        ("crt_por_transportadora", "crts", select(CRT.id).where(
+            CRT.transportadora_id == 1).order_by(CRT.id.desc()).limit(20)),
+        ("crt_por_fecha", "crts", select(CRT.id).where(
+            CRT.fecha_emision >= desde, CRT.fecha_emision <= hasta)),
+        ("crt_siguiente_numero", "crts", select(CRT.numero_crt).where(
+            CRT.transportadora_id == 1,
+            CRT.numero_crt.startswith("PY"),
+            func.length(CRT.numero_crt) == 11
+        ).order_by(CRT.numero_crt.desc()).limit(1)),
+        ("crt_por_numero", "crts", select(CRT.id).where(
+            CRT.numero_crt == "PY000000001")),
+        ("crt_gastos", "crt_gastos", select(CRT_Gasto.id).where(
+            CRT_Gasto.crt_id == 1)),
+        ("crt_por_remitente", "crts", select(CRT.id).where(
+            CRT.remitente_id == 1)),
+        ("crt_por_destinatario", "crts", select(CRT.id).where(
+            CRT.destinatario_id == 1)),
+        # MIC guardados
+        ("mic_por_estado", "mics", select(MIC.id).where(
+            MIC.campo_4_estado == "PROVISORIO").order_by(MIC.id.desc()).limit(20)),
+        ("mic_por_fecha", "mics", select(MIC.id).where(
+            MIC.campo_6_fecha >= desde.date(), MIC.campo_6_fecha <= hasta.date())),
+        ("mic_creados_desde", "mics", select(func.count(MIC.id)).where(
+            MIC.creado_en >= desde)),
+        ("mic_por_crt", "mics", select(MIC.id).where(MIC.crt_id == 1)),
+        # Reportes
+        ("honorarios_por_fecha", "honorarios", select(func.sum(Honorario.monto)).where(
+            Honorario.fecha >= desde.date(), Honorario.fecha <= hasta.date())),
+        ("honorarios_por_transportadora", "honorarios", select(Honorario.id).where(
+            Honorario.transportadora_id == 1, Honorario.fecha >= desde.date())),
+        ("movimientos_desde", "movimientos", select(func.count(Movimiento.id)).where(
+            Movimiento.fecha >= desde)),
+        ("reportes_viejos", "reportes", select(Reporte.id).where(
+            Reporte.generado_en < desde)),
+        # Datos maestros (joins por FK)
+        ("remitentes_por_ciudad", "remitentes", select(Remitente.id).where(
+            Remitente.ciudad_id == 1)),
+        ("transportadoras_por_ciudad", "transportadoras", select(Transportadora.id).where(
+            Transportadora.ciudad_id == 1)),
+        ("ciudades_por_pais", "ciudades", select(Ciudad.id).where(Ciudad.pais_id == 1)),
+    ]
+
+
+def _parametros(compilado):
+    if compilado.positional:
+        return tuple(compilado.params[k] for k in compilado.positiontup)
+    return compilado.params
+
+
+def escaneos_completos(conn, consulta, tabla):
+    """Líneas del plan que recorren `tabla` completa (vacío si usa índice)."""
+    compilado = consulta.compile(dialect=conn.dialect)
+    sql, params = str(compilado), _parametros(compilado)
+
+    if conn.dialect.name == "postgresql":
+        fila = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + sql, params).scalar()
+        plan = fila if isinstance(fila, list) else json.loads(fila)
+        malos, pendientes = [], [plan[0]["Plan"]]
+        while pendientes:
+            nodo = pendientes.pop()
+            if nodo.get("Node Type") == "Seq Scan" and nodo.get("Relation Name") == tabla:
+                malos.append(f"Seq Scan on {tabla}")
+            pendientes.extend(nodo.get("Plans", []))
+        return malos
+
+    if conn.dialect.name == "sqlite":
+        filas = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+        return [f[-1] for f in filas if f[-1].strip() == f"SCAN {tabla}"]
+
+    raise RuntimeError(f"Dialecto no soportado: {conn.dialect.name}")
+
+
+def verificar(engine):
+    """Devuelve [(nombre, detalle)] de las consultas que no usan índice."""
+    fallas = []
+    with engine.connect() as conn:
+        with conn.begin():
+            if conn.dialect.name == "postgresql":
+                conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            for nombre, tabla, consulta in consultas_calientes():
+                for detalle in escaneos_completos(conn, consulta, tabla):
+                    fallas.append((nombre, detalle))
+    return fallas
+
+
+def main(argv):
+    if len(argv) > 1:
+        url = argv[1]
+    else:
+        from config import Config
+        url = Config.SQLALCHEMY_DATABASE_URI
+    engine = create_engine(url)
+    print(f"🔍 Verificando índices en {engine.url.render_as_string(hide_password=True)}")
+
+    fallas = verificar(engine)
+    for nombre, detalle in fallas:
+        print(f"❌ {nombre}: {detalle}")
+    if fallas:
+        print(f"❌ {len(fallas)} consultas sin índice")
+        return 1
+    print(f"✅ {len(consultas_calientes())} consultas usan índices")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
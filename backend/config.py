@@ -10,3 +10,45 @@ class Config:
     SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'supersecretkey'
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'supersecretkey'
     PREFERRED_URL_SCHEME = "http"
+
+    # 🖨️ Render de PDFs en procesos aparte (0 = en el mismo proceso del request)
+    PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 2))
+    PDF_RENDER_MAX_PENDIENTES = int(
+        os.environ.get('PDF_RENDER_MAX_PENDIENTES', 8))
+    PDF_RENDER_ESPERA = float(os.environ.get('PDF_RENDER_ESPERA', 10))
+    PDF_RENDER_TIMEOUT = float(os.environ.get('PDF_RENDER_TIMEOUT', 120))
+
+    # 🗄️ Cache de PDFs generados (0 MB = desactivado; por defecto instance/pdf_cache)
+    PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR')
+    PDF_CACHE_MAX_MB = float(os.environ.get('PDF_CACHE_MAX_MB', 256))
+
+    # 🧊 Cache de respuestas (Flask-Caching). Con CACHE_REDIS_URL (paquete redis) se comparte
+    # entre workers; sin él, SimpleCache en memoria de cada proceso
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL')
+    CACHE_TYPE = os.environ.get('CACHE_TYPE') or (
+        'RedisCache' if CACHE_REDIS_URL else 'SimpleCache')
+    CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 300))
+    CACHE_KEY_PREFIX = os.environ.get('CACHE_KEY_PREFIX', 'logistica:')
+    # ETag/Last-Modified + 304 en lecturas (requiere versiones compartidas si hay varios workers)
+    CONDITIONAL_GET = os.environ.get('CONDITIONAL_GET', '1') == '1'
+
+    # 📋 Cola de reportes en background (tabla reporte_jobs, compartida entre workers)
+    REPORT_JOB_WORKERS = int(os.environ.get('REPORT_JOB_WORKERS', 2))
+    REPORT_JOB_POLL = float(os.environ.get('REPORT_JOB_POLL', 5))
+    REPORT_JOB_TIMEOUT = int(os.environ.get('REPORT_JOB_TIMEOUT', 1800))
+    REPORT_JOB_MAX_INTENTOS = int(os.environ.get('REPORT_JOB_MAX_INTENTOS', 3))
+    REPORT_JOB_RETENTION_HOURS = int(os.environ.get('REPORT_JOB_RETENTION_HOURS', 168))
+
+    # 📈 Reconciliación de métricas de negocio con la base (segundos)
+    BUSINESS_METRICS_RECONCILE = int(os.environ.get('BUSINESS_METRICS_RECONCILE', 300))
+
+    # 🐢 Detector de N+1: más sentencias por request, o la misma repetida tantas veces, se loguea
+    DB_N_PLUS_ONE_THRESHOLD = int(os.environ.get('DB_N_PLUS_ONE_THRESHOLD', 30))
+    DB_REPEATED_STATEMENT_THRESHOLD = int(os.environ.get('DB_REPEATED_STATEMENT_THRESHOLD', 10))
+    # Header Server-Timing con el tiempo de SQL de cada request (DevTools del navegador)
+    SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+
+    # 🐌 Requests más lentas que SLOW_REQUEST_THRESHOLD (s): se loguean las SLOW_REQUEST_SAMPLES
+    # peores de cada minuto con ruta, parámetros y cantidad de consultas
+    SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD', 0.5))
+    SLOW_REQUEST_SAMPLES = int(os.environ.get('SLOW_REQUEST_SAMPLES', 5))
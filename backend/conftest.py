@@ -0,0 +1,92 @@
+"""
+Fixtures compartidos: app Flask mínima sobre SQLite en memoria con los
+blueprints del sistema (sin scheduler, métricas ni pool de PDFs).
+"""
+from datetime import datetime
+
+import pytest
+from flask import Flask
+from sqlalchemy.pool import StaticPool
+
+from app import db, cache
+from app.utils.cache_tablas import init_cache_tablas
+
+
+@pytest.fixture
+def db_app():
+    """App con base SQLite en memoria y las tablas creadas"""
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SQLALCHEMY_DATABASE_URI="sqlite://",
+        SQLALCHEMY_ENGINE_OPTIONS={"poolclass": StaticPool,
+                                   "connect_args": {"check_same_thread": False}},
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        CACHE_TYPE="SimpleCache",
+    )
+    db.init_app(app)
+    cache.init_app(app)
+    init_cache_tablas(app)
+
+    from app.routes.crt import crt_bp
+    from app.routes.mic import mic_bp
+    from app.routes.mic_guardados import mic_guardados_bp
+    from app.routes.remitentes import remitentes_bp
+    from app.routes.transportadoras import transportadoras_bp
+    from app.routes.honorarios import honorarios_bp
+    from app.routes.busqueda import busqueda_bp
+    from app.routes.paises import paises_bp
+    from app.routes.ciudades import ciudades_bp
+    from app.routes.monedas import monedas_bp
+    from app.routes.background_reports import background_reports_bp
+    for bp in (crt_bp, mic_bp, mic_guardados_bp, remitentes_bp,
+               transportadoras_bp, honorarios_bp, busqueda_bp,
+               paises_bp, ciudades_bp, monedas_bp, background_reports_bp):
+        app.register_blueprint(bp)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def datos_base(db_app):
+    """Países, ciudades, moneda, remitentes, transportadoras y 5 CRTs con gastos"""
+    from app.models import Pais, Ciudad, Moneda, Remitente, Transportadora, CRT, CRT_Gasto
+
+    py = Pais(nombre="PARAGUAY", codigo="PY")
+    db.session.add(py)
+    db.session.flush()
+    asu = Ciudad(nombre="ASUNCIÓN", pais_id=py.id)
+    usd = Moneda(codigo="USD", nombre="DOLAR AMERICANO", simbolo="$")
+    db.session.add_all([asu, usd])
+    db.session.flush()
+
+    rems = [Remitente(nombre=f"EMPRESA {i} S.A.", tipo_documento="RUC",
+                      numero_documento=f"8000{i}-1", direccion="Av. Mariscal López",
+                      ciudad_id=asu.id) for i in range(3)]
+    trans = [Transportadora(codigo=f"T{i}", nombre=f"TRANSPORTES {i}", direccion="Ruta 2",
+                            ciudad_id=asu.id, tipo_documento="RUC",
+                            numero_documento=f"8009{i}-1") for i in range(2)]
+    db.session.add_all(rems + trans)
+    db.session.flush()
+
+    crts = []
+    for i in range(5):
+        crt = CRT(numero_crt=f"PY{i + 1:09d}", fecha_emision=datetime(2025, 1 + i, 10),
+                  estado="EMITIDO", remitente_id=rems[i % 3].id,
+                  destinatario_id=rems[(i + 1) % 3].id,
+                  transportadora_id=trans[i % 2].id, ciudad_emision_id=asu.id,
+                  pais_emision_id=py.id, moneda_id=usd.id, valor_mercaderia=1000 + i,
+                  factura_exportacion=f"001-001-{i:07d}")
+        db.session.add(crt)
+        db.session.flush()
+        for j in range(i):
+            db.session.add(CRT_Gasto(crt_id=crt.id, tramo=f"Tramo {j}",
+                                     valor_remitente=100 + j, moneda_remitente_id=usd.id))
+        crts.append(crt)
+    db.session.commit()
+    return {"pais": py, "ciudad": asu, "moneda": usd, "remitentes": rems,
+            "transportadoras": trans, "crts": crts}
@@ -0,0 +1,70 @@
+"""Indices para los filtros de listados, reportes y joins por FK
+
+Revision ID: 3b7e2c9d41a0
+Revises: fc7680385d45
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e2c9d41a0'
+down_revision = 'fc7680385d45'
+branch_labels = None
+depends_on = None
+
+
+# (nombre, tabla, columnas) — mismos nombres que los __table_args__ de models.py
+INDICES = [
+    # CRT: filtros del listado con orden por id DESC (cursor)
+    ('ix_crts_estado_id', 'crts', ['estado', 'id']),
+    ('ix_crts_transportadora_id_id', 'crts', ['transportadora_id', 'id']),
+    ('ix_crts_transportadora_id_numero_crt', 'crts', ['transportadora_id', 'numero_crt']),
+    ('ix_crts_fecha_emision', 'crts', ['fecha_emision']),
+    # CRT: FKs de los joins
+    ('ix_crts_remitente_id', 'crts', ['remitente_id']),
+    ('ix_crts_destinatario_id', 'crts', ['destinatario_id']),
+    ('ix_crts_consignatario_id', 'crts', ['consignatario_id']),
+    ('ix_crts_notificar_a_id', 'crts', ['notificar_a_id']),
+    ('ix_crts_moneda_id', 'crts', ['moneda_id']),
+    ('ix_crts_ciudad_emision_id', 'crts', ['ciudad_emision_id']),
+    ('ix_crts_pais_emision_id', 'crts', ['pais_emision_id']),
+    ('ix_crts_usuario_id', 'crts', ['usuario_id']),
+    ('ix_crt_gastos_crt_id', 'crt_gastos', ['crt_id']),
+    # MIC guardados
+    ('ix_mics_campo_4_estado_id', 'mics', ['campo_4_estado', 'id']),
+    ('ix_mics_campo_6_fecha', 'mics', ['campo_6_fecha']),
+    ('ix_mics_creado_en', 'mics', ['creado_en']),
+    ('ix_mics_crt_id', 'mics', ['crt_id']),
+    # Reportes (background_jobs)
+    ('ix_honorarios_fecha', 'honorarios', ['fecha']),
+    ('ix_honorarios_transportadora_id_fecha', 'honorarios', ['transportadora_id', 'fecha']),
+    ('ix_honorarios_moneda_id', 'honorarios', ['moneda_id']),
+    ('ix_movimientos_fecha', 'movimientos', ['fecha']),
+    ('ix_reportes_generado_en', 'reportes', ['generado_en']),
+    # Datos maestros
+    ('ix_ciudades_pais_id', 'ciudades', ['pais_id']),
+    ('ix_remitentes_ciudad_id', 'remitentes', ['ciudad_id']),
+    ('ix_transportadoras_ciudad_id', 'transportadoras', ['ciudad_id']),
+]
+
+
+def upgrade():
+    # if_not_exists: bases creadas con db.create_all() ya pueden tenerlos
+    for nombre, tabla, columnas in INDICES:
+        op.create_index(nombre, tabla, columnas, unique=False, if_not_exists=True)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        # LIKE 'PY%' (siguiente número de CRT) sólo usa índice con pattern_ops
+        op.create_index('ix_crts_numero_crt_patron', 'crts', ['numero_crt'],
+                        postgresql_ops={'numero_crt': 'varchar_pattern_ops'},
+                        if_not_exists=True)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_crts_numero_crt_patron', table_name='crts', if_exists=True)
+
+    for nombre, tabla, _ in reversed(INDICES):
+        op.drop_index(nombre, table_name=tabla, if_exists=True)
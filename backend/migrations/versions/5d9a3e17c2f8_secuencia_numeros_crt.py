@@ -0,0 +1,34 @@
+"""Tabla crt_secuencias: último número de CRT asignado por transportadora
+
+Revision ID: 5d9a3e17c2f8
+Revises: 8c41f0e2d7b5
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d9a3e17c2f8'
+down_revision = '8c41f0e2d7b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Las filas se crean al pedir el primer número de cada transportadora
+    # (app/utils/numeracion_crt.py), a partir del mayor PY######### existente
+    op.create_table(
+        'crt_secuencias',
+        sa.Column('transportadora_id', sa.Integer(), nullable=False),
+        sa.Column('ultimo_numero', sa.Integer(), nullable=False),
+        sa.Column('actualizado_en', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['transportadora_id'], ['transportadoras.id']),
+        sa.PrimaryKeyConstraint('transportadora_id'),
+        if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_table('crt_secuencias', if_exists=True)
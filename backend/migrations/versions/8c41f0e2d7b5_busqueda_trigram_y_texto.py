@@ -0,0 +1,54 @@
+"""Indices trigram (pg_trgm) y de texto completo para la busqueda
+
+Revision ID: 8c41f0e2d7b5
+Revises: 3b7e2c9d41a0
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41f0e2d7b5'
+down_revision = '3b7e2c9d41a0'
+branch_labels = None
+depends_on = None
+
+
+# (nombre, tabla, columna) — ILIKE '%texto%' sobre estas columnas usa el índice GIN
+INDICES_TRGM = [
+    ('ix_crts_numero_crt_trgm', 'crts', 'numero_crt'),
+    ('ix_crts_detalles_mercaderia_trgm', 'crts', 'detalles_mercaderia'),
+    ('ix_remitentes_nombre_trgm', 'remitentes', 'nombre'),
+    ('ix_transportadoras_nombre_trgm', 'transportadoras', 'nombre'),
+    ('ix_mics_campo_1_transporte_trgm', 'mics', 'campo_1_transporte'),
+    ('ix_mics_campo_11_placa_trgm', 'mics', 'campo_11_placa'),
+    ('ix_mics_campo_15_placa_semi_trgm', 'mics', 'campo_15_placa_semi'),
+    ('ix_mics_campo_8_destino_trgm', 'mics', 'campo_8_destino'),
+    ('ix_mics_campo_23_numero_campo2_crt_trgm', 'mics', 'campo_23_numero_campo2_crt'),
+]
+
+
+def upgrade():
+    # En SQLite la búsqueda usa tablas FTS5 que crea app/utils/busqueda.py al arrancar
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for nombre, tabla, columna in INDICES_TRGM:
+        op.execute(f"CREATE INDEX IF NOT EXISTS {nombre} ON {tabla} "
+                   f"USING gin ({columna} gin_trgm_ops)")
+
+    # Ranking por palabras de la mercadería (ts_rank en buscar_crts)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_crts_detalles_mercaderia_tsv ON crts "
+               "USING gin (to_tsvector('spanish', coalesce(detalles_mercaderia, '')))")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute("DROP INDEX IF EXISTS ix_crts_detalles_mercaderia_tsv")
+    for nombre, _, _ in reversed(INDICES_TRGM):
+        op.execute(f"DROP INDEX IF EXISTS {nombre}")
+    # La extensión pg_trgm se deja: otros objetos pueden depender de ella
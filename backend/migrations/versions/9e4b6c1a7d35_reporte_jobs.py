@@ -0,0 +1,51 @@
+"""Tabla reporte_jobs: cola de reportes en background compartida entre workers
+
+Revision ID: 9e4b6c1a7d35
+Revises: 5d9a3e17c2f8
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b6c1a7d35'
+down_revision = '5d9a3e17c2f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Reemplaza el dict job_status en memoria de app/background_jobs.py
+    op.create_table(
+        'reporte_jobs',
+        sa.Column('id', sa.String(length=64), nullable=False),
+        sa.Column('tipo', sa.String(length=40), nullable=False),
+        sa.Column('parametros', sa.Text(), nullable=True),
+        sa.Column('estado', sa.String(length=20), nullable=False),
+        sa.Column('progreso', sa.Integer(), nullable=False),
+        sa.Column('mensaje', sa.String(length=255), nullable=True),
+        sa.Column('resultado', sa.Text(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('usuario_id', sa.Integer(), nullable=True),
+        sa.Column('worker', sa.String(length=80), nullable=True),
+        sa.Column('intentos', sa.Integer(), nullable=False),
+        sa.Column('creado_en', sa.DateTime(), nullable=True),
+        sa.Column('iniciado_en', sa.DateTime(), nullable=True),
+        sa.Column('finalizado_en', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['usuario_id'], ['usuarios.id']),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+    # Los workers toman el queued más viejo: (estado, creado_en)
+    op.create_index('ix_reporte_jobs_estado_creado_en', 'reporte_jobs',
+                    ['estado', 'creado_en'], unique=False, if_not_exists=True)
+    op.create_index('ix_reporte_jobs_usuario_id', 'reporte_jobs',
+                    ['usuario_id'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_reporte_jobs_usuario_id', table_name='reporte_jobs', if_exists=True)
+    op.drop_index('ix_reporte_jobs_estado_creado_en', table_name='reporte_jobs', if_exists=True)
+    op.drop_table('reporte_jobs', if_exists=True)
@@ -0,0 +1,63 @@
+"""
+Tests for the shared text-fitting engine
+"""
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from app.utils.ajuste_texto import (
+    ancho_texto, prefijo_que_entra, wrap_text_multiline, ajustar_area, ajustar_caja
+)
+
+
+def test_ancho_texto_matches_stringwidth():
+    """Cached word widths add up to the ReportLab width"""
+    texto = "CONTENEDOR TCLU-1234567  Mercadería: café"
+    for size in (4.75, 6, 8.5):
+        assert abs(ancho_texto(texto, "Helvetica", size) - stringWidth(texto, "Helvetica", size)) < 1e-9
+
+
+def test_prefijo_que_entra():
+    """Longest prefix that fits the width"""
+    texto = "ABCDEFGHIJ"
+    n = prefijo_que_entra(texto, "Helvetica", 10, 30)
+    assert stringWidth(texto[:n], "Helvetica", 10) <= 30
+    assert stringWidth(texto[:n + 1], "Helvetica", 10) > 30
+
+
+def test_wrap_text_multiline_respects_width_and_breaks():
+    """Lines fit the width and manual line breaks are kept"""
+    lineas = wrap_text_multiline("uno dos tres cuatro\ncinco", "Helvetica", 6, 30)
+    assert lineas[-1] == "cinco"
+    assert all(stringWidth(l, "Helvetica", 6) <= 30 for l in lineas)
+
+
+def test_ajustar_area_picks_largest_size_that_fits():
+    """Largest font on the 0.25pt grid whose lines fit the box"""
+    texto = "palabra " * 40
+    lineas, size = ajustar_area(texto, "Helvetica", 200, 40, 5.0, 8.0, 1.13)
+    assert 5.0 <= size <= 8.0
+    assert len(lineas) * size * 1.13 <= 40
+    # Un cuarto de punto más ya no entra
+    if size < 8.0:
+        mas_grande = wrap_text_multiline(texto, "Helvetica", size + 0.25, 200)
+        assert len(mas_grande) * (size + 0.25) * 1.13 > 40
+
+
+def test_ajustar_area_truncates_long_words():
+    """Words wider than the box are cut with an ellipsis"""
+    lineas, _ = ajustar_area("X" * 200, "Helvetica", 50, 20, 5.0, 8.0, 1.13)
+    assert lineas[0].endswith("...")
+
+
+def test_ajustar_caja_is_memoized():
+    """Same text, box and config are computed once"""
+    args = ("TRANSPORTES EJEMPLO S.A.\nRuta 2", "Helvetica", 300.0, 80.0, 7, 14, 1.15, True)
+    ajustar_caja.cache_clear()
+    primero = ajustar_caja(*args)
+    assert ajustar_caja(*args) == primero
+    assert ajustar_caja.cache_info().hits == 1
+
+
+def test_ajustar_caja_reports_iterations():
+    """The binary search reports how many font sizes it tried"""
+    _, _, iteraciones = ajustar_caja("TEXTO", "Helvetica", 300.0, 80.0, 8, 16, 1.2, False)
+    assert 1 <= iteraciones <= 4
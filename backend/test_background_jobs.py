@@ -6,7 +6,8 @@ from unittest.mock import patch, MagicMock
 from datetime import datetime, timedelta
 from app.background_jobs import (
     create_report_job, get_job_status, get_active_jobs, cancel_job,
-    process_report, generate_crt_summary_report, generate_financial_report,
+    process_report, reclamar_job, procesar_siguiente,
+    generate_crt_summary_report, generate_financial_report,
     generate_activity_report, generate_daily_report, cleanup_old_reports
 )
 
@@ -18,154 +19,274 @@ def mock_db():
         yield mock
 
 
-@pytest.fixture
-def mock_scheduler():
-    """Mock APScheduler"""
-    with patch('app.background_jobs.scheduler') as mock:
-        yield mock
-
-
-def test_create_report_job(mock_scheduler):
-    """Test creating a report job"""
+def test_create_report_job(db_app):
+    """Test creating a report job (queued in the database, unique ids)"""
     job_id = create_report_job('crt_summary', {'date_from': '2024-01-01'})
+    otro = create_report_job('crt_summary', {'date_from': '2024-01-01'})
 
     assert job_id.startswith('report_crt_summary_')
-    mock_scheduler.add_job.assert_called_once()
+    assert job_id != otro
+    status = get_job_status(job_id)
+    assert status['status'] == 'queued'
+    assert status['parameters'] == {'date_from': '2024-01-01'}
 
 
-def test_get_job_status():
+def test_get_job_status(db_app):
     """Test getting job status"""
-    from app.background_jobs import job_status
-
     # Initially should be not found
     status = get_job_status('nonexistent')
     assert status['status'] == 'not_found'
 
-    # Add a job and check status
-    job_status['test_job'] = {'status': 'completed', 'progress': 100}
-    status = get_job_status('test_job')
-    assert status['status'] == 'completed'
+    job_id = create_report_job('activity')
+    assert get_job_status(job_id)['progress'] == 0
 
 
-def test_get_active_jobs():
+def test_get_active_jobs(db_app):
     """Test getting active jobs"""
-    from app.background_jobs import job_status
-
-    # Clear existing jobs
-    job_status.clear()
-
-    # Add some jobs
-    job_status['job1'] = {'status': 'processing'}
-    job_status['job2'] = {'status': 'queued'}
-    job_status['job3'] = {'status': 'completed'}
+    job1 = create_report_job('activity', user_id=1)
+    job2 = create_report_job('activity', user_id=2)
+    job3 = create_report_job('activity', user_id=1)
+    procesar_siguiente('w1')
 
     active_jobs = get_active_jobs()
-    assert len(active_jobs) == 2
-    assert 'job1' in active_jobs
-    assert 'job2' in active_jobs
-    assert 'job3' not in active_jobs
+    assert set(active_jobs) == {job2, job3}
+    assert job1 not in active_jobs
+    assert set(get_active_jobs(user_id=1)) == {job3}
+
 
+def test_cancel_job(db_app):
+    """Test canceling a job: it is never picked up afterwards"""
+    job_id = create_report_job('activity')
 
-def test_cancel_job(mock_scheduler):
-    """Test canceling a job"""
-    from app.background_jobs import job_status
+    assert cancel_job(job_id) is True
+    assert get_job_status(job_id)['status'] == 'cancelled'
+    assert cancel_job(job_id) is False
+    assert procesar_siguiente('w1') is None
 
-    # Add a job
-    job_status['test_job'] = {'status': 'processing'}
 
-    # Mock scheduler cancel
-    mock_scheduler.remove_job.return_value = True
+def test_cancel_while_processing_discards_result(db_app):
+    """A job cancelled mid-run keeps the cancelled state"""
+    job_id = create_report_job('activity')
+    assert reclamar_job('w1') == job_id
+    cancel_job(job_id)
 
-    result = cancel_job('test_job')
-    assert result is True
-    assert job_status['test_job']['status'] == 'cancelled'
-    mock_scheduler.remove_job.assert_called_once_with('test_job')
+    process_report(job_id, 'w1')
+    status = get_job_status(job_id)
+    assert status['status'] == 'cancelled'
+    assert status['result'] is None
 
 
 @patch('app.background_jobs.generate_crt_summary_report')
-def test_process_report_crt_summary(mock_generate):
+def test_process_report_crt_summary(mock_generate, db_app):
     """Test processing CRT summary report"""
     mock_generate.return_value = {'total_crts': 10}
+    job_id = create_report_job('crt_summary', {})
 
-    from app.background_jobs import job_status
-    job_status['test_job'] = {'status': 'processing', 'progress': 0}
+    assert procesar_siguiente('w1') == job_id
 
-    process_report('test_job', 'crt_summary', {})
-
-    assert job_status['test_job']['status'] == 'completed'
-    assert job_status['test_job']['progress'] == 100
-    assert job_status['test_job']['result'] == {'total_crts': 10}
+    status = get_job_status(job_id)
+    assert status['status'] == 'completed'
+    assert status['progress'] == 100
+    assert status['result'] == {'total_crts': 10}
+    assert status['completed_at'] is not None
     mock_generate.assert_called_once_with({})
 
 
 @patch('app.background_jobs.generate_financial_report')
-def test_process_report_financial(mock_generate):
+def test_process_report_financial(mock_generate, db_app):
     """Test processing financial report"""
     mock_generate.return_value = {'total_honorarios': 1000}
+    job_id = create_report_job('financial', {})
 
-    from app.background_jobs import job_status
-    job_status['test_job'] = {'status': 'processing', 'progress': 0}
+    procesar_siguiente('w1')
 
-    process_report('test_job', 'financial', {})
-
-    assert job_status['test_job']['status'] == 'completed'
-    assert job_status['test_job']['result'] == {'total_honorarios': 1000}
+    status = get_job_status(job_id)
+    assert status['status'] == 'completed'
+    assert status['result'] == {'total_honorarios': 1000}
 
 
-def test_process_report_invalid_type():
+def test_process_report_invalid_type(db_app):
     """Test processing report with invalid type"""
-    from app.background_jobs import job_status
-    job_status['test_job'] = {'status': 'processing', 'progress': 0}
-
-    process_report('test_job', 'invalid_type', {})
+    job_id = create_report_job('invalid_type')
+
+    procesar_siguiente('w1')
+
+    status = get_job_status(job_id)
+    assert status['status'] == 'failed'
+    assert 'Tipo de reporte desconocido' in status['message']
+
+
+def test_jobs_visible_from_another_app(tmp_path):
+    """Any worker process can see and run a job created by another one"""
+    from flask import Flask
+    from app import db
+
+    url = f"sqlite:///{tmp_path / 'jobs.db'}"
+    apps = []
+    for _ in range(2):
+        app = Flask(__name__)
+        app.config.update(SQLALCHEMY_DATABASE_URI=url,
+                          SQLALCHEMY_ENGINE_OPTIONS={"connect_args": {"timeout": 30}})
+        db.init_app(app)
+        apps.append(app)
+
+    with apps[0].app_context():
+        db.create_all()
+        job_id = create_report_job('activity', {'days': 7})
+    with apps[1].app_context():
+        assert procesar_siguiente('otro-proceso') == job_id
+    with apps[0].app_context():
+        status = get_job_status(job_id)
+        assert status['status'] == 'completed'
+        assert status['result']['periodo_dias'] == 7
+
+
+def test_concurrent_workers_claim_each_job_once(tmp_path):
+    """Parallel workers on a file database never run the same job twice"""
+    import threading
+    from flask import Flask
+    from app import db
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'cola.db'}",
+                      SQLALCHEMY_ENGINE_OPTIONS={"connect_args": {"timeout": 30}})
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        creados = {create_report_job('activity') for _ in range(20)}
+
+    reclamados, errores = [], []
+
+    def trabajar(n):
+        try:
+            with app.app_context():
+                while True:
+                    job_id = reclamar_job(f'w{n}')
+                    if job_id is None:
+                        return
+                    reclamados.append(job_id)
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=trabajar, args=(n,)) for n in range(4)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert not errores
+    assert sorted(reclamados) == sorted(creados)
+
+
+def test_maintenance_requeues_and_purges(db_app):
+    """Stale processing jobs are requeued; old finished jobs are deleted"""
+    import app.background_jobs as background_jobs
+    from app import db
+    from app.models import ReporteJob
+
+    colgado = create_report_job('activity')
+    viejo = create_report_job('activity')
+    reclamar_job('muerto')
+    reclamar_job('w1')
+    ReporteJob.query.filter_by(id=colgado).update(
+        {'iniciado_en': datetime.utcnow() - timedelta(hours=2)})
+    ReporteJob.query.filter_by(id=viejo).update(
+        {'estado': 'completed', 'finalizado_en': datetime.utcnow() - timedelta(days=30)})
+    db.session.commit()
+
+    with patch.object(background_jobs, 'app', db_app):
+        background_jobs.mantener_jobs()
+
+    assert get_job_status(colgado)['status'] == 'queued'
+    assert get_job_status(viejo)['status'] == 'not_found'
+
+
+def test_report_routes(db_app):
+    """Jobs are created, read and cancelled through the API by their owner"""
+    from app.utils.auth import create_access_token
+    client = db_app.test_client()
+
+    def headers(user_id, rol='operador'):
+        token = create_access_token({'user_id': user_id, 'usuario': 'x', 'rol': rol})
+        return {'Authorization': f'Bearer {token}'}
+
+    r = client.post('/api/background-reports/create', headers=headers(1),
+                    json={'report_type': 'activity', 'parameters': {'days': 7}})
+    assert r.status_code == 201
+    job_id = r.get_json()['job_id']
+
+    assert client.get(f'/api/background-reports/status/{job_id}',
+                      headers=headers(1)).get_json()['status'] == 'queued'
+    assert client.get(f'/api/background-reports/status/{job_id}',
+                      headers=headers(2)).status_code == 404
+    assert client.get('/api/background-reports/active',
+                      headers=headers(2)).get_json()['count'] == 0
+    assert client.get('/api/background-reports/active',
+                      headers=headers(3, 'admin')).get_json()['count'] == 1
+
+    assert client.post(f'/api/background-reports/cancel/{job_id}',
+                       headers=headers(2)).status_code == 404
+    assert client.post(f'/api/background-reports/cancel/{job_id}',
+                       headers=headers(1)).status_code == 200
+
+
+def test_generate_crt_summary_report(db_app, datos_base):
+    """Test CRT summary report generation (aggregated in SQL)"""
+    from app import db
+    crts = datos_base["crts"]
+    crts[0].estado = 'ANULADO'
+    crts[1].valor_incoterm = 1000
+    crts[2].valor_incoterm = 250
+    db.session.commit()
 
-    assert job_status['test_job']['status'] == 'failed'
-    assert 'Tipo de reporte desconocido' in job_status['test_job']['message']
+    result = generate_crt_summary_report({})
 
+    assert result['total_crts'] == 5
+    assert result['total_valor'] == 1250
+    assert result['por_estado'] == {'EMITIDO': 4, 'ANULADO': 1}
+    assert result['por_moneda'] == {'DOLAR AMERICANO': 5}
+    assert result['por_mes'] == {f'2025-0{i}': 1 for i in range(1, 6)}
 
-@patch('app.background_jobs.CRT')
-def test_generate_crt_summary_report(mock_crt):
-    """Test CRT summary report generation"""
-    # Mock CRT query
-    mock_query = MagicMock()
-    mock_crt.query.filter.return_value = mock_query
+    result = generate_crt_summary_report({'date_from': '2025-03-01'})
+    assert result['total_crts'] == 3
+    assert result['total_valor'] == 250
+    assert set(result['por_mes']) == {'2025-03', '2025-04', '2025-05'}
 
-    mock_crt_obj = MagicMock()
-    mock_crt_obj.fecha_emision = datetime.now()
-    mock_crt_obj.estado = 'COMPLETADO'
-    mock_crt_obj.valor_incoterm = 1000
-    mock_crt_obj.moneda.nombre = 'USD'
-
-    mock_query.all.return_value = [mock_crt_obj]
 
+def test_generate_crt_summary_report_empty(db_app):
+    """Test CRT summary report without CRTs"""
     result = generate_crt_summary_report({})
 
-    assert 'total_crts' in result
-    assert 'por_estado' in result
-    assert 'por_moneda' in result
-    assert result['total_crts'] == 1
-
-
-@patch('app.background_jobs.Honorario')
-def test_generate_financial_report(mock_honorario):
-    """Test financial report generation"""
-    # Mock Honorario query
-    mock_query = MagicMock()
-    mock_honorario.query.filter.return_value = mock_query
+    assert result['total_crts'] == 0
+    assert result['total_valor'] == 0
+    assert result['por_estado'] == {}
 
-    mock_honorario_obj = MagicMock()
-    mock_honorario_obj.fecha = datetime.now()
-    mock_honorario_obj.monto = 500
-    mock_honorario_obj.transportadora.nombre = 'Transportadora A'
 
-    mock_query.all.return_value = [mock_honorario_obj]
+def test_generate_financial_report(db_app, datos_base):
+    """Test financial report generation (aggregated in SQL)"""
+    from datetime import date
+    from app import db
+    from app.models import Honorario
+    trans, usd = datos_base["transportadoras"], datos_base["moneda"]
+    for monto, t, fecha in [(500, 0, date(2025, 1, 5)), (300, 0, date(2025, 2, 5)),
+                            (200, 1, date(2025, 2, 20))]:
+        db.session.add(Honorario(monto=monto, transportadora_id=trans[t].id,
+                                 moneda_id=usd.id, fecha=fecha))
+    db.session.commit()
 
     result = generate_financial_report({})
 
-    assert 'total_honorarios' in result
-    assert 'total_monto' in result
-    assert 'por_transportadora' in result
-    assert result['total_monto'] == 500
+    assert result['total_honorarios'] == 3
+    assert result['total_monto'] == 1000
+    assert result['por_transportadora'] == {
+        'TRANSPORTES 0': {'count': 2, 'total': 800},
+        'TRANSPORTES 1': {'count': 1, 'total': 200},
+    }
+    assert result['por_mes'] == {'2025-01': 500, '2025-02': 500}
+    assert result['promedio_por_transportadora'] == 500
+
+    result = generate_financial_report({'date_from': '2025-02-10'})
+    assert result['total_monto'] == 200
 
 
 @patch('app.background_jobs.CRT')
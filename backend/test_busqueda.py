@@ -0,0 +1,60 @@
+"""
+Tests for the free-text search (FTS5 trigram on SQLite, ILIKE fallback)
+"""
+import pytest
+
+from app import db
+from app.models import CRT, MIC
+from app.utils.busqueda import init_busqueda, buscar_crts, buscar_mics, filtro_texto_crt
+
+
+@pytest.fixture
+def fts_app(db_app, datos_base):
+    """db_app with the FTS5 tables built over the seeded rows"""
+    assert init_busqueda(db_app) == "sqlite"
+    return db_app
+
+
+def _ids_listado(client, q):
+    return sorted(c["id"] for c in client.get(f"/api/crts/paginated?per_page=50&q={q}")
+                  .get_json()["crts"])
+
+
+@pytest.mark.parametrize("q", ["PY0000000", "000003", "empresa 1", "TRANSPORTES 0", "xyz", "PY"])
+def test_fts_matches_ilike(db_app, datos_base, q):
+    """The FTS filter returns exactly what the old ILIKE filter returned"""
+    client = db_app.test_client()
+    init_busqueda(db_app)
+    con_fts = _ids_listado(client, q)
+    db_app.extensions["busqueda"] = "like"
+    assert con_fts == _ids_listado(client, q)
+
+
+def test_triggers_keep_index_in_sync(fts_app, datos_base):
+    """Inserts and updates on crts are searchable without a rebuild"""
+    crt = datos_base["crts"][0]
+    crt.detalles_mercaderia = "SOJA EN GRANOS A GRANEL"
+    db.session.commit()
+    assert db.session.query(CRT.id).filter(filtro_texto_crt("granos")).all() == [(crt.id,)]
+
+    crt.detalles_mercaderia = "MAIZ"
+    db.session.commit()
+    assert db.session.query(CRT.id).filter(filtro_texto_crt("granos")).all() == []
+
+    db.session.add(MIC(campo_8_destino="FOZ DO IGUAÇU", campo_11_placa="AAA123"))
+    db.session.commit()
+    client = fts_app.test_client()
+    data = client.get("/api/mic-guardados/?placa=aa12").get_json()
+    assert [m["campo_11_placa"] for m in data["mics"]] == ["AAA123"]
+
+
+def test_ranked_ids(fts_app, datos_base):
+    """The search API returns ids ranked by relevance"""
+    crts = datos_base["crts"]
+    assert buscar_crts("PY000000003") == [crts[2].id]
+    assert set(buscar_crts("TRANSPORTES 1")) == {crts[1].id, crts[3].id}
+    assert buscar_mics("") == []
+
+    data = fts_app.test_client().get("/api/busqueda/crts?q=empresa&limit=2").get_json()
+    assert data["motor"] == "sqlite"
+    assert len(data["ids"]) == 2
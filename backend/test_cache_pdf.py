@@ -0,0 +1,102 @@
+"""
+Tests for the content-addressed PDF cache
+"""
+import os
+
+import pytest
+from flask import Flask
+
+from app.utils import cache_pdf
+from app.utils.cache_pdf import clave_pdf, obtener_pdf, enviar_pdf
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """Cache en un directorio temporal con un render falso que cuenta llamadas"""
+    app = Flask(__name__)
+    app.config['PDF_CACHE_DIR'] = str(tmp_path)
+    app.config['PDF_CACHE_MAX_MB'] = 1
+    cache_pdf.init_cache_pdf(app)
+
+    llamadas = []
+
+    def render_falso(tipo, datos):
+        llamadas.append(datos)
+        return b"%PDF-" + datos["relleno"].encode()
+
+    monkeypatch.setattr(cache_pdf, "renderizar_pdf", render_falso)
+    yield app, llamadas
+    cache_pdf._config["dir"] = None
+
+
+def test_same_document_is_rendered_once(cache):
+    """A second request for the same content is served from disk"""
+    _, llamadas = cache
+    datos = {"campo_1_transporte": "TRANSPORTES EJEMPLO", "relleno": "x"}
+    primero = obtener_pdf("mic", datos)
+    segundo = obtener_pdf("mic", dict(datos))
+    assert primero[0] == segundo[0]
+    assert (primero[2], segundo[2]) == (False, True)
+    assert len(llamadas) == 1
+
+
+def test_key_changes_with_content():
+    """Any change in the document produces a different key"""
+    assert clave_pdf("mic", {"a": 1}) != clave_pdf("mic", {"a": 2})
+    assert clave_pdf("mic", {"a": 1, "b": 2}) == clave_pdf("mic", {"b": 2, "a": 1})
+
+
+def test_mic_without_date_is_keyed_by_printed_date(cache, monkeypatch):
+    """A MIC without date prints today's date, so the date is part of its key"""
+    from app.utils import layout_mic
+    _, llamadas = cache
+    datos = {"campo_1_transporte": "TRANSPORTES EJEMPLO", "relleno": "x"}
+
+    _, clave_hoy, _ = obtener_pdf("mic", datos)
+    assert llamadas[-1]["fecha"]
+
+    class Manana:
+        @staticmethod
+        def now():
+            from datetime import datetime
+            return datetime(2099, 1, 2)
+
+    monkeypatch.setattr(layout_mic, "datetime", Manana)
+    _, clave_manana, acierto = obtener_pdf("mic", datos)
+    assert clave_manana != clave_hoy and not acierto
+    assert llamadas[-1]["fecha"] == "02/01/2099"
+
+    # Con fecha propia no se agrega nada
+    con_fecha = dict(datos, campo_6_fecha="01/01/2025")
+    obtener_pdf("mic", con_fecha)
+    assert "fecha" not in llamadas[-1]
+
+
+def test_lru_eviction_keeps_size_bounded(cache):
+    """Least recently used PDFs are evicted when the cache is full"""
+    _, llamadas = cache
+    grande = "x" * (300 * 1024)
+    claves = []
+    for i in range(3):
+        _, clave, _ = obtener_pdf("mic", {"n": i, "relleno": grande})
+        claves.append(clave)
+        os.utime(cache_pdf._ruta(clave), (i, i))
+
+    obtener_pdf("mic", {"n": 0, "relleno": grande})  # renueva el primero
+    obtener_pdf("mic", {"n": 3, "relleno": grande})  # supera 1 MB
+
+    assert cache_pdf.estadisticas_cache_pdf()["bytes"] <= 1024 * 1024
+    assert os.path.exists(cache_pdf._ruta(claves[0]))
+    assert not os.path.exists(cache_pdf._ruta(claves[1]))
+
+
+def test_if_none_match_returns_304(cache):
+    """Clients holding the current ETag get a 304 without a render"""
+    app, llamadas = cache
+    datos = {"relleno": "y"}
+    with app.test_request_context("/pdf"):
+        etag = enviar_pdf("mic", datos, "mic.pdf").get_etag()[0]
+    with app.test_request_context("/pdf", headers={"If-None-Match": f'"{etag}"'}):
+        response = enviar_pdf("mic", datos, "mic.pdf")
+    assert response.status_code == 304
+    assert len(llamadas) == 1
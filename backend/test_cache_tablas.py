@@ -0,0 +1,204 @@
+"""
+Tests for the table-versioned response cache
+"""
+from cachelib import SimpleCache
+from flask import Flask
+
+from app import db, cache
+from app.models import Moneda
+from app.utils.cache_tablas import init_cache_tablas, invalidar_tablas
+
+_compartido = SimpleCache()
+
+
+def backend_compartido(app, config, args, kwargs):
+    """Stands in for a Redis server: one store shared by several apps"""
+    return _compartido
+
+
+def test_write_invalidates_cached_list(db_app, datos_base):
+    """A commit on monedas drops the cached /api/monedas/ response"""
+    client = db_app.test_client()
+    assert [m["codigo"] for m in client.get("/api/monedas/").get_json()] == ["USD"]
+
+    r = client.post("/api/monedas/", json={"codigo": "PYG", "nombre": "GUARANI", "simbolo": "₲"})
+    assert r.status_code == 201
+    assert {m["codigo"] for m in client.get("/api/monedas/").get_json()} == {"USD", "PYG"}
+
+    # Writes outside the routes (ORM bulk update) invalidate too
+    Moneda.query.filter_by(codigo="PYG").update({"nombre": "GUARANÍ"})
+    db.session.commit()
+    nombres = {m["nombre"] for m in client.get("/api/monedas/").get_json()}
+    assert "GUARANÍ" in nombres
+
+
+def test_raw_sql_needs_explicit_invalidation(db_app, datos_base):
+    """Raw SQL is not tracked: the cache is kept until invalidar_tablas()"""
+    client = db_app.test_client()
+    primero = client.get("/api/paises/").get_json()
+    db.session.execute(db.text("UPDATE paises SET nombre = 'CAMBIADO'"))
+    db.session.commit()
+    assert client.get("/api/paises/").get_json() == primero
+
+    invalidar_tablas("paises")
+    assert client.get("/api/paises/").get_json()[0]["nombre"] == "CAMBIADO"
+
+
+def test_query_string_is_part_of_the_key(db_app, datos_base):
+    """?pais_id= no longer returns the unfiltered cached list"""
+    client = db_app.test_client()
+    assert len(client.get("/api/ciudades/").get_json()) == 1
+    assert client.get("/api/ciudades/?pais_id=999").get_json() == []
+
+
+def test_shared_backend_across_workers(tmp_path):
+    """An update committed by one worker is seen by another sharing the backend"""
+    url = f"sqlite:///{tmp_path / 'compartida.db'}"
+    apps = []
+    for _ in range(2):
+        app = Flask(__name__)
+        app.config.update(SQLALCHEMY_DATABASE_URI=url,
+                          CACHE_TYPE="test_cache_tablas.backend_compartido")
+        db.init_app(app)
+        cache.init_app(app)
+        init_cache_tablas(app)
+        from app.routes.monedas import monedas_bp
+        app.register_blueprint(monedas_bp)
+        apps.append(app)
+
+    with apps[0].app_context():
+        db.create_all()
+    a, b = (app.test_client() for app in apps)
+    assert a.get("/api/monedas/").get_json() == []
+    assert b.get("/api/monedas/").get_json() == []
+
+    b.post("/api/monedas/", json={"codigo": "BRL", "nombre": "REAL", "simbolo": "R$"})
+    assert [m["codigo"] for m in a.get("/api/monedas/").get_json()] == ["BRL"]
+
+
+def _contador(endpoint, resultado):
+    from app.metrics import CACHE_REQUESTS
+    return CACHE_REQUESTS.labels(endpoint=endpoint, result=resultado)._value.get()
+
+
+def test_normalized_query_args_share_an_entry(db_app, datos_base):
+    """Argument order, empty values and "_" do not create new entries"""
+    client = db_app.test_client()
+    aciertos = _contador("crt.listar_crts_paginated_con_acciones", "hit")
+
+    r = client.get("/api/crts/paginated?per_page=2&estado=EMITIDO&q=")
+    assert r.headers["X-Cache"] == "MISS"
+    r = client.get("/api/crts/paginated?estado=EMITIDO&_=123&per_page=2")
+    assert r.headers["X-Cache"] == "HIT"
+    assert _contador("crt.listar_crts_paginated_con_acciones", "hit") == aciertos + 1
+
+    r = client.get("/api/crts/paginated?per_page=2&page=2")
+    assert r.headers["X-Cache"] == "MISS"
+
+
+def test_auth_scope_is_part_of_the_key(db_app, datos_base):
+    """Different roles never share cached listings"""
+    from app.utils.auth import create_access_token
+    client = db_app.test_client()
+
+    def pedir(rol):
+        token = create_access_token({"user_id": 1, "usuario": "x", "rol": rol})
+        return client.get("/api/mic-guardados/",
+                          headers={"Authorization": f"Bearer {token}"}).headers["X-Cache"]
+
+    assert pedir("admin") == "MISS"
+    assert pedir("operador") == "MISS"
+    assert pedir("admin") == "HIT"
+
+
+def test_crt_listing_invalidated_by_edit(db_app, datos_base):
+    """Editing a remitente refreshes the cached CRT list"""
+    client = db_app.test_client()
+    antes = client.get("/api/crts/").get_json()
+    rem = datos_base["remitentes"][0]
+    rem.nombre = "RENOMBRADA S.A."
+    db.session.commit()
+
+    r = client.get("/api/crts/")
+    assert r.headers["X-Cache"] == "MISS"
+    assert r.get_json() != antes
+    assert "RENOMBRADA S.A." in {c["remitente"] for c in r.get_json()}
+
+
+def _reloj(monkeypatch):
+    """Controllable clock for table versions and Last-Modified"""
+    import time
+    from app.utils import cache_tablas
+    ahora = [time.time()]
+    monkeypatch.setattr(cache_tablas, "_ahora", lambda: ahora[0])
+    return ahora
+
+
+def test_conditional_get_detail(db_app, datos_base, monkeypatch):
+    """GET /api/crts/<id> answers 304 until a related table changes"""
+    reloj = _reloj(monkeypatch)
+    client = db_app.test_client()
+    crt = datos_base["crts"][0]
+    client.get(f"/api/crts/{crt.id}")
+    reloj[0] += 2
+    r = client.get(f"/api/crts/{crt.id}")
+    etag, modificado = r.headers["ETag"], r.headers["Last-Modified"]
+
+    r = client.get(f"/api/crts/{crt.id}", headers={"If-None-Match": etag})
+    assert r.status_code == 304 and r.data == b""
+    r = client.get(f"/api/crts/{crt.id}", headers={"If-Modified-Since": modificado})
+    assert r.status_code == 304
+
+    crt.detalles_mercaderia = "CAMBIO"
+    db.session.commit()
+    r = client.get(f"/api/crts/{crt.id}", headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.get_json()["detalles_mercaderia"] == "CAMBIO"
+
+
+def test_same_second_writes_are_not_hidden_by_last_modified(db_app, datos_base, monkeypatch):
+    """Two commits in the same second: If-Modified-Since never returns stale data"""
+    from email.utils import format_datetime
+    from datetime import datetime, timezone
+    reloj = _reloj(monkeypatch)
+    reloj[0] = int(reloj[0]) + 10.1
+    client = db_app.test_client()
+    moneda = datos_base["moneda"]
+
+    moneda.nombre = "DOLAR"
+    db.session.commit()
+    reloj[0] += 0.1
+    r = client.get("/api/monedas/")
+    # Cambio del segundo en curso: sin Last-Modified, solo ETag
+    assert "Last-Modified" not in r.headers and "ETag" in r.headers
+    mismo_segundo = format_datetime(
+        datetime.fromtimestamp(int(reloj[0]), tz=timezone.utc), usegmt=True)
+    assert client.get("/api/monedas/", headers={
+        "If-Modified-Since": mismo_segundo}).status_code == 200
+
+    moneda.nombre = "DOLAR USA"
+    db.session.commit()
+    reloj[0] += 0.3  # mismo segundo que el cambio anterior
+    r = client.get("/api/monedas/", headers={"If-Modified-Since": mismo_segundo})
+    assert r.status_code == 200
+    assert "DOLAR USA" in r.get_data(as_text=True)
+
+    # Pasado ese segundo la fecha vuelve a servir de validador
+    reloj[0] += 1
+    r = client.get("/api/monedas/")
+    assert r.headers["Last-Modified"] == mismo_segundo
+    assert client.get("/api/monedas/", headers={
+        "If-Modified-Since": r.headers["Last-Modified"]}).status_code == 304
+
+
+def test_conditional_get_catalog_and_errors(db_app, datos_base):
+    """Catalogs revalidate too; errors and disabled config carry no validators"""
+    client = db_app.test_client()
+    etag = client.get("/api/monedas/").headers["ETag"]
+    assert client.get("/api/monedas/", headers={"If-None-Match": etag}).status_code == 304
+
+    r = client.get("/api/mic-guardados/999999")
+    assert r.status_code == 404 and "ETag" not in r.headers
+
+    db_app.config["CONDITIONAL_GET"] = False
+    assert client.get("/api/monedas/", headers={"If-None-Match": etag}).status_code == 200
@@ -0,0 +1,23 @@
+"""
+Tests for the index check script
+"""
+from sqlalchemy import create_engine
+
+from app import db
+from check_indices import verificar
+
+
+def test_models_declare_indexes_for_hot_queries():
+    """A schema built from models.py has no full table scans"""
+    engine = create_engine("sqlite://")
+    db.metadata.create_all(engine)
+    assert verificar(engine) == []
+
+
+def test_missing_index_is_reported():
+    """Dropping an index makes the check fail for the queries that need it"""
+    engine = create_engine("sqlite://")
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_mics_crt_id")
+    assert [nombre for nombre, _ in verificar(engine)] == ["mic_por_crt"]
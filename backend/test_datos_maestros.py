@@ -0,0 +1,60 @@
+"""
+Tests for the in-memory master-data snapshot behind /api/crts/data/*
+"""
+from sqlalchemy import event
+
+from app import db
+from app.models import Moneda
+
+
+def test_sections_and_combined_payload(db_app, datos_base):
+    """Each section keeps its shape and the combined payload holds them all"""
+    client = db_app.test_client()
+    combinado = client.get("/api/crts/data/formulario").get_json()
+    assert set(combinado) == {"transportadoras", "entidades", "monedas", "ciudades", "paises"}
+    for seccion, datos in combinado.items():
+        assert client.get(f"/api/crts/data/{seccion}").get_json() == datos
+
+    assert combinado["monedas"] == {"items": [{"id": datos_base["moneda"].id,
+                                               "nombre": "DOLAR AMERICANO", "codigo": "USD"}],
+                                    "total": 1}
+    assert combinado["entidades"]["items"][0] == {
+        "id": datos_base["remitentes"][0].id, "nombre": "EMPRESA 0 S.A.",
+        "direccion": "Av. Mariscal López", "tipo_documento": "RUC",
+        "numero_documento": "80000-1", "ciudad": "ASUNCIÓN", "pais": "PARAGUAY"}
+
+
+def test_etag_and_no_queries_when_warm(db_app, datos_base):
+    """A warm snapshot answers without SQL and revalidates with 304"""
+    client = db_app.test_client()
+    etag = client.get("/api/crts/data/formulario").headers["ETag"]
+
+    consultas = []
+
+    def contar(conn, cursor, statement, *args):
+        consultas.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", contar)
+    try:
+        r = client.get("/api/crts/data/formulario", headers={"If-None-Match": etag})
+    finally:
+        event.remove(db.engine, "before_cursor_execute", contar)
+    assert r.status_code == 304
+    assert consultas == []
+
+
+def test_write_rebuilds_only_affected_sections(db_app, datos_base):
+    """Adding a moneda rebuilds monedas and keeps the other sections"""
+    client = db_app.test_client()
+    client.get("/api/crts/data/formulario")
+    antes = db_app.extensions["datos_maestros"]
+
+    db.session.add(Moneda(codigo="PYG", nombre="GUARANI", simbolo="₲"))
+    db.session.commit()
+    datos = client.get("/api/crts/data/monedas").get_json()
+    despues = db_app.extensions["datos_maestros"]
+
+    assert datos["total"] == 2
+    assert despues["monedas"] is not antes["monedas"]
+    assert despues["entidades"] is antes["entidades"]
+    assert despues["formulario"].etag != antes["formulario"].etag
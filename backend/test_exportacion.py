@@ -0,0 +1,135 @@
+"""
+Tests for the streamed CSV/XLSX exports
+"""
+import csv
+import io
+from datetime import date
+
+import pytest
+
+from app import db
+from app.models import MIC, Honorario
+from app.routes.crt import COLUMNAS_EXPORTACION_CRT
+import app.utils.exportacion as exportacion
+
+
+def _csv(respuesta, separador=","):
+    texto = respuesta.get_data().decode("utf-8")
+    assert texto.startswith("\ufeff")
+    return list(csv.reader(io.StringIO(texto[1:]), delimiter=separador))
+
+
+def test_crt_export_with_filters_and_columns(db_app, datos_base):
+    """Filters of the listing apply; columns come in the requested order"""
+    client = db_app.test_client()
+    r = client.get("/api/crts/export?columnas=numero_crt,fecha_emision,transportadora"
+                   "&fecha_desde=2025-02-01&fecha_hasta=2025-04-10")
+    assert r.status_code == 200 and r.is_streamed
+    assert r.mimetype == "text/csv"
+    assert 'filename="CRTs_' in r.headers["Content-Disposition"]
+    assert _csv(r) == [
+        ["Número CRT", "Fecha emisión", "Transportadora"],
+        ["PY000000004", "2025-04-10 00:00:00", "TRANSPORTES 1"],
+        ["PY000000003", "2025-03-10 00:00:00", "TRANSPORTES 0"],
+        ["PY000000002", "2025-02-10 00:00:00", "TRANSPORTES 1"],
+    ]
+
+    filas = _csv(client.get("/api/crts/export?separador=;"), ";")
+    assert len(filas) == 6
+    assert len(filas[0]) == len(COLUMNAS_EXPORTACION_CRT)
+
+
+def test_invalid_parameters(db_app, datos_base, monkeypatch):
+    client = db_app.test_client()
+    assert client.get("/api/crts/export?columnas=numero_crt,nada").status_code == 400
+    assert client.get("/api/crts/export?formato=pdf").status_code == 400
+    assert client.get("/api/honorarios/export?separador=x").status_code == 400
+
+    monkeypatch.setattr(exportacion, "openpyxl", None)
+    assert client.get("/api/mic-guardados/export?formato=xlsx").status_code == 501
+
+
+def test_mic_and_honorarios_export(db_app, datos_base):
+    crt = datos_base["crts"][0]
+    db.session.add_all([
+        MIC(crt_id=crt.id, campo_4_estado="PROVISORIO", campo_11_placa="AAA123"),
+        MIC(campo_4_estado="DEFINITIVO", campo_11_placa="BBB456"),
+    ])
+    trans = datos_base["transportadoras"]
+    usd = datos_base["moneda"]
+    db.session.add_all([
+        Honorario(monto=100, transportadora_id=trans[0].id, moneda_id=usd.id, fecha=date(2025, 1, 5)),
+        Honorario(monto=250.5, transportadora_id=trans[1].id, moneda_id=usd.id, fecha=date(2025, 2, 5)),
+    ])
+    db.session.commit()
+    client = db_app.test_client()
+
+    filas = _csv(client.get(
+        "/api/mic-guardados/export?estado=provisorio&columnas=crt_numero,campo_11_placa"))
+    assert filas == [["Número CRT", "Campo 11 placa"], [crt.numero_crt, "AAA123"]]
+
+    filas = _csv(client.get(
+        f"/api/honorarios/export?transportadora_id={trans[1].id}&columnas=fecha,transportadora,monto"))
+    assert filas == [["Fecha", "Transportadora", "Monto"], ["2025-02-05", "TRANSPORTES 1", "250.50"]]
+
+
+def test_formula_injection_is_neutralized(db_app, datos_base):
+    """User text that Excel would run as a formula is written with a leading quote"""
+    crts = datos_base["crts"]
+    crts[0].factura_exportacion = '=HYPERLINK("http://x","clic")'
+    crts[1].factura_exportacion = "@SUM(A1:A9)"
+    crts[2].factura_exportacion = "\t=1+1"
+    crts[3].factura_exportacion = "-10"
+    crts[4].factura_exportacion = "CAJAS - 10"
+    db.session.commit()
+
+    filas = _csv(db_app.test_client().get(
+        "/api/crts/export?columnas=numero_crt,factura_exportacion"))
+    detalles = {numero: texto for numero, texto in filas[1:]}
+    assert detalles == {
+        "PY000000001": '\'=HYPERLINK("http://x","clic")',
+        "PY000000002": "'@SUM(A1:A9)",
+        "PY000000003": "'\t=1+1",
+        "PY000000004": "-10",
+        "PY000000005": "CAJAS - 10",
+    }
+
+
+def test_csv_error_mid_stream_is_marked(db_app, datos_base, monkeypatch):
+    """A failure after the header ends the file with an #ERROR row and aborts"""
+    import app.routes.crt as rutas_crt
+
+    def valor_roto(fila):
+        if fila.numero_crt == "PY000000003":
+            raise RuntimeError("cursor cerrado")
+        return fila.numero_crt
+
+    monkeypatch.setitem(rutas_crt.COLUMNAS_EXPORTACION_CRT, "numero_crt",
+                        exportacion.Columna("Número CRT", valor_roto))
+    r = db_app.test_client().get("/api/crts/export?columnas=numero_crt")
+    assert r.status_code == 200
+
+    bloques = []
+    with pytest.raises(RuntimeError):
+        for bloque in r.response:
+            bloques.append(bloque)
+    texto = b"".join(bloques).decode("utf-8")
+    filas = list(csv.reader(io.StringIO(texto[1:])))
+    assert filas[:3] == [["Número CRT"], ["PY000000005"], ["PY000000004"]]
+    assert filas[-1] == ["#ERROR", "exportación incompleta: cursor cerrado"]
+
+
+def test_csv_written_in_blocks(db_app, datos_base, monkeypatch):
+    monkeypatch.setattr(exportacion, "BYTES_POR_BLOQUE", 200)
+    r = db_app.test_client().get("/api/crts/export")
+    assert len(list(r.response)) > 2
+
+
+def test_xlsx_export(db_app, datos_base):
+    openpyxl = pytest.importorskip("openpyxl")
+    r = db_app.test_client().get("/api/crts/export?formato=xlsx&columnas=numero_crt,valor_mercaderia")
+    assert r.status_code == 200
+    hoja = openpyxl.load_workbook(io.BytesIO(r.get_data())).active
+    filas = list(hoja.values)
+    assert filas[0] == ("Número CRT", "Valor mercadería")
+    assert len(filas) == 6
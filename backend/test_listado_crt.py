@@ -0,0 +1,43 @@
+"""
+Tests for the lean CRT list projection
+"""
+from sqlalchemy import event
+
+from app import db
+
+
+def test_listado_matches_full_serializer(db_app, datos_base):
+    """The lean projection returns the same values as to_dict_crt"""
+    client = db_app.test_client()
+    lean = client.get("/api/crts/").get_json()
+    completo = client.get("/api/crts/?completo=1").get_json()
+
+    assert [c["id"] for c in lean] == [c["id"] for c in completo]
+    for a, b in zip(lean, completo):
+        for clave, valor in a.items():
+            if clave in b:
+                assert valor == b[clave], clave
+        assert a["cantidad_gastos"] == len(b["gastos"])
+
+
+def test_listado_uses_a_single_query(db_app, datos_base):
+    """No lazy loads: one SELECT regardless of the number of CRTs"""
+    consultas = []
+
+    def contar(conn, cursor, statement, *args):
+        consultas.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", contar)
+    try:
+        db_app.test_client().get("/api/crts/")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", contar)
+    assert len(consultas) == 1
+
+
+def test_listado_paginado(db_app, datos_base):
+    """page/page_size keep the old envelope"""
+    data = db_app.test_client().get("/api/crts/?page=2&page_size=2").get_json()
+    assert data["total"] == 5
+    assert data["pages"] == 3
+    assert [c["numero_crt"] for c in data["crts"]] == ["PY000000003", "PY000000002"]
@@ -1,12 +1,15 @@
 """
 Tests for Prometheus metrics
 """
+import time
+
 import pytest
 from unittest.mock import patch, MagicMock
 from app.metrics import (
     init_metrics, REQUEST_COUNT, REQUEST_LATENCY,
-    CRT_CREATED, MIC_CREATED, HONORARIOS_TOTAL, USERS_ACTIVE,
-    update_business_metrics, update_system_metrics
+    update_business_metrics, update_system_metrics,
+    init_db_metrics, statement_fingerprint, DB_N_PLUS_ONE,
+    SlowRequestSampler
 )
 
 
@@ -49,28 +52,54 @@ def test_request_metrics(app, client):
     assert REQUEST_LATENCY._metrics
 
 
-@patch('app.metrics.db')
-@patch('app.metrics.CRT')
-@patch('app.metrics.MIC')
-@patch('app.metrics.Honorario')
-@patch('app.metrics.Usuario')
-def test_update_business_metrics(mock_usuario, mock_honorario, mock_mic, mock_crt, mock_db):
-    """Test business metrics update"""
-    # Mock database queries
-    mock_crt.query.count.return_value = 10
-    mock_mic.query.count.return_value = 5
-    mock_honorario.query.with_entities.return_value = [
-        MagicMock(monto=1000), MagicMock(monto=2000)]
-    mock_usuario.query.count.return_value = 3
+def _sample(name):
+    from prometheus_client import REGISTRY
+    return REGISTRY.get_sample_value(name)
 
-    # Call the function
-    update_business_metrics()
 
-    # Verify metrics were updated
-    assert CRT_CREATED._value == 10
-    assert MIC_CREATED._value == 5
-    assert HONORARIOS_TOTAL._value == 3000
-    assert USERS_ACTIVE._value == 3
+def test_update_business_metrics(db_app, datos_base):
+    """Totals come from one reconcile query, then follow committed changes"""
+    from app import db
+    from app.models import CRT, Honorario
+
+    init_metrics(db_app)
+    update_business_metrics(db_app)
+    assert _sample('crts_total') == 5
+    assert _sample('mics_total') == 0
+    assert _sample('honorarios_total_amount') == 0
+
+    creados = _sample('crt_created_total')
+    base = datos_base["crts"][0]
+    nuevo = CRT(numero_crt="PY000000099", remitente_id=base.remitente_id,
+                destinatario_id=base.destinatario_id, transportadora_id=base.transportadora_id,
+                ciudad_emision_id=base.ciudad_emision_id, pais_emision_id=base.pais_emision_id,
+                moneda_id=base.moneda_id)
+    honorario = Honorario(monto=1000, transportadora_id=base.transportadora_id,
+                          moneda_id=base.moneda_id)
+    db.session.add_all([nuevo, honorario])
+    db.session.commit()
+    assert _sample('crts_total') == 6
+    assert _sample('crt_created_total') == creados + 1
+    assert _sample('honorarios_total_amount') == 1000
+
+    honorario.monto = 2500
+    db.session.delete(nuevo)
+    db.session.commit()
+    assert _sample('crts_total') == 5
+    assert _sample('honorarios_total_amount') == 2500
+
+    # Rolled back changes are not counted
+    db.session.add(Honorario(monto=7, transportadora_id=base.transportadora_id,
+                             moneda_id=base.moneda_id))
+    db.session.flush()
+    db.session.rollback()
+    assert _sample('honorarios_total_amount') == 2500
+
+    # Bulk updates bypass the hooks until the next reconcile
+    Honorario.query.update({"monto": 10})
+    db.session.commit()
+    update_business_metrics(db_app)
+    assert _sample('honorarios_total_amount') == 10
 
 
 @patch('app.metrics.psutil')
@@ -79,14 +108,109 @@ def test_update_system_metrics(mock_psutil):
     # Mock psutil
     mock_process = MagicMock()
     mock_process.memory_info.return_value.rss = 1024 * 1024 * 100  # 100MB
-    mock_process.cpu_percent.return_value = 25.5
+    mock_process.num_threads.return_value = 7
     mock_psutil.Process.return_value = mock_process
 
     # Call the function
-    update_system_metrics()
+    valores = update_system_metrics()
+
+    assert valores['memory_usage_bytes'] == 1024 * 1024 * 100
+    assert valores['process_threads'] == 7
+    # Never the blocking sampler
+    mock_process.cpu_percent.assert_not_called()
+
+
+def test_system_metrics_at_scrape_time(tmp_path):
+    """CPU is a delta between scrapes and the DB pool is reported"""
+    from flask import Flask
+    from app import db
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'pool.db'}"
+    db.init_app(app)
+    init_metrics(app)
+    client = app.test_client()
+
+    inicio = time.monotonic()
+    client.get('/metrics')
+    datos = client.get('/metrics').get_data(as_text=True)
+    assert time.monotonic() - inicio < 0.9
+    assert 'cpu_usage_percent ' in datos
+    assert 'db_pool_connections{' in datos
+    assert 'python_gc_pending_count{generation="0"}' in datos
+
+
+def test_statement_fingerprint():
+    """Literals and IN lists collapse so repeated statements group together"""
+    a = statement_fingerprint("SELECT * FROM crts\n  WHERE id = 5 AND estado = 'EMITIDO'")
+    b = statement_fingerprint("SELECT * FROM crts WHERE id = 17 AND estado = 'ANULADO'")
+    assert a == b == "SELECT * FROM crts WHERE id = ? AND estado = ?"
+    assert statement_fingerprint("SELECT x FROM t WHERE id IN (?, ?, ?)") == \
+        "SELECT x FROM t WHERE id IN (?)"
+
+
+def test_db_queries_per_endpoint_and_n_plus_one(db_app, datos_base, caplog):
+    """Per-request statements are counted; lazy loads in a loop are flagged"""
+    from prometheus_client import REGISTRY
+    from app import db
+    from app.models import CRT
+
+    db_app.config.update(DB_N_PLUS_ONE_THRESHOLD=100, DB_REPEATED_STATEMENT_THRESHOLD=3,
+                         SERVER_TIMING=True)
+
+    @db_app.route('/n-mas-uno')
+    def n_mas_uno():
+        db.session.expire_all()
+        return {'gastos': sum(len(crt.gastos) for crt in CRT.query.all())}
+
+    init_db_metrics(db_app)
+    antes = DB_N_PLUS_ONE.labels(endpoint='n_mas_uno')._value.get()
+
+    with caplog.at_level('WARNING', logger='app.metrics'):
+        r = db_app.test_client().get('/n-mas-uno')
+
+    assert r.status_code == 200
+    assert r.headers['Server-Timing'].startswith('db;dur=')
+    assert 'desc="6 queries"' in r.headers['Server-Timing']
+    assert DB_N_PLUS_ONE.labels(endpoint='n_mas_uno')._value.get() == antes + 1
+    assert 'Possible N+1 in n_mas_uno' in caplog.text
+    assert '5x SELECT' in caplog.text
+    assert REGISTRY.get_sample_value(
+        'db_queries_per_request_count', {'endpoint': 'n_mas_uno'}) >= 1
+    assert REGISTRY.get_sample_value(
+        'db_query_duration_seconds_count', {'endpoint': 'n_mas_uno', 'operation': 'SELECT'}) >= 6
+
 
-    # Verify metrics were updated (these would be set if psutil is available)
-    # Note: In test environment, psutil might not be available
+def test_streamed_responses_are_counted_on_close(db_app, datos_base, caplog):
+    """Queries run while a streamed body is generated are recorded too"""
+    from prometheus_client import REGISTRY
+
+    db_app.config.update(DB_N_PLUS_ONE_THRESHOLD=1)
+    init_db_metrics(db_app)
+    endpoint = 'crt.listar_crts'
+    antes = REGISTRY.get_sample_value('db_queries_per_request_count', {'endpoint': endpoint}) or 0
+
+    with caplog.at_level('WARNING', logger='app.metrics'):
+        r = db_app.test_client().get('/api/crts/?completo=1')
+        assert r.is_streamed
+        r.get_data()
+        r.close()
+
+    assert REGISTRY.get_sample_value(
+        'db_queries_per_request_count', {'endpoint': endpoint}) == antes + 1
+    assert f'Possible N+1 in {endpoint}' in caplog.text
+
+
+def test_failed_statement_does_not_leak_start_time(db_app):
+    """handle_error drops the start time of a statement that raised"""
+    import sqlalchemy
+    from app import db
+    init_db_metrics(db_app)
+
+    with db.engine.connect() as conn:
+        with pytest.raises(sqlalchemy.exc.OperationalError):
+            conn.execute(sqlalchemy.text('SELECT * FROM tabla_que_no_existe'))
+        assert conn.info.get('query_start_time') == []
 
 
 def test_metrics_endpoint_content_type(app):
@@ -95,7 +219,7 @@ def test_metrics_endpoint_content_type(app):
 
     with app.test_client() as client:
         response = client.get('/metrics')
-        assert response.content_type == 'text/plain; charset=utf-8'
+        assert response.content_type == 'text/plain; version=0.0.4; charset=utf-8'
         assert 'flask_requests_total' in response.get_data(as_text=True)
 
 
@@ -108,7 +232,80 @@ def test_metrics_with_invalid_endpoint(app):
         response = client.get('/nonexistent')
         assert response.status_code == 404
 
-        # Check that 404 was recorded
+        # Check that 404 was recorded (status class, no per-URL series)
         metrics_response = client.get('/metrics')
         metrics_data = metrics_response.get_data(as_text=True)
-        assert '404' in metrics_data
+        assert 'route="<unmatched>",status="4xx"' in metrics_data
+        assert '/nonexistent' not in metrics_data
+
+
+def test_request_metrics_use_route_template(app):
+    """Requests are labelled by the URL rule and use the SLO buckets"""
+    from prometheus_client import REGISTRY
+    init_metrics(app)
+
+    @app.route('/items/<int:item_id>')
+    def item(item_id):
+        return {'id': item_id}
+
+    with app.test_client() as client:
+        client.get('/items/1')
+        client.get('/items/2')
+
+    labels = {'method': 'GET', 'route': '/items/<int:item_id>'}
+    assert REGISTRY.get_sample_value('flask_request_duration_seconds_count', labels) == 2
+    assert REGISTRY.get_sample_value(
+        'flask_request_duration_seconds_bucket', dict(labels, le='0.3')) is not None
+    assert REGISTRY.get_sample_value(
+        'flask_requests_total', dict(labels, status='2xx')) == 2
+
+
+def test_slow_request_sampler_keeps_slowest_per_window(caplog):
+    """Only the N slowest requests of a window are logged, once"""
+    sampler = SlowRequestSampler(size=2, window=60)
+    base = time.monotonic()
+    for n, duracion in enumerate([0.6, 2.0, 0.9, 1.5]):
+        sampler.offer(duracion, {'method': 'GET', 'route': f'/r{n}', 'status': 200,
+                                 'queries': n, 'args': {}})
+
+    assert sampler.roll(base + 1) == []
+    with caplog.at_level('WARNING', logger='app.metrics'):
+        muestras = sampler.roll(base + 61)
+    assert [m['route'] for m in muestras] == ['/r1', '/r3']
+    assert 'Slow request 2000 ms: GET /r1' in caplog.text
+    assert sampler.roll(base + 200) == []
+
+
+def test_slow_request_captures_args_and_queries(db_app, datos_base, monkeypatch):
+    """Slow requests record route, args (secrets masked) and query count"""
+    import app.metrics as metrics
+    from app.models import CRT
+    sampler = SlowRequestSampler()
+    monkeypatch.setattr(metrics, 'SLOW_REQUESTS', sampler)
+    db_app.config.update(SLOW_REQUEST_THRESHOLD=0)
+    init_metrics(db_app)
+
+    @db_app.route('/lento')
+    def lento():
+        return {'n': CRT.query.count()}
+
+    db_app.test_client().get('/lento?estado=EMITIDO&token=abc')
+    muestra, = sampler.roll(time.monotonic() + 61)
+
+    assert muestra['route'] == '/lento'
+    assert muestra['args'] == {'estado': 'EMITIDO', 'token': '***'}
+    assert muestra['queries'] == 1
+    assert muestra['status'] == 200
+
+
+def test_multiprocess_metrics_endpoint(app, tmp_path, monkeypatch):
+    """With PROMETHEUS_MULTIPROC_DIR, /metrics aggregates the worker files"""
+    monkeypatch.setenv('PROMETHEUS_MULTIPROC_DIR', str(tmp_path))
+    init_metrics(app)
+
+    response = app.test_client().get('/metrics')
+    assert response.status_code == 200
+    datos = response.get_data(as_text=True)
+    assert 'crts_total' in datos
+    # Process-local samples are not mixed with the aggregated ones
+    assert 'flask_requests_total{' not in datos
@@ -0,0 +1,165 @@
+"""
+Tests for the per-transportadora CRT number sequence
+"""
+import threading
+
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import CRT, CRT_Secuencia, Transportadora
+from app.utils.numeracion_crt import (
+    reservar_numeros, insertar_con_numero_libre, avanzar_secuencia, NumeroCRTDuplicadoError)
+
+
+def test_next_number_continues_existing_crts(db_app, datos_base):
+    """The first request seeds the sequence from the highest existing number"""
+    client = db_app.test_client()
+    trans = datos_base["transportadoras"][0]
+    url = f"/api/crts/next_number?transportadora_id={trans.id}&codigo=PY000000001"
+
+    # transportadora[0] owns PY000000001, 3 and 5
+    assert client.get(url).get_json() == {"next_number": "PY000000006"}
+    # Suggesting does not reserve
+    assert client.get(url).get_json() == {"next_number": "PY000000006"}
+    assert client.get("/api/crts/next_number?transportadora_id=1&codigo=XX").status_code == 400
+
+
+def test_new_transportadora_starts_at_its_code(db_app, datos_base):
+    """Without CRTs the sequence starts at the transportadora code"""
+    nueva = Transportadora(codigo="PY000700000", nombre="NUEVA", ciudad_id=datos_base["ciudad"].id)
+    db.session.add(nueva)
+    db.session.commit()
+    data = db_app.test_client().get(
+        f"/api/crts/next_number?transportadora_id={nueva.id}&codigo={nueva.codigo}").get_json()
+    assert data["next_number"] == "PY000700000"
+
+
+def test_bulk_reserve(db_app, datos_base):
+    """Reservations hand out consecutive, never repeated numbers"""
+    client = db_app.test_client()
+    trans = datos_base["transportadoras"][1]
+    r = client.post("/api/crts/next_number/reservar",
+                    json={"transportadora_id": trans.id, "cantidad": 3})
+    assert r.status_code == 201
+    assert r.get_json()["numeros"] == ["PY000000005", "PY000000006", "PY000000007"]
+    r = client.post("/api/crts/next_number/reservar", json={"transportadora_id": trans.id})
+    assert r.get_json()["numeros"] == ["PY000000008"]
+    r = client.post("/api/crts/next_number/reservar",
+                    json={"transportadora_id": trans.id, "cantidad": 0})
+    assert r.status_code == 400
+
+
+def test_taken_suggestion_is_reassigned(db_app, datos_base):
+    """Two users with the same suggested number both get a CRT"""
+    client = db_app.test_client()
+    crt = datos_base["crts"][0]
+    trans_id = crt.transportadora_id
+    sugerido = client.get(
+        f"/api/crts/next_number?transportadora_id={trans_id}&codigo=PY000000001"
+    ).get_json()["next_number"]
+    payload = {"numero_crt": sugerido, "remitente_id": crt.remitente_id,
+               "destinatario_id": crt.destinatario_id, "transportadora_id": trans_id,
+               "ciudad_emision_id": crt.ciudad_emision_id,
+               "pais_emision_id": crt.pais_emision_id, "moneda_id": crt.moneda_id}
+
+    primero = client.post("/api/crts/", json=payload).get_json()
+    segundo = client.post("/api/crts/", json=payload).get_json()
+    assert primero["numero_crt"] == "PY000000006" and not primero["numero_reasignado"]
+    assert segundo["numero_crt"] == "PY000000007" and segundo["numero_reasignado"]
+
+    dup = client.post(f"/api/crts/{crt.id}/duplicate").get_json()
+    assert dup["nuevo_numero"] == "PY000000008"
+
+
+def test_concurrent_reservations_do_not_collide(tmp_path):
+    """Parallel sessions on a file database never get the same number"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'seq.db'}",
+                           connect_args={"timeout": 30})
+    db.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add(CRT_Secuencia(transportadora_id=1, ultimo_numero=0))
+        s.commit()
+
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=str(engine.url),
+                      SQLALCHEMY_ENGINE_OPTIONS={"connect_args": {"timeout": 30}})
+    db.init_app(app)
+    obtenidos, errores = [], []
+
+    def trabajar():
+        try:
+            with app.app_context():
+                for _ in range(10):
+                    obtenidos.extend(reservar_numeros(1, 2))
+                    db.session.commit()
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=trabajar) for _ in range(4)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+    assert not errores
+    assert len(obtenidos) == len(set(obtenidos)) == 80
+
+
+def _crt(numero, transportadora_id=1):
+    return CRT(numero_crt=numero, remitente_id=1, destinatario_id=1,
+               transportadora_id=transportadora_id, ciudad_emision_id=1,
+               pais_emision_id=1, moneda_id=1)
+
+
+def test_interleaved_sessions_with_same_suggestion(tmp_path):
+    """A number saved by another session after the suggestion is reassigned on INSERT"""
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'crts.db'}",
+                      SQLALCHEMY_ENGINE_OPTIONS={"connect_args": {"timeout": 30}})
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.add(CRT_Secuencia(transportadora_id=1, ultimo_numero=5))
+        db.session.commit()
+
+    with app.app_context():
+        # Usuario A: ya tiene el formulario con PY000000006 y todavía no guardó
+        crt_a = _crt("PY000000006")
+        with app.app_context():
+            # Usuario B guarda el mismo número primero
+            assert insertar_con_numero_libre(_crt("PY000000006")) is False
+            avanzar_secuencia(1, "PY000000006")
+            db.session.commit()
+
+        assert insertar_con_numero_libre(crt_a) is True
+        db.session.commit()
+        assert crt_a.numero_crt == "PY000000007"
+        assert sorted(n for n, in db.session.query(CRT.numero_crt)) == [
+            "PY000000006", "PY000000007"]
+
+        # Números fuera del formato PY######### no se reasignan
+        with app.app_context():
+            db.session.add(_crt("MANUAL-1"))
+            db.session.commit()
+        with pytest.raises(NumeroCRTDuplicadoError):
+            insertar_con_numero_libre(_crt("MANUAL-1"))
+
+
+def test_reassigned_number_of_another_transportadora(db_app, datos_base):
+    """A colliding number owned by another transportadora seeds after it, not at 1"""
+    nueva = Transportadora(codigo="X", nombre="NUEVA", ciudad_id=datos_base["ciudad"].id)
+    db.session.add(nueva)
+    db.session.commit()
+    crt = datos_base["crts"][0]
+    payload = {"numero_crt": "PY000000003", "remitente_id": crt.remitente_id,
+               "destinatario_id": crt.destinatario_id, "transportadora_id": nueva.id,
+               "ciudad_emision_id": crt.ciudad_emision_id,
+               "pais_emision_id": crt.pais_emision_id, "moneda_id": crt.moneda_id}
+
+    r = db_app.test_client().post("/api/crts/", json=payload).get_json()
+    # PY000000004 y 5 también están ocupados: sigue hasta el primero libre
+    assert r["numero_crt"] == "PY000000006"
+    assert r["numero_reasignado"] is True
@@ -0,0 +1,62 @@
+"""
+Tests for keyset (cursor) pagination
+"""
+import pytest
+
+from app.utils.paginacion import codificar_cursor, decodificar_cursor
+
+
+def recorrer(client, url, clave_items, clave_pag=None):
+    """Sigue next_cursor hasta el final y devuelve todos los ids"""
+    ids, cursor = [], ""
+    while True:
+        data = client.get(f"{url}&cursor={cursor}").get_json()
+        pag = data[clave_pag] if clave_pag else data
+        ids.extend(item["id"] for item in data[clave_items])
+        cursor = pag["next_cursor"]
+        if not cursor:
+            assert pag["has_next"] is False
+            return ids
+
+
+def test_cursor_roundtrip():
+    """Cursors are opaque and decode back to the id"""
+    cursor = codificar_cursor(1234)
+    assert "1234" not in cursor
+    assert decodificar_cursor(cursor) == 1234
+    with pytest.raises(ValueError):
+        decodificar_cursor("no-es-un-cursor")
+
+
+def test_crts_cursor_walk_matches_offset(db_app, datos_base):
+    """Walking the cursor returns every CRT once, in id DESC order"""
+    client = db_app.test_client()
+    ids = recorrer(client, "/api/crts/paginated?per_page=2", "crts", "pagination")
+    todos = client.get("/api/crts/paginated?per_page=50").get_json()["crts"]
+    assert ids == [c["id"] for c in todos]
+
+
+def test_crts_cursor_with_filters_and_total(db_app, datos_base):
+    """Filters apply to every page and the total is only computed on demand"""
+    client = db_app.test_client()
+    trans_id = datos_base["transportadoras"][0].id
+    url = f"/api/crts/paginated?per_page=1&transportadora_id={trans_id}"
+
+    data = client.get(url + "&cursor=").get_json()
+    assert data["pagination"]["total"] is None
+    data = client.get(url + "&cursor=&con_total=1").get_json()
+    assert data["pagination"]["total"] == 3
+    assert len(recorrer(client, url, "crts", "pagination")) == 3
+
+
+def test_invalid_cursor_is_400(db_app, datos_base):
+    """A tampered cursor is a client error"""
+    r = db_app.test_client().get("/api/crts/paginated?cursor=xxx")
+    assert r.status_code == 400
+
+
+def test_master_data_cursor(db_app, datos_base):
+    """Remitentes and transportadoras page by cursor too"""
+    client = db_app.test_client()
+    assert len(recorrer(client, "/api/remitentes/?per_page=2", "items")) == 3
+    assert len(recorrer(client, "/api/transportadoras/?per_page=1", "items")) == 2
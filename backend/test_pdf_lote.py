@@ -0,0 +1,101 @@
+"""
+Tests for the batch CRT PDF export (POST /api/crts/pdf/lote)
+"""
+import io
+import threading
+import zipfile
+
+import pytest
+
+import app.routes.crt as rutas_crt
+from app.utils import render_pdf
+from app.utils.render_pdf import RenderSaturadoError
+
+URL = "/api/crts/pdf/lote"
+
+
+def _zip(respuesta):
+    assert respuesta.status_code == 200
+    assert respuesta.mimetype == "application/zip"
+    return zipfile.ZipFile(io.BytesIO(respuesta.get_data()))
+
+
+def test_zip_entries_in_requested_order(db_app, datos_base):
+    """Explicit ids are exported once each, in the order given"""
+    crts = datos_base["crts"]
+    ids = [crts[2].id, crts[0].id, crts[2].id]
+    r = db_app.test_client().post(URL, json={"ids": ids})
+
+    assert r.headers["X-Total-CRTs"] == "2"
+    archivo = _zip(r)
+    assert archivo.namelist() == ["CRT_PY000000003.pdf", "CRT_PY000000001.pdf"]
+    assert all(archivo.read(n).startswith(b"%PDF") for n in archivo.namelist())
+
+
+def test_filters_select_crts(db_app, datos_base):
+    """Without ids, the listing filters choose the CRTs (newest first)"""
+    trans = datos_base["transportadoras"][1]
+    r = db_app.test_client().post(
+        URL, json={"filtros": {"transportadora_id": trans.id}})
+    assert _zip(r).namelist() == ["CRT_PY000000004.pdf", "CRT_PY000000002.pdf"]
+
+
+def test_single_pdf_format(db_app, datos_base):
+    """formato=pdf merges every CRT in one document"""
+    ids = [crt.id for crt in datos_base["crts"]]
+    r = db_app.test_client().post(URL, json={"ids": ids, "formato": "pdf"})
+    assert r.status_code == 200
+    assert r.mimetype == "application/pdf"
+    assert r.get_data().startswith(b"%PDF")
+    assert r.get_data().count(b"/Type /Page\n") == 5
+
+
+def test_empty_selection(db_app, datos_base):
+    """No matching CRTs is a 404, also for an explicit empty list"""
+    client = db_app.test_client()
+    assert client.post(URL, json={"filtros": {"q": "NO-EXISTE"}}).status_code == 404
+    assert client.post(URL, json={"ids": []}).status_code == 404
+    assert client.post(URL, json={"ids": [999999]}).status_code == 404
+
+
+def test_cap_on_number_of_crts(db_app, datos_base, monkeypatch):
+    """More CRTs than LOTE_PDF_MAXIMO are rejected, by ids or by filters"""
+    monkeypatch.setattr(rutas_crt, "LOTE_PDF_MAXIMO", 2)
+    client = db_app.test_client()
+    assert client.post(URL, json={"ids": [1, 2, 3]}).status_code == 400
+    assert client.post(URL, json={}).status_code == 400
+    assert client.post(URL, json={"formato": "docx"}).status_code == 400
+
+
+@pytest.mark.parametrize("ids", ["21", {"1": 1}, [None], ["abc"], [True], 5])
+def test_invalid_ids(db_app, datos_base, ids):
+    """ids must be a list of CRT ids"""
+    r = db_app.test_client().post(URL, json={"ids": ids})
+    assert r.status_code == 400
+    assert "ids" in r.get_json()["error"]
+
+
+def test_error_mid_stream_is_written_in_zip(db_app, datos_base, monkeypatch):
+    """A failure after the headers leaves a valid ZIP with an ERROR.txt entry"""
+    def render_cortado(tipo, lista):
+        yield b"%PDF-primero"
+        raise RenderSaturadoError("Servidor de PDFs ocupado")
+
+    monkeypatch.setattr(rutas_crt, "renderizar_varios", render_cortado)
+    ids = [crt.id for crt in datos_base["crts"]]
+    archivo = _zip(db_app.test_client().post(URL, json={"ids": ids}))
+
+    assert archivo.namelist() == ["CRT_PY000000001.pdf", "ERROR.txt"]
+    assert b"incompleta" in archivo.read("ERROR.txt")
+
+
+def test_zip_rejected_up_front_when_saturated(db_app, datos_base, monkeypatch):
+    """With no free render slot the ZIP export is a 503 before streaming"""
+    cupos = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(render_pdf, "_cupos", cupos)
+    monkeypatch.setitem(render_pdf._config, "espera", 0.01)
+    cupos.acquire()
+
+    r = db_app.test_client().post(URL, json={"ids": [datos_base["crts"][0].id]})
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "5"
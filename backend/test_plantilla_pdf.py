@@ -0,0 +1,61 @@
+"""
+Tests for precompiled PDF templates
+"""
+from io import BytesIO
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4
+
+from app.utils.layout_crt import dibujar_lineas_dinamicas, estampar_plantilla_crt, lineas
+from app.utils.plantilla_pdf import PlantillaPDF, obtener_plantilla, huella_layout
+
+
+def test_estampar_crt_equals_live_drawing():
+    """Stamped template must emit the same operators as drawing live"""
+    vivo = canvas.Canvas(BytesIO(), pagesize=A4)
+    dibujar_lineas_dinamicas(vivo, lineas)
+
+    estampado = canvas.Canvas(BytesIO(), pagesize=A4)
+    assert estampar_plantilla_crt(estampado) is True
+
+    assert estampado._code == ['q'] + vivo._code + ['Q']
+
+
+def test_font_names_are_remapped():
+    """Fonts get the internal names of the target document"""
+    def dibujar(c):
+        c.setFont("Helvetica-Bold", 9)
+        c.drawString(10, 10, "CRT")
+
+    plantilla = PlantillaPDF(dibujar, A4)
+    c = canvas.Canvas(BytesIO(), pagesize=A4)
+    c.setFont("Courier", 8)  # Courier toma /F2 antes que Helvetica-Bold
+    plantilla.estampar(c)
+
+    assert any("/F3 9 Tf" in op for op in c._code)
+    assert not any("/F2 9 Tf" in op for op in c._code)
+
+
+def test_template_is_cached_by_fingerprint():
+    """Same fingerprint reuses the template; a new layout rebuilds it"""
+    def dibujar(c):
+        c.rect(0, 0, 10, 10)
+
+    a = obtener_plantilla("test", dibujar, A4, huella_layout([1]))
+    b = obtener_plantilla("test", dibujar, A4, huella_layout([1]))
+    c = obtener_plantilla("test", dibujar, A4, huella_layout([2]))
+    assert a is b
+    assert c is not a
+
+
+def test_mic_static_layer_is_reused():
+    """MIC PDFs stamp the cached static layer and only draw the values"""
+    from app.utils.layout_mic import generar_micdta_pdf_con_datos, obtener_plantilla_mic
+
+    plantilla = obtener_plantilla_mic()
+    assert set(plantilla.datos["areas"]) == set(range(1, 42)) - {39}
+
+    output = BytesIO()
+    generar_micdta_pdf_con_datos({"campo_1_transporte": "TRANSPORTES ÑANDÚ S.A."}, output)
+    assert output.getvalue().startswith(b"%PDF")
+    assert obtener_plantilla_mic() is plantilla
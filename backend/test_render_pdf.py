@@ -0,0 +1,123 @@
+"""
+Tests for the PDF render service (inline mode and backpressure)
+"""
+import threading
+
+import pytest
+
+from app.utils import render_pdf
+from app.utils.render_pdf import renderizar_pdf, renderizar_varios, RenderSaturadoError
+
+
+@pytest.fixture
+def sin_pool(monkeypatch):
+    """Render inline (sin procesos) con un solo cupo"""
+    monkeypatch.setattr(render_pdf, "_pool", None)
+    monkeypatch.setattr(render_pdf, "_cupos", threading.BoundedSemaphore(1))
+    monkeypatch.setitem(render_pdf._config, "espera", 0.01)
+
+
+def test_render_inline_returns_pdf_bytes(sin_pool):
+    """Without a pool the document is rendered in the current process"""
+    pdf = renderizar_pdf("mic", {"campo_1_transporte": "TRANSPORTES EJEMPLO S.A."})
+    assert pdf.startswith(b"%PDF")
+
+
+def test_render_varios_keeps_order(sin_pool):
+    """Batch rendering yields one PDF per document, in order"""
+    datos = [{"campo_23_numero_campo2_crt": f"PY{i}"} for i in range(3)]
+    pdfs = list(renderizar_varios("mic", datos))
+    assert len(pdfs) == 3
+    assert all(pdf.startswith(b"%PDF") for pdf in pdfs)
+
+
+def test_render_rejects_when_saturated(sin_pool):
+    """When every slot is taken the request fails fast instead of queueing"""
+    render_pdf._cupos.acquire()
+    try:
+        with pytest.raises(RenderSaturadoError):
+            renderizar_pdf("mic", {})
+    finally:
+        render_pdf._cupos.release()
+
+
+def test_unknown_document_type(sin_pool):
+    """Unknown document types are rejected"""
+    with pytest.raises(ValueError):
+        renderizar_pdf("factura", {})
+
+
+def test_timed_out_render_keeps_its_slot(sin_pool, monkeypatch):
+    """A render still running after the timeout holds its slot until it ends"""
+    from concurrent.futures import Future, TimeoutError
+
+    futuro = Future()
+    futuro.set_running_or_notify_cancel()
+    monkeypatch.setattr(render_pdf, "_enviar", lambda *args: futuro)
+    monkeypatch.setitem(render_pdf._config, "timeout", 0.01)
+
+    with pytest.raises(TimeoutError):
+        renderizar_pdf("mic", {})
+    assert not render_pdf._cupos.acquire(timeout=0.01)
+
+    futuro.set_result((b"%PDF", None))
+    assert render_pdf._cupos.acquire(timeout=0.01)
+    render_pdf._cupos.release()
+
+
+def test_worker_forgets_parent_connections(monkeypatch):
+    """Forked workers drop the inherited DB connections without closing them"""
+    from unittest.mock import MagicMock
+    motor = MagicMock()
+    monkeypatch.setattr(render_pdf, "_motores", [motor])
+
+    render_pdf._inicializar_worker()
+    motor.dispose.assert_called_once_with(close=False)
+
+
+def test_render_records_metrics(sin_pool):
+    """Duration, size and per-field fit results are exported per document"""
+    from prometheus_client import REGISTRY
+
+    def valor(nombre, **labels):
+        return REGISTRY.get_sample_value(nombre, labels) or 0
+
+    antes = {
+        "renders": valor("pdf_render_duration_seconds_count", document="mic"),
+        "bytes": valor("pdf_output_bytes_sum", document="mic"),
+        "campo_1": valor("pdf_fit_iterations_count", field="1"),
+        "truncados": valor("pdf_fit_truncated_total", field="38"),
+    }
+
+    pdf = renderizar_pdf("mic", {"campo_1_transporte": "TRANSPORTES EJEMPLO S.A.",
+                                 "campo_38_datos_campo11_crt": "CONTENEDOR\n" * 200})
+
+    assert valor("pdf_render_duration_seconds_count", document="mic") == antes["renders"] + 1
+    assert valor("pdf_output_bytes_sum", document="mic") == antes["bytes"] + len(pdf)
+    assert valor("pdf_fit_iterations_count", field="1") == antes["campo_1"] + 1
+    assert valor("pdf_fit_iterations_sum", field="1") > 0
+    assert valor("pdf_fit_truncated_total", field="38") == antes["truncados"] + 1
+
+
+def test_render_measurement_travels_with_pdf(tmp_path):
+    """The worker-side result carries the measurement back to the API process"""
+    pdf, medicion = render_pdf._render("mic", {})
+    assert medicion["tipo"] == "mic"
+    assert medicion["bytes"] == len(pdf)
+    assert medicion["segundos"] > 0
+
+    destino = tmp_path / "mic.pdf"
+    pdf, medicion = render_pdf._render("mic", {}, str(destino))
+    assert pdf is None
+    assert medicion["bytes"] == destino.stat().st_size
+    assert {c["campo"] for c in medicion["campos"]} >= {4, 5, 13}
+
+
+def test_mic_renders_in_memory(tmp_path, monkeypatch):
+    """MIC PDFs are built in a buffer, without files on disk"""
+    from app.utils.layout_mic import generar_micdta_pdf_con_datos
+
+    monkeypatch.chdir(tmp_path)
+    pdf = generar_micdta_pdf_con_datos({"campo_1_transporte": "TRANSPORTES EJEMPLO S.A."})
+    assert pdf.startswith(b"%PDF")
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,73 @@
+"""
+Tests for streamed JSON listings
+"""
+import json
+
+from sqlalchemy.orm import selectinload
+
+from app import db
+from app.models import CRT, Honorario
+import app.utils.streaming_json as streaming_json
+
+
+def test_listar_crts_streams_same_items(db_app, datos_base):
+    """The unpaginated list is streamed and matches the paginated items"""
+    client = db_app.test_client()
+    r = client.get("/api/crts/")
+    assert r.is_streamed
+    paginado = client.get("/api/crts/?page=1&page_size=50").get_json()["crts"]
+    assert r.get_json() == paginado
+
+    completo = client.get("/api/crts/?completo=1").get_json()
+    assert [c["id"] for c in completo] == [c["id"] for c in paginado]
+    assert [len(c["gastos"]) for c in completo] == [4, 3, 2, 1, 0]
+
+
+def test_simple_and_honorarios(db_app, datos_base):
+    client = db_app.test_client()
+    assert client.get("/api/crts/simple").get_json() == [
+        {"numero_crt": f"PY{i:09d}"} for i in range(5, 0, -1)]
+
+    trans, usd = datos_base["transportadoras"][0], datos_base["moneda"]
+    db.session.add(Honorario(monto=150, transportadora_id=trans.id, moneda_id=usd.id))
+    db.session.commit()
+    assert client.get("/api/honorarios/").get_json() == [{
+        "id": 1, "codigo": 1, "monto": 150.0, "transportadora_id": trans.id,
+        "transportadora_nombre": "TRANSPORTES 0", "moneda_id": usd.id,
+        "moneda_nombre": "DOLAR AMERICANO"}]
+
+
+def test_written_in_chunks(db_app, datos_base, monkeypatch):
+    """Output is flushed in blocks instead of one big string"""
+    monkeypatch.setattr(streaming_json, "BYTES_POR_BLOQUE", 100)
+    r = db_app.test_client().get("/api/crts/")
+    bloques = list(r.response)
+    assert len(bloques) > 2
+    assert json.loads(b"".join(bloques)) == db_app.test_client().get("/api/crts/").get_json()
+
+
+def test_entities_in_batches(db_app, datos_base):
+    """Keyset batches cover every row once, with collections eager-loaded"""
+    q = CRT.query.options(selectinload(CRT.gastos)).order_by(CRT.id.desc())
+    crts = list(streaming_json.entidades_en_tandas(q, CRT.id, tanda=2))
+    assert [c.numero_crt for c in crts] == [f"PY{i:09d}" for i in range(5, 0, -1)]
+    assert [len(c.gastos) for c in crts] == [4, 3, 2, 1, 0]
+
+
+def test_entity_batches_leave_the_session(db_app, datos_base):
+    """Batches already consumed are expunged, so the identity map stays bounded"""
+    from app import db
+    q = CRT.query.options(selectinload(CRT.gastos)).order_by(CRT.id.desc())
+    db.session.expunge_all()
+
+    vistos = []
+    for crt in streaming_json.entidades_en_tandas(q, CRT.id, tanda=2):
+        vistos.append(crt)
+        en_sesion = [c for c in vistos if c in db.session]
+        assert len(en_sesion) <= 2
+        assert crt in db.session
+    assert len(vistos) == 5
+
+
+def test_empty_list(db_app):
+    assert db_app.test_client().get("/api/honorarios/").get_json() == []
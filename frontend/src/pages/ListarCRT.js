@@ -185,27 +185,20 @@ function ListarCRT() {
       );
       setEstados(responseEstados.data.estados || []);
 
-      // USAR NUEVOS ENDPOINTS
-      const responseTransportadoras = await axios.get(
-        "http://localhost:5000/api/crts/data/transportadoras"
+      // Datos maestros en una sola respuesta (con ETag)
+      const responseFormulario = await axios.get(
+        "http://localhost:5000/api/crts/data/formulario"
       );
-      setTransportadoras(responseTransportadoras.data.items || []);
-
-      const responseEntidades = await axios.get(
-        "http://localhost:5000/api/crts/data/entidades"
-      );
-      setEntidades(responseEntidades.data.items || []);
-
-      const responseMonedas = await axios.get(
-        "http://localhost:5000/api/crts/data/monedas"
-      );
-      setMonedas(responseMonedas.data.items || []);
+      const { transportadoras, entidades, monedas } = responseFormulario.data;
+      setTransportadoras(transportadoras?.items || []);
+      setEntidades(entidades?.items || []);
+      setMonedas(monedas?.items || []);
 
       console.log("✅ Datos auxiliares cargados:", {
         estados: responseEstados.data.estados?.length || 0,
-        transportadoras: responseTransportadoras.data.items?.length || 0,
-        entidades: responseEntidades.data.items?.length || 0,
-        monedas: responseMonedas.data.items?.length || 0,
+        transportadoras: transportadoras?.items?.length || 0,
+        entidades: entidades?.items?.length || 0,
+        monedas: monedas?.items?.length || 0,
       });
     } catch (error) {
       console.log("⚠️ Error cargando datos auxiliares:", error.message);